@@ -1,13 +1,24 @@
 # -*- coding:utf-8 -*-
 from seleniumwire import webdriver
 from selenium.webdriver.chrome.service import Service
+from fb_graphql_scraper.base.egress import BrowserEgress
 
-class BasePage:
-    def __init__(self, driver_path: str, open_browser: bool = False):
+class BasePage(BrowserEgress):
+    def __init__(self, driver_path: str, open_browser: bool = False, egress=None):
         chrome_options = self._build_options(open_browser)
         service = Service(driver_path)
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        seleniumwire_options = {}
+        if egress is not None and egress.proxy_url:
+            seleniumwire_options["proxy"] = egress.seleniumwire_proxy()
+        self.driver = webdriver.Chrome(
+            service=service,
+            options=chrome_options,
+            seleniumwire_options=seleniumwire_options,
+        )
         self.driver.maximize_window()
+        self.egress = None
+        if egress is not None:
+            self.apply_egress(egress)
 
     @staticmethod
     def _build_options(open_browser: bool) -> webdriver.ChromeOptions:
@@ -0,0 +1,202 @@
+# -*- coding:utf-8 -*-
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from fb_graphql_scraper.base.base_page import BasePage
+from fb_graphql_scraper.pages.page_optional import PageOptional
+
+
+class PooledBrowser(object):
+    """One warm Chrome of a BrowserPool and its bookkeeping"""
+
+    def __init__(self, base_page: BasePage, page_optional: PageOptional):
+        self.base_page = base_page
+        self.page_optional = page_optional
+        self.driver = base_page.driver
+        self.uses = 0
+        self.created_at = time.monotonic()
+        # Memory of the fresh browser, and as measured at the end of its last lease
+        self.baseline_memory = None
+        self.memory = None
+
+
+class BrowserPool(object):
+    """Keep `size` warm Chrome instances and lease them to bootstrap tasks.
+
+    - Browsers are started up front by `warm_up()` (or on demand).
+    - Each lease gets a clean browser: no captured requests, blank page,
+      no cookies unless the pool is logged in.
+    - A browser is recycled after `max_uses` leases, when it stops answering,
+      or when its memory grew by more than `max_heap_growth_mb`: the RSS of the
+      chromedriver process tree with psutil installed
+      (`pip install facebook-graphql-scraper[pool]`), the JS heap of the
+      leased page from CDP `Performance.getMetrics` otherwise. Both are
+      measured at the end of a lease, before the page is reset.
+
+    How to use:
+        pool = BrowserPool(driver_path=driver_path, size=4)
+        pool.warm_up()
+        fb_spider = FacebookGraphqlScraper(driver_path=driver_path, browser_pool=pool)
+    """
+
+    def __init__(self, driver_path: str, size: int = 2, open_browser: bool = False,
+                 fb_account: str = None, fb_pwd: str = None, max_uses: int = 50,
+                 max_heap_growth_mb: float = 512, session_store=None, http_client=None):
+        self.driver_path = driver_path
+        self.size = size
+        self.open_browser = open_browser
+        self.fb_account = fb_account
+        self.fb_pwd = fb_pwd
+        self.session_store = session_store
+        # FacebookHttpClient checking saved sessions, the scraper the pool is given to when None
+        self.http_client = http_client
+        self.max_uses = max_uses
+        self.max_heap_growth_mb = max_heap_growth_mb
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _create(self) -> PooledBrowser:
+        base_page = BasePage(driver_path=self.driver_path, open_browser=self.open_browser)
+        page_optional = PageOptional(
+            driver=base_page.driver,
+            fb_account=self.fb_account,
+            fb_pwd=self.fb_pwd,
+            session_store=self.session_store,
+            http_client=self.http_client,
+        )
+        browser = PooledBrowser(base_page=base_page, page_optional=page_optional)
+        browser.baseline_memory = self._memory_size(browser)
+        with self._lock:
+            self._created += 1
+        return browser
+
+    def warm_up(self):
+        """Start every browser of the pool in parallel"""
+        with self._lock:
+            missing = self.size - self._created
+        if missing <= 0:
+            return
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            for browser in executor.map(lambda _: self._create(), range(missing)):
+                self._idle.put(browser)
+
+    @staticmethod
+    def _process_tree_rss(browser: PooledBrowser):
+        """RSS in bytes of chromedriver and every Chrome process under it, None without psutil"""
+        try:
+            import psutil
+        except ImportError:
+            return None
+        try:
+            process = psutil.Process(browser.driver.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+        except Exception:
+            return None
+        rss = 0
+        for each in processes:
+            try:
+                rss += each.memory_info().rss
+            except psutil.Error:
+                # Renderers come and go
+                continue
+        return rss
+
+    @staticmethod
+    def _js_heap_size(browser: PooledBrowser):
+        """JS heap in bytes of the current page from CDP, None if it is not available"""
+        try:
+            browser.driver.execute_cdp_cmd("Performance.enable", {})
+            metrics = browser.driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]
+        except Exception:
+            return None
+        for metric in metrics:
+            if metric.get("name") == "JSHeapUsedSize":
+                return metric.get("value")
+        return None
+
+    def _memory_size(self, browser: PooledBrowser):
+        memory = self._process_tree_rss(browser)
+        return memory if memory is not None else self._js_heap_size(browser)
+
+    def _is_healthy(self, browser: PooledBrowser) -> bool:
+        if browser.uses >= self.max_uses:
+            return False
+        try:
+            browser.driver.execute_script("return 1")
+        except Exception:
+            return False
+        if browser.memory is not None and browser.baseline_memory is not None:
+            if (browser.memory - browser.baseline_memory) / (1024 * 1024) > self.max_heap_growth_mb:
+                return False
+        return True
+
+    def _reset(self, browser: PooledBrowser):
+        """Remove everything the previous lease left behind"""
+        driver = browser.driver
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        browser.base_page.clear_egress()
+        if self.fb_account is None:
+            driver.delete_all_cookies()
+        driver.get(url="about:blank")
+        del driver.requests
+
+    def _destroy(self, browser: PooledBrowser):
+        with self._lock:
+            self._created -= 1
+        try:
+            browser.driver.quit()
+        except Exception as e:
+            print(f"Quit pooled browser failed, message: {e}")
+
+    def _checkout(self) -> PooledBrowser:
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                return self._create()
+            if self._is_healthy(browser):
+                return browser
+            print("Recycle a pooled browser.")
+            self._destroy(browser)
+
+    @contextmanager
+    def lease(self, timeout: float = None):
+        """Borrow a warm browser, yields the PooledBrowser"""
+        if self._closed:
+            raise RuntimeError("BrowserPool is closed")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("No pooled browser became available in time")
+        browser = None
+        try:
+            browser = self._checkout()
+            browser.uses += 1
+            yield browser
+        finally:
+            if browser is not None:
+                # Before the reset, which unloads the page the lease used
+                browser.memory = self._memory_size(browser)
+                try:
+                    self._reset(browser)
+                    self._idle.put(browser)
+                except Exception as e:
+                    print(f"Reset pooled browser failed, message: {e}")
+                    self._destroy(browser)
+            self._slots.release()
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy(browser)
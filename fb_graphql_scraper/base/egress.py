@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+COOKIE_DOMAIN = ".facebook.com"
+
+
+class BrowserEgress(object):
+    """Routes `self.driver` (a selenium-wire driver) through an EgressConfig: proxy, extra headers and cookies.
+    The cookies are set over CDP so the page the browser is on stays loaded, and the cookies of the
+    previous egress are removed (the browser's own values they replaced are put back) before
+    the next egress is applied, so identities do not leak from one egress to the other."""
+
+    egress = None
+    _replaced_cookies = None
+
+    def apply_egress(self, egress):
+        """Route the browser through `egress`.
+        selenium-wire lets us swap the upstream proxy without restarting Chrome."""
+        if egress is self.egress:
+            return
+        self._remove_egress_cookies()
+        self.driver.proxy = egress.seleniumwire_proxy()
+        if egress.headers:
+            headers = dict(egress.headers)
+
+            def interceptor(request):
+                for key, value in headers.items():
+                    del request.headers[key]
+                    request.headers[key] = value
+            self.driver.request_interceptor = interceptor
+        elif self.driver.request_interceptor is not None:
+            del self.driver.request_interceptor
+        if egress.cookies:
+            self._replaced_cookies = {}
+            for name in egress.cookies:
+                cookie = self.driver.get_cookie(name)
+                if cookie is not None:
+                    self._replaced_cookies[name] = cookie
+            for name, value in egress.cookies.items():
+                self._set_cookie({"name": name, "value": value})
+        self.egress = egress
+
+    def clear_egress(self):
+        """Go back to a direct connection without extra headers or the egress's cookies"""
+        if self.egress is None:
+            return
+        self._remove_egress_cookies()
+        self.driver.proxy = {}
+        if self.driver.request_interceptor is not None:
+            del self.driver.request_interceptor
+        self.egress = None
+
+    def _remove_egress_cookies(self):
+        if self.egress is None or not self.egress.cookies:
+            return
+        for name in self.egress.cookies:
+            self.driver.execute_cdp_cmd("Network.deleteCookies", {"name": name, "domain": COOKIE_DOMAIN})
+        for cookie in (self._replaced_cookies or {}).values():
+            self._set_cookie(cookie)
+        self._replaced_cookies = None
+
+    def _set_cookie(self, cookie: dict):
+        params = {"domain": COOKIE_DOMAIN, "path": "/", "secure": True}
+        params.update({key: cookie[key] for key in ("name", "value", "domain", "path", "secure", "httpOnly")
+                       if key in cookie})
+        self.driver.execute_cdp_cmd("Network.setCookie", params)
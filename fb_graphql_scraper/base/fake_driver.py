@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+"""Offline stand-in for the selenium-wire Chrome driver.
+
+A FakeDriver replays a RecordedSession (page source, captured GraphQL
+requests, a few page elements) on a VirtualClock: page loads, scrolls and
+every sleep of the browser flow advance the clock instead of waiting, and
+a recorded request only shows up in `driver.requests` once the page was
+scrolled far enough and its latency has passed on that clock. The browser
+flow of FacebookGraphqlScraper can then be benchmarked and regression
+tested without Chrome or network access.
+
+How to use:
+    session = RecordedSession.load("recordings/love.yuweishao.jsonl")
+    clock = VirtualClock()
+    pool = FakeBrowserPool(session=session, clock=clock)
+    fb_spider = FacebookGraphqlScraper(fb_account="recorded", browser_pool=pool, hybrid_login=False)
+    res = fb_spider.get_user_posts("love.yuweishao", days_limit=30, deadline=Deadline(clock=clock))
+    clock.now, pool.last_driver.stats  # virtual seconds spent, driver calls
+
+Record a session from a real crawl with `record_session(driver, path)`
+right after the browser flow finished, before the requests are cleared.
+"""
+import copy
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.common.by import By
+from fb_graphql_scraper.base.egress import COOKIE_DOMAIN, BrowserEgress
+from fb_graphql_scraper.pages.page_optional import PageOptional
+from fb_graphql_scraper.utils.locator import PageLocators, PageXpath
+
+GRAPHQL_URL = "https://www.facebook.com/api/graphql/"
+TIMELINE_QUERY_NAME = "ProfileCometTimelineFeedRefetchQuery"
+BLANK_PAGE = "<html><head></head><body></body></html>"
+# Elements record_session looks for, the login popup decides which branch click_reject_login_button takes
+RECORDED_LOCATORS = [
+    PageLocators.CLOSELOGIN,
+    (By.XPATH, PageXpath.CLOSE_LOGIN_BUTTON),
+]
+
+
+class VirtualClock(object):
+    """Clock that only moves when something sleeps on it (or advance() is called).
+    Has the interface of deadline.SystemClock."""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+        self._lock = threading.Lock()
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        if seconds and seconds > 0:
+            with self._lock:
+                self.now += seconds
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def wait(self, event: threading.Event, seconds: float = None) -> bool:
+        if event.is_set():
+            return True
+        if seconds is None:
+            raise RuntimeError("Waiting without a timeout never ends on a VirtualClock")
+        self.advance(seconds)
+        return event.is_set()
+
+
+def _shift_creation_times(data, delta: int):
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key == 'creation_time' and isinstance(value, int):
+                data[key] = value + delta
+            elif isinstance(value, (dict, list)):
+                _shift_creation_times(value, delta)
+    elif isinstance(data, list):
+        for item in data:
+            _shift_creation_times(item, delta)
+
+
+def shift_body_creation_times(body: str, delta: int) -> str:
+    """Move every `creation_time` of a GraphQL body (json lines) by `delta` seconds"""
+    lines = []
+    for line in body.split("\n"):
+        try:
+            json_data = json.loads(line)
+        except ValueError:
+            lines.append(line)
+            continue
+        _shift_creation_times(json_data, delta)
+        lines.append(json.dumps(json_data, ensure_ascii=False))
+    return "\n".join(lines)
+
+
+class RecordedSession(object):
+    """One visit of a profile page: its source, the GraphQL requests the page
+    sent and a few elements. Stored as json lines, one entry per line.
+
+    Each request has `scroll`, the number of scrolls to the bottom it needed
+    (0 for the requests of the page load), and `delay`, its latency in seconds.
+    """
+
+    def __init__(self, url: str, page_source: str = BLANK_PAGE, requests: list = None, elements: list = None,
+                 cookies: list = None, recorded_at: float = None, page_load_time: float = 1.0,
+                 user_agent: str = "Mozilla/5.0"):
+        self.url = url
+        self.page_source = page_source
+        self.requests = requests or []
+        self.elements = elements or []
+        self.cookies = cookies or []
+        self.recorded_at = recorded_at or time.time()
+        self.page_load_time = page_load_time
+        self.user_agent = user_agent
+
+    @classmethod
+    def load(cls, path: str, rebase: bool = True):
+        """Read a recording. With `rebase` the posts are moved forward in time
+        so they are as old now as they were when the session was recorded."""
+        session = None
+        entries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.pop("type") == "session":
+                    session = cls(**entry)
+                else:
+                    entries.append(entry)
+        if session is None:
+            raise ValueError(f"{path} is not a recorded session")
+        for entry in entries:
+            kind = entry.pop("kind")
+            getattr(session, kind).append(entry)
+        return session.rebased() if rebase else session
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            header = {
+                "type": "session", "url": self.url, "page_source": self.page_source,
+                "recorded_at": self.recorded_at, "page_load_time": self.page_load_time,
+                "user_agent": self.user_agent,
+            }
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for kind in ("requests", "elements", "cookies"):
+                for entry in getattr(self, kind):
+                    f.write(json.dumps({"type": "entry", "kind": kind, **entry}, ensure_ascii=False) + "\n")
+
+    @classmethod
+    def from_archive(cls, archive, profile: str = None, url: str = None, page_source: str = BLANK_PAGE,
+                     delay: float = 0.3):
+        """Session replaying the bodies of a ResponseArchive, one scroll per body"""
+        requests = []
+        for record in archive:
+            if profile is not None and record.profile != profile:
+                continue
+            requests.append({
+                "url": GRAPHQL_URL,
+                "body": "",
+                "response": {"status_code": 200, "headers": {}, "body": record.body},
+                "scroll": len(requests),
+                "delay": delay,
+            })
+        recorded_at = min((record.timestamp for record in archive), default=None)
+        return cls(url=url or f"https://www.facebook.com/{profile}", page_source=page_source,
+                   requests=requests, recorded_at=recorded_at)
+
+    def rebased(self, now: float = None):
+        """Copy whose creation times are shifted by the time elapsed since the recording"""
+        delta = int((now or time.time()) - self.recorded_at)
+        session = copy.deepcopy(self)
+        for request in session.requests:
+            request["response"]["body"] = shift_body_creation_times(request["response"]["body"], delta)
+        session.recorded_at += delta
+        return session
+
+
+def record_session(driver, path: str = None, locators: list = None) -> RecordedSession:
+    """Snapshot what a selenium-wire driver captured into a RecordedSession
+    (and save it to `path`). Every timeline query is counted as one scroll."""
+    from seleniumwire.utils import decode
+
+    requests = []
+    scrolls = 0
+    for req in driver.requests:
+        if req.url != GRAPHQL_URL or req.response is None:
+            continue
+        request_body = req.body.decode("utf-8", errors="replace")
+        if TIMELINE_QUERY_NAME in request_body:
+            scrolls += 1
+        response = req.response
+        body = decode(response.body, response.headers.get('Content-Encoding', 'identity'))
+        headers = {k: v for k, v in response.headers.items() if k.lower() != "content-encoding"}
+        delay = (response.date - req.date).total_seconds() if response.date and req.date else 0.0
+        requests.append({
+            "url": req.url,
+            "body": request_body,
+            "response": {"status_code": response.status_code, "headers": headers,
+                         "body": body.decode("utf-8")},
+            "scroll": scrolls,
+            "delay": max(delay, 0.0),
+        })
+    elements = []
+    for by, value in locators or RECORDED_LOCATORS:
+        for element in driver.find_elements(by, value):
+            elements.append({"by": by, "value": value, "text": element.text})
+    session = RecordedSession(
+        url=driver.current_url,
+        page_source=driver.page_source,
+        requests=requests,
+        elements=elements,
+        cookies=driver.get_cookies(),
+        user_agent=driver.execute_script("return navigator.userAgent"),
+    )
+    if path is not None:
+        session.save(path)
+    return session
+
+
+class FakeResponse(object):
+    def __init__(self, status_code: int, headers: dict, body: bytes, stats: Counter):
+        self.status_code = status_code
+        self.headers = headers
+        self._body = body
+        self._stats = stats
+
+    @property
+    def body(self) -> bytes:
+        self._stats["body_reads"] += 1
+        return self._body
+
+
+class FakeRequest(object):
+    def __init__(self, url: str, body: bytes, response: FakeResponse, date: float, method: str = "POST"):
+        self.url = url
+        self.method = method
+        self.body = body
+        self.response = response
+        self.date = date
+
+    def __repr__(self):
+        return f"FakeRequest({self.url!r})"
+
+
+class FakeElement(object):
+    def __init__(self, driver, text: str = ""):
+        self._driver = driver
+        self.text = text
+
+    def click(self):
+        self._driver.stats["clicks"] += 1
+
+    def send_keys(self, *value):
+        self._driver.stats["send_keys"] += 1
+
+    def is_displayed(self) -> bool:
+        return True
+
+    def get_attribute(self, name: str):
+        return None
+
+
+class _FakeSwitchTo(object):
+    def window(self, handle):
+        pass
+
+
+class FakeDriver(object):
+    """The part of the selenium-wire Chrome driver the scraper uses, replaying a RecordedSession.
+    `stats` counts the calls the browser flow made (requests scans, body reads, scrolls...)."""
+
+    def __init__(self, session: RecordedSession, clock: VirtualClock = None):
+        self.session = session
+        self.clock = clock or VirtualClock()
+        self.stats = Counter()
+        self.current_url = "about:blank"
+        self.page_source = BLANK_PAGE
+        self.window_handles = ["main"]
+        self.current_window_handle = "main"
+        self.switch_to = _FakeSwitchTo()
+        self.page_load_timeout = None
+        self.proxy = {}
+        self.request_interceptor = None
+        self._cookies = {each["name"]: dict(each) for each in session.cookies}
+        self._lock = threading.Lock()
+        self._captured = []
+        self._pending = []
+        self._loaded_at = None
+        self._scroll_times = []
+
+    def _release(self):
+        """Move the requests whose scroll happened and whose latency passed into the captured ones"""
+        now = self.clock.monotonic()
+        pending = []
+        for entry in self._pending:
+            scroll = entry.get("scroll", 0)
+            if scroll == 0:
+                triggered_at = self._loaded_at
+            elif len(self._scroll_times) >= scroll:
+                triggered_at = self._scroll_times[scroll - 1]
+            else:
+                triggered_at = None
+            if triggered_at is None or now < triggered_at + entry.get("delay", 0.0):
+                pending.append(entry)
+                continue
+            response = entry["response"]
+            self._captured.append(FakeRequest(
+                url=entry["url"],
+                body=entry.get("body", "").encode("utf-8"),
+                response=FakeResponse(
+                    status_code=response.get("status_code", 200),
+                    headers=response.get("headers", {}),
+                    body=response["body"].encode("utf-8"),
+                    stats=self.stats,
+                ),
+                date=triggered_at + entry.get("delay", 0.0),
+                method=entry.get("method", "POST"),
+            ))
+        self._pending = pending
+
+    @property
+    def requests(self) -> list:
+        with self._lock:
+            self.stats["requests_reads"] += 1
+            self._release()
+            return list(self._captured)
+
+    @requests.deleter
+    def requests(self):
+        with self._lock:
+            self._captured = []
+
+    def get(self, url: str):
+        """Navigation drops the requests still in flight and replays the recording from the start.
+        A page load slower than the page load timeout raises TimeoutException once it has passed."""
+        self.stats["get"] += 1
+        with self._lock:
+            self.current_url = url
+            if url.startswith("https://www.facebook.com/") and "/login" not in url:
+                self.page_source = self.session.page_source
+                self._pending = list(self.session.requests)
+            else:
+                self.page_source = BLANK_PAGE
+                self._pending = []
+            self._scroll_times = []
+            self._loaded_at = self.clock.monotonic()
+        if self.page_load_timeout is not None and self.session.page_load_time > self.page_load_timeout:
+            self.clock.advance(self.page_load_timeout)
+            raise TimeoutException(f"Page load of {url} timed out")
+        self.clock.advance(self.session.page_load_time)
+
+    def execute_script(self, script: str, *args):
+        self.stats["execute_script"] += 1
+        if "scrollTo" in script or "scrollBy" in script:
+            with self._lock:
+                self.stats["scrolls"] += 1
+                self._scroll_times.append(self.clock.monotonic())
+            return None
+        if "navigator.userAgent" in script:
+            return self.session.user_agent
+        return None
+
+    def execute(self, driver_command: str, params: dict = None) -> dict:
+        """ActionChains.perform() ends up here"""
+        self.stats["execute"] += 1
+        return {"value": None}
+
+    def find_elements(self, by=By.ID, value: str = None) -> list:
+        self.stats["find_elements"] += 1
+        return [FakeElement(self, text=each.get("text", "")) for each in self.session.elements
+                if each["by"] == by and each["value"] == value]
+
+    def find_element(self, by=By.ID, value: str = None) -> FakeElement:
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No recorded element {by}={value}")
+        return elements[0]
+
+    def set_page_load_timeout(self, time_to_wait: float):
+        self.page_load_timeout = time_to_wait
+
+    def get_cookies(self) -> list:
+        return list(self._cookies.values())
+
+    def get_cookie(self, name: str):
+        return self._cookies.get(name)
+
+    def add_cookie(self, cookie_dict: dict):
+        self._cookies[cookie_dict["name"]] = dict(cookie_dict)
+
+    def delete_all_cookies(self):
+        self._cookies = {}
+
+    def execute_cdp_cmd(self, cmd: str, cmd_args: dict) -> dict:
+        """The cookie commands of the Network domain"""
+        self.stats["execute_cdp_cmd"] += 1
+        if cmd == "Network.setCookie":
+            self._cookies[cmd_args["name"]] = dict(cmd_args)
+        elif cmd == "Network.deleteCookies":
+            cookie = self._cookies.get(cmd_args["name"])
+            if cookie is not None and cookie.get("domain", COOKIE_DOMAIN) == cmd_args.get("domain", COOKIE_DOMAIN):
+                del self._cookies[cmd_args["name"]]
+        return {}
+
+    def maximize_window(self):
+        pass
+
+    def close(self):
+        pass
+
+    def quit(self):
+        pass
+
+
+class FakeBasePage(BrowserEgress):
+    def __init__(self, driver: FakeDriver):
+        self.driver = driver
+        self.egress = None
+
+
+class FakeBrowser(object):
+    """Same attributes as a PooledBrowser"""
+
+    def __init__(self, driver: FakeDriver):
+        self.driver = driver
+        self.base_page = FakeBasePage(driver)
+        self.page_optional = PageOptional(driver=driver, clock=driver.clock)
+        self.uses = 0
+
+
+class FakeBrowserPool(object):
+    """BrowserPool handing out FakeDrivers that replay `session`, pass it as `browser_pool`"""
+
+    def __init__(self, session: RecordedSession, clock: VirtualClock = None):
+        self.session = session
+        self.clock = clock or VirtualClock()
+        self.last_driver = None
+
+    @contextmanager
+    def lease(self, timeout: float = None):
+        browser = FakeBrowser(FakeDriver(session=self.session, clock=self.clock))
+        browser.uses += 1
+        self.last_driver = browser.driver
+        yield browser
+
+    def close(self):
+        pass
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""Command line entry point.
+
+    fb-graphql-scraper crawl --input profiles.txt --days 30 --concurrency 8 --out results/
+
+One scraper (HTTP connection pool, rate limiter, bootstrap cache and browser)
+is shared by the whole batch. Each profile's result is written to
+`<out>/<profile>.json` as soon as it finishes; profiles whose result is
+already there and complete are skipped when the command is run again.
+
+    fb-graphql-scraper monitor --input profiles.txt --rpm 60 --out results/
+
+keeps re-crawling the profiles, each as often as it posts (workers/scheduler.py).
+With `--index posts.sqlite3` the posts are also indexed, `search` queries them.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fb_graphql_scraper.utils.deadline import STOP_COMPLETED
+from fb_graphql_scraper.utils.post_filter import PostFilter
+from fb_graphql_scraper.workers.crawl_worker import result_path, write_result
+
+
+def read_profiles(path: str) -> list:
+    """One profile per line, blank lines and `#` comments are ignored, duplicates dropped"""
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    profiles = []
+    with stream:
+        for line in stream:
+            profile = line.split("#", 1)[0].strip()
+            if profile and profile not in profiles:
+                profiles.append(profile)
+    return profiles
+
+
+def is_completed(out_dir: str, profile: str) -> bool:
+    """A result exists and the crawl was not cut short"""
+    path = result_path(out_dir, profile)
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return result.get("stop_reason", STOP_COMPLETED) == STOP_COMPLETED
+
+
+def build_scraper(args, rate_limiter=None):
+    from fb_graphql_scraper.facebook_graphql_scraper import FacebookGraphqlScraper
+
+    browser_pool = None
+    if args.browsers > 1:
+        from fb_graphql_scraper.base.browser_pool import BrowserPool
+        browser_pool = BrowserPool(
+            driver_path=args.driver_path,
+            size=args.browsers,
+            open_browser=args.open_browser,
+            fb_account=args.fb_account,
+            fb_pwd=args.fb_pwd,
+        )
+    return FacebookGraphqlScraper(
+        fb_account=args.fb_account,
+        fb_pwd=args.fb_pwd,
+        driver_path=args.driver_path,
+        open_browser=args.open_browser,
+        archive=args.archive,
+        browser_pool=browser_pool,
+        post_index=args.index,
+        rate_limiter=rate_limiter,
+    )
+
+
+def close_scraper(scraper):
+    """Quit the browsers and threads of a scraper made by build_scraper"""
+    scraper.close()
+    if scraper.browser_pool is not None:
+        scraper.browser_pool.close()
+
+
+def build_post_filter(args):
+    if (args.max_posts is None and args.min_reactions is None and args.min_comments is None
+            and not args.keyword and args.regex is None and args.has_attachments is None):
+        return None
+    return PostFilter(
+        max_posts=args.max_posts,
+        min_reactions=args.min_reactions,
+        min_comments=args.min_comments,
+        keywords=args.keyword,
+        regex=args.regex,
+        has_attachments=args.has_attachments,
+    )
+
+
+def crawl(args) -> int:
+    profiles = read_profiles(args.input)
+    pending = [profile for profile in profiles if not is_completed(args.out, profile)]
+    print(f"{len(profiles)} profiles, {len(profiles) - len(pending)} already completed, {len(pending)} to crawl.")
+    if not pending:
+        return 0
+
+    scraper = build_scraper(args)
+    try:
+        return crawl_with(scraper, args, pending)
+    finally:
+        close_scraper(scraper)
+
+
+def crawl_with(scraper, args, pending: list) -> int:
+    post_filter = build_post_filter(args)
+    ids = {}
+    if args.fb_account is None:
+        ids = scraper.bootstrap_profiles(pending, max_tabs=args.max_tabs)
+
+    def crawl_one(profile):
+        user_id, doc_id = ids.get(profile, (None, None))
+        return scraper.get_user_posts(
+            fb_username_or_userid=profile,
+            days_limit=args.days,
+            display_progress=False,
+            pipeline=args.pipeline,
+            user_id=user_id,
+            doc_id=doc_id,
+            time_budget=args.time_budget,
+            post_filter=post_filter,
+            profile=args.profile_dir,
+        )
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = {executor.submit(crawl_one, profile): profile for profile in pending}
+        for future in as_completed(futures):
+            profile = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{profile} failed, message: {e}")
+                continue
+            write_result(args.out, profile, result)
+            print(f"{profile}: {len(result['data'])} posts ({result.get('stop_reason', STOP_COMPLETED)}).")
+    print(f"Done, {len(pending) - failed} profiles written to {args.out}, {failed} failed.")
+    return 1 if failed else 0
+
+
+def monitor(args) -> int:
+    from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+    from fb_graphql_scraper.workers.scheduler import ActivityScheduler
+
+    # --rpm bounds every request the scraper sends, whatever its egress
+    rate_limiter = AdaptiveRateLimiter(total_rate=args.rpm / 60.0, total_burst=max(args.rpm / 6.0, 1.0))
+    scraper = build_scraper(args, rate_limiter=rate_limiter)
+    scheduler = ActivityScheduler(
+        scraper=scraper,
+        max_workers=args.concurrency,
+        initial_days_limit=args.days,
+        min_interval=args.min_interval * 60,
+        max_interval=args.max_interval * 3600,
+        out_dir=args.out,
+        state_path=args.state,
+        time_budget=args.time_budget,
+        display_progress=args.progress,
+    )
+    scheduler.add_profiles(read_profiles(args.input))
+    print(f"Monitoring {scheduler.stats()['profiles']} profiles, {args.rpm} requests per minute.")
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
+        scheduler.save_state(args.state)
+    finally:
+        close_scraper(scraper)
+    stats = scheduler.stats()
+    print(f"Stopped, {stats['crawled']} crawls done, {stats['failed']} failed.")
+    return 0
+
+
+def search(args) -> int:
+    from fb_graphql_scraper.utils.post_index import PostIndex
+
+    index = PostIndex(path=args.index)
+    posts = index.search(
+        query=" ".join(args.query) or None,
+        profile=args.profile,
+        since=args.since,
+        until=args.until,
+        limit=args.limit,
+        raw=args.raw,
+    )
+    for post in posts:
+        print(json.dumps(post, ensure_ascii=False))
+    return 0
+
+
+def add_browser_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--driver-path", default=os.environ.get("CHROMEDRIVER_PATH"),
+                        help="chromedriver, only used when a profile needs the browser")
+    parser.add_argument("--open-browser", action="store_true", help="Show the browser window")
+    parser.add_argument("--browsers", type=int, default=1, help="Size of the warm browser pool")
+    parser.add_argument("--archive", default=None, help="Directory archiving the raw GraphQL responses")
+    parser.add_argument("--index", default=None, help="SQLite file indexing the collected posts for search")
+    parser.add_argument("--fb-account", default=os.environ.get("FB_ACCOUNT"),
+                        help="Log in with this account (password from FB_PWD)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="fb-graphql-scraper", description="Facebook GraphQL scraper")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    crawl_parser = subparsers.add_parser("crawl", help="Crawl the posts of a list of profiles")
+    crawl_parser.add_argument("--input", required=True, help="File with one profile per line, '-' for stdin")
+    crawl_parser.add_argument("--out", required=True, help="Directory receiving <profile>.json results")
+    crawl_parser.add_argument("--days", type=int, default=61, help="Collect posts of the last N days")
+    crawl_parser.add_argument("--concurrency", type=int, default=4, help="Profiles crawled at the same time")
+    crawl_parser.add_argument("--time-budget", type=float, default=None, help="Seconds allowed per profile")
+    crawl_parser.add_argument("--pipeline", action="store_true", help="Overlap requests with parsing")
+    crawl_parser.add_argument("--profile-dir", default=None,
+                              help="Profile every crawl (cProfile + tracemalloc), reports are written here")
+    add_browser_arguments(crawl_parser)
+    crawl_parser.add_argument("--max-tabs", type=int, default=8, help="Profiles bootstrapped per browser at once")
+    crawl_parser.add_argument("--max-posts", type=int, default=None, help="Stop after N matching posts per profile")
+    crawl_parser.add_argument("--min-reactions", type=int, default=None, help="Keep posts with at least N reactions")
+    crawl_parser.add_argument("--min-comments", type=int, default=None, help="Keep posts with at least N comments")
+    crawl_parser.add_argument("--keyword", action="append", default=[], help="Keep posts containing it (repeatable)")
+    crawl_parser.add_argument("--regex", default=None, help="Keep posts whose text matches")
+    crawl_parser.add_argument("--has-attachments", action=argparse.BooleanOptionalAction, default=None,
+                              help="Keep only posts with (or without) attachments")
+    crawl_parser.set_defaults(func=crawl)
+
+    monitor_parser = subparsers.add_parser("monitor", help="Keep re-crawling profiles, each as often as it posts")
+    monitor_parser.add_argument("--input", required=True, help="File with one profile per line, '-' for stdin")
+    monitor_parser.add_argument("--out", required=True, help="Directory receiving the latest <profile>.json")
+    monitor_parser.add_argument("--state", default="monitor-state.json", help="Schedule kept between runs")
+    monitor_parser.add_argument("--rpm", type=float, default=60, help="Global budget of requests per minute")
+    monitor_parser.add_argument("--days", type=int, default=30, help="History collected by the first crawl")
+    monitor_parser.add_argument("--concurrency", type=int, default=4, help="Profiles crawled at the same time")
+    monitor_parser.add_argument("--min-interval", type=float, default=15, help="Minutes between two crawls, at least")
+    monitor_parser.add_argument("--max-interval", type=float, default=168, help="Hours between two crawls, at most")
+    monitor_parser.add_argument("--time-budget", type=float, default=None, help="Seconds allowed per crawl")
+    monitor_parser.add_argument("--progress", action="store_true", help="Print a line after every crawl")
+    add_browser_arguments(monitor_parser)
+    monitor_parser.set_defaults(func=monitor)
+
+    search_parser = subparsers.add_parser("search", help="Search the posts of an index, one json per line")
+    search_parser.add_argument("query", nargs="*", help="Terms that must all appear in the text")
+    search_parser.add_argument("--index", required=True, help="SQLite file written by crawl/monitor --index")
+    search_parser.add_argument("--profile", default=None, help="Only posts of this profile")
+    search_parser.add_argument("--since", default=None, help="Created at or after, YYYY-MM-DD[ HH:MM:SS]")
+    search_parser.add_argument("--until", default=None, help="Created at or before, YYYY-MM-DD[ HH:MM:SS]")
+    search_parser.add_argument("--limit", type=int, default=50, help="Newest N matches")
+    search_parser.add_argument("--raw", action="store_true", help="Pass the query to FTS5 as is (OR, NEAR, ...)")
+    search_parser.set_defaults(func=search)
+    return parser
+
+
+def main(argv: list = None) -> int:
+    args = build_parser().parse_args(argv)
+    args.fb_pwd = os.environ.get("FB_PWD")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
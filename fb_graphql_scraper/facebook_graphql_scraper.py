@@ -1,16 +1,20 @@
 # -*- coding: utf-8 -*-
-import time
 import json
-from bs4 import BeautifulSoup
-import requests
-from fb_graphql_scraper.base.base_page import BasePage
-from fb_graphql_scraper.pages.page_optional import PageOptional
-from fb_graphql_scraper.utils.parser import RequestsParser
-from fb_graphql_scraper.utils.locator import *
-from fb_graphql_scraper.utils.utils import *
-
-
-class FacebookSettings:
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fb_graphql_scraper.http_client import FacebookHttpClient, profiled_stage
+from fb_graphql_scraper.scrape_session import session_attribute
+from fb_graphql_scraper.utils.bootstrap import HttpBootstrapResolver
+from fb_graphql_scraper.utils.deadline import (
+    STOP_CANCELLED, STOP_DEADLINE, STOP_RATE_LIMITED, Deadline, DeadlineExceeded,
+)
+from fb_graphql_scraper.utils.utils import (
+    days_difference_from_now, extract_form_tokens, is_date_exceed_limit
+)
+from fb_graphql_scraper.utils.path_extractor import shape_key
+
+
+class FacebookSettings(FacebookHttpClient):
     """ How to use:
     from fb_graphql_scraper.facebook_graphql_scraper import FacebookGraphqlScraper as fb_graphql_scraper
     
@@ -36,33 +40,85 @@ class FacebookSettings:
         # res = fb_spider.get_user_posts(fb_username_or_userid=facebook_user_name, days_limit=days_limit,display_progress=True)
         # print(res)
     """
-    def __init__(self, fb_account: str = None, fb_pwd: str = None, driver_path: str = None, open_browser: bool = False):
-        super().__init__()
+    # Browser flow containers and stop conditions live on the current ScrapeSession
+    post_id_list = session_attribute("post_id_list")
+    reaction_count_list = session_attribute("reaction_count_list")
+    profile_feed = session_attribute("profile_feed")
+    res = session_attribute("res")
+    pre_diff_days = session_attribute("pre_diff_days")
+    counts_of_same_diff_days = session_attribute("counts_of_same_diff_days")
+    parsed_requests = session_attribute("parsed_requests")
+
+    def __init__(self, fb_account: str = None, fb_pwd: str = None, driver_path: str = None, open_browser: bool = False, rate_limiter=None, proxy_pool=None, archive=None, http_bootstrap: bool = True, browser_pool=None, hybrid_login: bool = True, session_store=None, media_downloader=None, post_index=None, page_cache_ttl: float = 30):
+        super().__init__(rate_limiter=rate_limiter, proxy_pool=proxy_pool, archive=archive, media_downloader=media_downloader, post_index=post_index, page_cache_ttl=page_cache_ttl)
         self.fb_account = fb_account
         self.fb_pwd = fb_pwd
         self.driver_path = driver_path
-        self._set_spider(
-            driver_path=driver_path, 
-            open_browser=open_browser
-        )
-        self._set_container()
-        self._set_stop_point()
+        self.open_browser = open_browser
+        # Resolve user_id / doc_id over plain HTTP first, Chrome is the fallback
+        self.bootstrap_resolver = HttpBootstrapResolver(
+            rate_limiter=self.rate_limiter, session=self.http) if http_bootstrap else None
+        # Optional SessionStore, restores saved logins instead of filling the login form
+        self.session_store = session_store
+        # Logged in: paginate over HTTP with the browser's session, scroll only as a fallback
+        self.hybrid_login = hybrid_login
+        # Bootstraps lease warm browsers from this BrowserPool instead of owning one
+        self.browser_pool = browser_pool
+        if getattr(browser_pool, "http_client", False) is None:
+            # Saved sessions of the pool's browsers are checked through this scraper
+            browser_pool.http_client = self
+        # The browser is only started (and selenium imported) the first time it is needed,
+        # crawls take turns on it through the lock
+        self._base_page = None
+        self._page_optional = None
+        self._browser_lock = threading.RLock()
+
+    @property
+    def base_page(self):
+        if self.session.base_page is not None:
+            return self.session.base_page
+        with self._browser_lock:
+            if self._base_page is None:
+                self._set_spider(driver_path=self.driver_path, open_browser=self.open_browser)
+        return self._base_page
+
+    @property
+    def page_optional(self):
+        if self.session.page_optional is not None:
+            return self.session.page_optional
+        with self._browser_lock:
+            if self._page_optional is None:
+                self._set_spider(driver_path=self.driver_path, open_browser=self.open_browser)
+        return self._page_optional
+
+    def close(self):
+        """Also quit the scraper's own browser. A browser_pool belongs to the caller, who closes it"""
+        super().close()
+        with self._browser_lock:
+            if self._base_page is not None:
+                self._base_page.driver.quit()
+                self._base_page, self._page_optional = None, None
 
     def _set_spider(self, driver_path, open_browser):
         """Description: Auto login account or click "X" button to continue,
         but some accounts cannot display info if you don't login account
         Args: url (str): target user which you want to collect data."""
-        self.base_page = BasePage(
+        from fb_graphql_scraper.base.base_page import BasePage
+        from fb_graphql_scraper.pages.page_optional import PageOptional
+
+        self._base_page = BasePage(
             driver_path=driver_path, 
-            open_browser=open_browser
+            open_browser=open_browser,
+            egress=self.egress,
         )
-        self.page_optional = PageOptional(
-            driver=self.base_page.driver,
+        self._page_optional = PageOptional(
+            driver=self._base_page.driver,
             fb_account=self.fb_account,
-            fb_pwd=self.fb_pwd
+            fb_pwd=self.fb_pwd,
+            session_store=self.session_store,
+            http_client=self,
         )
-        time.sleep(3)
-        self.requests_parser = RequestsParser(driver=self.page_optional.driver)
+        self.deadline.sleep(3)
 
     def _set_container(self):
         self.post_id_list = []
@@ -75,11 +131,6 @@ class FacebookSettings:
             "comment_share_type": [],
             "comment_share_value": []
         }
-        # Store last successful user_id and doc_id
-        if not hasattr(self, 'last_user_id'):
-            self.last_user_id = None
-        if not hasattr(self, 'last_doc_id'):
-            self.last_doc_id = None
 
     def _set_stop_point(self):
         self.pre_diff_days = float("-inf")
@@ -87,8 +138,8 @@ class FacebookSettings:
 
 
 class FacebookGraphqlScraper(FacebookSettings):
-    def __init__(self, fb_account: str = None, fb_pwd: str = None, driver_path: str = None, open_browser: bool = False):
-        super().__init__(fb_account=fb_account, fb_pwd=fb_pwd, driver_path=driver_path,open_browser=open_browser)
+    def __init__(self, fb_account: str = None, fb_pwd: str = None, driver_path: str = None, open_browser: bool = False, rate_limiter=None, proxy_pool=None, archive=None, http_bootstrap: bool = True, browser_pool=None, hybrid_login: bool = True, session_store=None, media_downloader=None, post_index=None, page_cache_ttl: float = 30):
+        super().__init__(fb_account=fb_account, fb_pwd=fb_pwd, driver_path=driver_path,open_browser=open_browser, rate_limiter=rate_limiter, proxy_pool=proxy_pool, archive=archive, http_bootstrap=http_bootstrap, browser_pool=browser_pool, hybrid_login=hybrid_login, session_store=session_store, media_downloader=media_downloader, post_index=post_index, page_cache_ttl=page_cache_ttl)
 
     def check_progress(self, days_limit: int = 61, display_progress:bool=True):
         """Check the published date of collected posts"""
@@ -105,11 +156,11 @@ class FacebookGraphqlScraper(FacebookSettings):
                 for each_body in body_out:
                     json_data = json.loads(each_body)
                     try:
-                        each_res = json_data['data']['node'].copy()
-                        each_feedback = find_feedback_with_subscription_target_id(
-                            each_res)
+                        shape = shape_key(json_data)
+                        each_feedback = self.requests_parser.extractor.find(
+                            json_data['data']['node'], "feedback", shape)
                         if each_feedback:
-                            creation_time = find_creation(json_data)
+                            creation_time = self.requests_parser.extractor.find(json_data, "creation_time", shape)
                             tmp_creation_array.append(int(creation_time))
                     except Exception as e: # 可以直接略過, 表示此graphql內容並非貼文
                         pass
@@ -124,141 +175,276 @@ class FacebookGraphqlScraper(FacebookSettings):
             print(f"To access posts acquired within the past {self.pre_diff_days} days.") # 已取得n日內貼文
         return is_date_exceed_limit(max_days_ago=diff_days, days_limit=days_limit)
     
-    def get_profile_feed(self, dict_in:dict={"data-pagelet": "ProfileTilesFeed_0"}):
-        time.sleep(2)
-        page_source = (self.page_optional.driver.page_source)
+    def get_profile_feed(self, dict_in:dict={"data-pagelet": "ProfileTilesFeed_0"}, page_source: str = None):
+        """Profile intro texts, from the live page or from a `page_source` snapshot"""
+        from bs4 import BeautifulSoup
+        if page_source is None:
+            self.deadline.sleep(2)
+            page_source = (self.page_optional.driver.page_source)
         soup = BeautifulSoup(page_source, "html.parser")
         target_div = soup.find("div", dict_in)
         if target_div:
             texts = target_div.find_all(text=True)
         return texts[2::]
     
-    def get_plugin_page_followers(self, fb_username_or_userid):
-        """透過嵌入式貼文取得粉絲專頁追蹤人數"""
-        plugin_page_url = f"https://www.facebook.com/plugins/page.php?href=https%3A%2F%2Fwww.facebook.com%2F{fb_username_or_userid}&tabs=timeline&width=340&height=500&small_header=false&adapt_container_width=true&hide_cover=false&show_facepile=true&appId&locale=en_us"
-        plugin_response = requests.get(url=plugin_page_url)
-        plugin_soup = BeautifulSoup(plugin_response.text, "html.parser")
-        plugin_soup = plugin_soup.find("div", class_="_1drq")
-        if not plugin_soup:
-            return plugin_soup
-        return plugin_soup.text
-    
-    def format_data(self, res_in, fb_username_or_userid, new_reactions):
-        final_res = []
-        
-        # 直接使用 res_in 的資料（來自 collect_posts）
-        for i, post_data in enumerate(res_in):
-            # 確保 post_url 是字串格式而非列表
-            post_url = post_data['post_url'][0] if isinstance(post_data['post_url'], list) else post_data['post_url']
-
-            post_info = {
-                'post_id': post_data['post_id'],
-                'post_url': post_url,
-                'creation_time': post_data['creation_time'],
-                'attachments': post_data['attachments'],
-                'text': post_data['text'],
-                'total_reaction_count': post_data['total_reaction_count'],
-                'reactions': post_data['reactions'],
-                'comment_count': post_data['comment_count'],
-                'share_count': post_data['share_count']
-            }
-            
-            final_res.append(post_info)
-
-        filtered_post_id = set()
-        filtered_data = []
-        for each_data in final_res:
-            if each_data["post_id"] not in filtered_post_id:
-                filtered_data.append(each_data)
-                filtered_post_id.add(each_data["post_id"])
-        
-        return filtered_data
-
-    def process_reactions(self, res_in):
-        reactions_out = res_in
-        # for each_res in res_in:
-        #     each_reactions = each_res['top_reactions']['edges']
-        #     processed_reactions = self.requests_parser.process_reactions(
-        #         reactions_in=each_reactions)
-        #     reactions_out.append(processed_reactions)
-        return reactions_out
-    
-    def get_init_payload(self):
+    def get_init_payload(self, friendly_name: str = None):
+        """Form of the first GraphQL request the page sent,
+        only requests for the `friendly_name` query are considered when it is given"""
         requests_list = self.page_optional.driver.requests
+        payload = None
         for req in requests_list:
             if req.url == "https://www.facebook.com/api/graphql/":
-                payload = req.body.decode('utf-8')  # 解碼成字串
+                body = req.body.decode('utf-8')  # 解碼成字串
+                if friendly_name and friendly_name not in body:
+                    continue
+                payload = body
                 break
+        if payload is None:
+            raise ValueError("No GraphQL request captured yet")
         first_payload = self.requests_parser.extract_first_payload(payload=payload)
         return first_payload
 
 
-    def get_user_posts(self, fb_username_or_userid: str, days_limit: int = 61, display_progress:bool=True) -> dict:
-        url = f"https://www.facebook.com/{fb_username_or_userid}?locale=en_us" # 建立完整user連結
-        self.page_optional.load_next_page(url=url, clear_limit=20)# driver 跳至該連結
-        self.page_optional.load_next_page(url=url, clear_limit=20)# 徹底清除requests避免參雜上一用戶資料
-        self.requests_parser._clean_res() # 清空所有用於儲存結果的array
-        self._set_container() # 清空用於儲存貼文資訊的array
-        self._set_stop_point() # 設置/重置停止條件 | 停止條件: 瀏覽器無法往下取得更多貼文(n次) or 已取得目標天數內貼文
-
-        # If you did not login, click X button
-        if self.fb_account == None:
-            self.page_optional.click_reject_login_button()
-            time.sleep(2)
-            self.page_optional.scroll_window_with_parameter("4000")
-
-            # Initialize variables
-            user_id = None
-            doc_id = None
+    def get_user_posts(self, fb_username_or_userid: str, days_limit: int = 61, display_progress:bool=True, pipeline:bool=False,
+                       user_id: str = None, doc_id: str = None, time_budget: float = None, deadline: Deadline = None,
+                       post_filter=None, profile=None) -> dict:
+        """Collect posts of a profile.
+        Without an account, `user_id` and `doc_id` come from the arguments or from
+        the HTTP bootstrap; the browser is only started if both of those fail.
+        Each call runs in its own ScrapeSession, calls from several threads do not interfere.
+        `time_budget` (seconds) or `deadline` bounds the whole call, when it runs out the
+        posts collected so far are returned and "stop_reason" says why.
+        `post_filter` (a PostFilter) keeps only matching posts and stops at its max_posts.
+        `profile=True` (or a directory) runs the call under cProfile + tracemalloc, the report
+        is described in "profiling" of the result; None follows FB_SCRAPER_PROFILE."""
+        with self.new_session():
+            self._set_deadline(time_budget=time_budget, deadline=deadline)
+            self.requests_parser.post_filter = post_filter
+            self.crawl_profile = fb_username_or_userid
+            self._acquire_egress(profile=fb_username_or_userid)
+            try:
+                with self._profiling(profile=profile, label=fb_username_or_userid) as profiler:
+                    try:
+                        res = self._get_user_posts(
+                            fb_username_or_userid=fb_username_or_userid,
+                            days_limit=days_limit,
+                            display_progress=display_progress,
+                            pipeline=pipeline,
+                            user_id=user_id,
+                            doc_id=doc_id,
+                        )
+                    except DeadlineExceeded as e:
+                        # Stopped before any post could be collected, e.g. during the bootstrap
+                        print(f"Stop collecting posts ({e.reason}).")
+                        self.stop_reason = e.reason
+                        res = {
+                            "fb_username_or_userid": fb_username_or_userid,
+                            "profile": self.collect_metadata(default=self.profile_feed),
+                            "data": [],
+                            "stop_reason": self._get_stop_reason(),
+                        }
+            finally:
+                self._release_egress()
+        if profiler is not None:
+            res["profiling"] = profiler.save()
+        return res
+
+    def _get_user_posts(self, fb_username_or_userid: str, days_limit: int, display_progress: bool, pipeline: bool,
+                        user_id: str = None, doc_id: str = None) -> dict:
+        resolved_over_http = False
+        profile_html = None
+        if self.fb_account is None and not (user_id and doc_id) and self.bootstrap_resolver is not None:
+            with self._stage("bootstrap"):
+                user_id, doc_id, profile_html = self.bootstrap_resolver.resolve_page(
+                    fb_username_or_userid, request_kwargs=self._request_kwargs(), identity=self.egress_identity,
+                    timeout=self.deadline.timeout())
+            resolved_over_http = bool(user_id and doc_id)
+            if not resolved_over_http:
+                print("HTTP bootstrap failed, fall back to the browser.")
+        if self.fb_account is None and user_id and doc_id:
+            # Profile info is parsed from the page the bootstrap fetched while the timeline is paginated,
+            # it stays empty when user_id and doc_id were given and no page was fetched
+            if profile_html is not None:
+                self.submit_metadata(self.parse_profile_feed, fb_username_or_userid, profile_html)
+            res = self.requests_flow(
+                doc_id=doc_id,
+                fb_username_or_userid=user_id,
+                days_limit=days_limit,
+                profile_feed=[],
+                display_progress=display_progress,
+                pipeline=pipeline,
+            )
+            res["profile"] = self.collect_metadata()
+            if resolved_over_http and not res["data"]:
+                # The cached doc_id may be stale, look it up again for the next profile
+                self.bootstrap_resolver.forget_doc_id()
+            return res
 
-            for _ in range(30):
-                try:
-                    init_payload = self.get_init_payload()
-                    payload_variables = init_payload.get("variables")
-                    user_id = str(payload_variables["id"])
-                    doc_id = str(init_payload.get("doc_id"))
-                    # Store successful values
-                    self.last_user_id = user_id
-                    self.last_doc_id = doc_id
-                    print("Collect posts wihout loggin in.")
-                    break
-                except Exception as e:
-                    print("Wait 1 second to load page")
-                    time.sleep(1)
+        browser_kwargs = dict(
+            fb_username_or_userid=fb_username_or_userid,
+            days_limit=days_limit,
+            display_progress=display_progress,
+            pipeline=pipeline,
+        )
+        if self.browser_pool is not None:
+            return self._collect_with_pooled_browser(**browser_kwargs)
+        return self._collect_with_own_browser(**browser_kwargs)
+
+    def _collect_with_pooled_browser(self, **kwargs) -> dict:
+        """Run the browser flow on a browser leased from the pool"""
+        with self.browser_pool.lease() as browser:
+            self.session.base_page, self.session.page_optional = browser.base_page, browser.page_optional
+            self.requests_parser.driver = browser.driver
+            if self.egress is not None:
+                browser.base_page.apply_egress(self.egress)
+            try:
+                return self._collect_user_posts(**kwargs)
+            finally:
+                self.session.base_page, self.session.page_optional = None, None
+
+    def _collect_with_own_browser(self, **kwargs) -> dict:
+        """Run the browser flow on the scraper's own browser, one crawl at a time"""
+        with self._browser_lock:
+            # Held by the session while the crawl runs on it, so a swapped egress is applied to it
+            self.session.base_page, self.session.page_optional = self.base_page, self.page_optional
+            self.requests_parser.driver = self.page_optional.driver
+            if self.egress is not None:
+                self.base_page.apply_egress(self.egress)
+            try:
+                return self._collect_user_posts(**kwargs)
+            finally:
+                self.session.base_page, self.session.page_optional = None, None
 
-            # Check if variables were successfully obtained, use last values if available
-            if user_id is None or doc_id is None:
-                if self.last_user_id is not None and self.last_doc_id is not None:
-                    user_id = self.last_user_id
-                    doc_id = self.last_doc_id
-                    print(f"Using previous user_id and doc_id values: {user_id}, {doc_id}")
-                else:
-                    print("Warning: Failed to obtain user_id or doc_id after 30 attempts. Will collect profile data only.")
-                    # Set flag to indicate we should return partial data
-                    user_id = None
-                    doc_id = None
+    def bootstrap_profiles(self, profiles: list, max_tabs: int = 8, time_budget: float = None) -> dict:
+        """Resolve (user_id, doc_id) of a batch of profiles for logged-out crawls.
+        Profiles are looked up over HTTP first (in parallel), the rest are opened
+        together in tabs of one browser instead of one browser each.
 
-        # Get profile information
+        Returns:
+            dict: {profile: (user_id, doc_id)}, profiles that could not be resolved are left out.
+        """
+        with self.new_session():
+            self._set_deadline(time_budget=time_budget)
+            deadline = self.deadline
+            resolved = {}
+            if self.bootstrap_resolver is not None and profiles:
+                # The first lookup finds the doc_id, the others reuse the cached one
+                results = [self._resolve_over_http(profiles[0], deadline)]
+                with ThreadPoolExecutor(max_workers=max_tabs) as executor:
+                    results += executor.map(lambda each: self._resolve_over_http(each, deadline), profiles[1:])
+                for profile, ids in zip(profiles, results):
+                    if all(ids):
+                        resolved[profile] = ids
+            missing = [profile for profile in profiles if profile not in resolved]
+            if missing and self.deadline.stop_reason is None:
+                resolved.update(self._resolve_in_tabs(missing, max_tabs=max_tabs))
+        if resolved and self.bootstrap_resolver is not None and self.bootstrap_resolver.doc_id is None:
+            self.bootstrap_resolver.remember_doc_id(next(iter(resolved.values()))[1])
+        return resolved
+
+    def _resolve_over_http(self, profile: str, deadline: Deadline) -> tuple:
+        """HTTP bootstrap of one profile through its own egress"""
+        with self.new_session():
+            self._set_deadline(deadline=deadline)
+            self._acquire_egress(profile=profile)
+            try:
+                return self.bootstrap_resolver.resolve(
+                    profile, request_kwargs=self._request_kwargs(), identity=self.egress_identity,
+                    timeout=self.deadline.timeout())
+            except DeadlineExceeded:
+                return None, None
+            finally:
+                self._release_egress()
+
+    def _resolve_in_tabs(self, profiles: list, max_tabs: int) -> dict:
+        from fb_graphql_scraper.pages.tab_bootstrap import TabBootstrap
+
+        if self.browser_pool is not None:
+            with self.browser_pool.lease() as browser:
+                return TabBootstrap(driver=browser.driver, max_tabs=max_tabs).resolve(profiles, deadline=self.deadline)
+        with self._browser_lock:
+            return TabBootstrap(driver=self.page_optional.driver, max_tabs=max_tabs).resolve(
+                profiles, deadline=self.deadline)
+
+    def _collect_user_posts(self, fb_username_or_userid: str, **kwargs) -> dict:
+        """Browser flow, returns what the browser captured so far when the deadline runs out"""
         try:
-            if self.fb_account == None:
-                profile_feed = self.get_profile_feed(dict_in={"class": "xieb3on"})
-            else:
-                profile_feed = self.get_profile_feed()
-
-        except Exception as e:
+            res = self._browse_user_posts(fb_username_or_userid=fb_username_or_userid, **kwargs)
+        except DeadlineExceeded as e:
+            print(f"Stop collecting posts ({e.reason}), return the posts collected so far.")
+            self.stop_reason = e.reason
+            res = self._collect_captured_posts(fb_username_or_userid=fb_username_or_userid)
+        res["profile"] = self.collect_metadata(default=res["profile"])
+        return res
+
+    def parse_profile_feed(self, fb_username_or_userid: str, page_source: str) -> list:
+        """Profile info from a snapshot of the profile page, plus the follower count of fan pages"""
+        dict_ins = [{"class": "xieb3on"}, {"data-pagelet": "ProfileTilesFeed_0"}]
+        if self.fb_account is not None:
+            dict_ins.reverse()
+        profile_feed = []
+        for dict_in in dict_ins:
             try:
-                if self.fb_account != None:
-                    profile_feed = self.get_profile_feed(dict_in={"class": "xieb3on"})
-                else:
-                    profile_feed = self.get_profile_feed()
-                    
-            except Exception as e:
-                print("Collect profile info failed, profile info will be empty array.")
-                profile_feed = []
+                profile_feed = self.get_profile_feed(dict_in=dict_in, page_source=page_source)
+                break
+            except Exception:
+                continue
+        else:
+            print("Collect profile info failed, profile info will be empty array.")
 
         if "Page" in profile_feed:
-            followers = self.get_plugin_page_followers(fb_username_or_userid=fb_username_or_userid)
+            followers = self.get_cached_followers(fb_username_or_userid=fb_username_or_userid)
             if followers: profile_feed.append(followers)
+        return profile_feed
+
+    def _parse_captured_requests(self, fb_username_or_userid: str, wait_pending: bool = True):
+        """Parse the GraphQL responses captured since the last call.
+        With `wait_pending=False` it stops at the first request still waiting for its response."""
+        driver_requests = self.page_optional.driver.requests
+        for req in driver_requests[self.parsed_requests:]:
+            req_response, req_url = req.response, req.url
+            if req_response is None and not wait_pending:
+                break
+            self.parsed_requests += 1
+            body_out = self.requests_parser.get_graphql_body_content(
+                req_response=req_response, req_url=req_url,
+                archive=True, profile=fb_username_or_userid)
+            if body_out:
+                with self._stage("parse_body"):
+                    self.requests_parser.parse_body(body_content=self._iterate("decode", body_out))
+
+    def _collect_captured_posts(self, fb_username_or_userid: str) -> dict:
+        """Parse the GraphQL responses captured by the browser into the result"""
+        self._parse_captured_requests(fb_username_or_userid=fb_username_or_userid)
+        with self._stage("collect_posts"):
+            res_out = self.requests_parser.collect_posts()
+        new_reactions = self.process_reactions(res_in=res_out)
+
+        # 建立result
+        final_res = self.format_data(
+            res_in=res_out,
+            fb_username_or_userid=fb_username_or_userid,
+            new_reactions=new_reactions
+        )
+        return {
+            "fb_username_or_userid": fb_username_or_userid,
+            "profile": self.profile_feed,
+            "data": final_res,
+            "stop_reason": self._get_stop_reason(),
+        }
+
+    def _browse_user_posts(self, fb_username_or_userid: str, days_limit: int = 61, display_progress:bool=True, pipeline:bool=False) -> dict:
+        url = f"https://www.facebook.com/{fb_username_or_userid}?locale=en_us" # 建立完整user連結
+        self.requests_parser._clean_res() # 清空所有用於儲存結果的array
+        self._set_container() # 清空用於儲存貼文資訊的array
+        self._set_stop_point() # 設置/重置停止條件 | 停止條件: 瀏覽器無法往下取得更多貼文(n次) or 已取得目標天數內貼文
+        user_id, doc_id = self._open_profile_page(url=url)
+        self.parsed_requests = 0
+
+        # Get profile information from a snapshot of the page, parsed while the posts are collected
+        if self.fb_account is not None:
+            self.deadline.sleep(2)
+        self.submit_metadata(self.parse_profile_feed, fb_username_or_userid, self.page_optional.driver.page_source)
 
         # collect data without login
         if self.fb_account == None:
@@ -266,36 +452,38 @@ class FacebookGraphqlScraper(FacebookSettings):
             if user_id is None or doc_id is None:
                 print("Warning: Could not obtain user_id or doc_id. Collecting available data from stored requests.")
                 # Collect data from stored requests
-                driver_requests = self.page_optional.driver.requests
-                for req in driver_requests:
-                    req_response, req_url = req.response, req.url
-                    body_out = self.requests_parser.get_graphql_body_content(
-                        req_response=req_response, req_url=req_url)
-                    if body_out:
-                        self.requests_parser.parse_body(body_content=body_out)
-
-                res_out = self.requests_parser.collect_posts()
-                new_reactions = self.process_reactions(res_in=res_out)
-
-                # Format and return the collected data
-                final_res = self.format_data(
-                    res_in=res_out,
-                    fb_username_or_userid=fb_username_or_userid,
-                    new_reactions=new_reactions
-                )
-                print(f"Returning partial data: collected {len(final_res)} posts from stored requests.")
-                return {
-                    "fb_username_or_userid": fb_username_or_userid,
-                    "profile": profile_feed,
-                    "data": final_res,
-                }
-            res = self.requests_flow(doc_id = doc_id, fb_username_or_userid=user_id, days_limit=days_limit, profile_feed=profile_feed, display_progress=display_progress)
+                res = self._collect_captured_posts(fb_username_or_userid=fb_username_or_userid)
+                print(f"Returning partial data: collected {len(res['data'])} posts from stored requests.")
+                return res
+            res = self.requests_flow(doc_id = doc_id, fb_username_or_userid=user_id, days_limit=days_limit, profile_feed=[], display_progress=display_progress, pipeline=pipeline)
             return res
 
+        # Logged in: reuse the browser's session to paginate at HTTP speed
+        if self.hybrid_login:
+            res = self._collect_logged_in_over_http(
+                fb_username_or_userid=fb_username_or_userid,
+                days_limit=days_limit,
+                profile_feed=[],
+                display_progress=display_progress,
+                pipeline=pipeline,
+            )
+            if res is not None:
+                return res
+            print("Collect posts over HTTP failed, fall back to scrolling the page.")
+            self.stop_reason = None
+
         # Scroll page
         # print("-------------------- Another execute process is started.......... --------------------")
         counts_of_round = 0
+        post_filter = self.requests_parser.post_filter
         for _ in range(1000): # max rounds of scrolling page
+            self.deadline.check()
+            # With max_posts the captured responses are parsed as they arrive, to stop scrolling once enough posts were kept
+            if post_filter is not None and post_filter.max_posts is not None:
+                self._parse_captured_requests(fb_username_or_userid=fb_username_or_userid, wait_pending=False)
+                if self.requests_parser.is_full():
+                    print(f"Collected {post_filter.max_posts} posts, stop scrolling the page.")
+                    break
             self.page_optional.scroll_window()
             if counts_of_round >= 5:  # Check progress every 5 times you scroll the page
                 if display_progress:
@@ -311,116 +499,98 @@ class FacebookGraphqlScraper(FacebookSettings):
                     counts_of_round = 0
 
             counts_of_round += 1
-            pause(0.7)
+            self.deadline.sleep(0.7)
 
         # Collect data, extract graphql from driver requests.
-        driver_requests = self.page_optional.driver.requests
-        for req in driver_requests:
-            req_response, req_url = req.response, req.url
-            body_out = self.requests_parser.get_graphql_body_content(
-                req_response=req_response, req_url=req_url)
-            if body_out:
-                self.requests_parser.parse_body(body_content=body_out)
-        res_out = self.requests_parser.collect_posts()
-        new_reactions = self.process_reactions(res_in=res_out)
-
-        # 建立result
-        final_res = self.format_data(
-            res_in=res_out, 
-            fb_username_or_userid=fb_username_or_userid, 
-            new_reactions=new_reactions
-        )
-        return {
-            "fb_username_or_userid": fb_username_or_userid,
-            "profile": profile_feed,
-            "data": final_res,
-        }
-        
-    def requests_flow(self, doc_id:str, fb_username_or_userid:str, days_limit:int, profile_feed:list, display_progress=True):
-        """
-        Fetch more posts from a user's Facebook profile using the requests module.
+        return self._collect_captured_posts(fb_username_or_userid=fb_username_or_userid)
 
-        Flow:
-            1. Get the document ID of the target Facebook profile.
-            2. Use the requests module to fetch data from the profile.
-            3. Continuously fetch data by checking for new posts until the specified days limit is reached.
+    @profiled_stage("bootstrap")
+    def _open_profile_page(self, url: str) -> tuple:
+        """Load the profile page, logged out also capture the ids of its timeline query.
+        Returns (user_id, doc_id), (None, None) when logged in or not found."""
+        user_id, doc_id = None, None
+        self.page_optional.load_next_page(url=url, clear_limit=20, deadline=self.deadline)# driver 跳至該連結
+        self.page_optional.load_next_page(url=url, clear_limit=20, deadline=self.deadline)# 徹底清除requests避免參雜上一用戶資料
 
-        Args:
-            doc_id (str): The document ID of the target Facebook account.
-            fb_username_or_userid (str): The Facebook username or user ID of the target account.
-            days_limit (int): The number of days for which to fetch posts (limits the time range of retrieved posts).
-            profile_feed (list): A list containing the posts retrieved from the target profile.
-
-        Helper Functions:
-            1. get_before_time:
-                Retrieves Facebook posts from a specified time period before the current date.
-
-            2. get_payload:
-                Prepares the payload for the next round of requests to the server.
+        # If you did not login, click X button
+        if self.fb_account == None:
+            self.page_optional.click_reject_login_button(deadline=self.deadline)
+            self.deadline.sleep(2)
+            self.page_optional.scroll_window_with_parameter("4000")
 
-            3. get_next_page_status:
-                Checks whether the target Facebook user has more posts available for retrieval.
+            # Initialize variables
+            user_id = None
+            doc_id = None
 
-            4. compare_timestamp:
-                Verifies whether a retrieved post falls within the specified time period for collection.
-        """
+            for _ in range(30):
+                try:
+                    init_payload = self.get_init_payload()
+                    payload_variables = init_payload.get("variables")
+                    user_id = str(payload_variables["id"])
+                    doc_id = str(init_payload.get("doc_id"))
+                    print("Collect posts wihout loggin in.")
+                    break
+                except Exception as e:
+                    print("Wait 1 second to load page")
+                    self.deadline.sleep(1)
 
-        url = "https://www.facebook.com/api/graphql/"
-        before_time = get_before_time()
-        loop_limit = 5000
-        is_first_time = True
-        # Extract data
-        for i in range(loop_limit):
-            if is_first_time:
-                payload_in = get_payload(
-                    doc_id_in=doc_id, 
-                    id_in=fb_username_or_userid, 
-                    before_time=before_time
-                )
-                is_first_time = False
-                
-            # if not the first time send request, use function 'get_next_payload' for extracting end cursor to scrape next round
-            elif not is_first_time:
-                next_cursor = get_next_cursor(body_content_in=body_content)
-                payload_in = get_next_payload(
-                    doc_id_in=doc_id, 
-                    id_in=fb_username_or_userid, 
-                    before_time=before_time, # input before_time
-                    cursor_in=next_cursor
-                )
-            
-            response = requests.post(
-                url=url, 
-                data=payload_in,
+            # The ids of another profile would return its posts, without them only partial data is collected
+            if user_id is None or doc_id is None:
+                print("Warning: Failed to obtain user_id or doc_id after 30 attempts. Will collect profile data only.")
+                user_id = None
+                doc_id = None
+        return user_id, doc_id
+
+    @profiled_stage("bootstrap")
+    def export_browser_session(self, init_payload: dict) -> tuple:
+        """Cookies, form tokens and headers of the logged-in browser, for HTTP requests.
+        Tokens come from the GraphQL form the page sent, the page source fills the gaps."""
+        driver = self.page_optional.driver
+        cookies = {each["name"]: each["value"] for each in driver.get_cookies()}
+        form = {k: v for k, v in init_payload.items() if isinstance(v, str)}
+        for name, value in extract_form_tokens(driver.page_source).items():
+            form.setdefault(name, value)
+        headers = {"User-Agent": driver.execute_script("return navigator.userAgent")}
+        return cookies, form, headers
+
+    @profiled_stage("bootstrap")
+    def _capture_timeline_query(self):
+        """Scroll until the page sends its timeline query, returns its payload (None if it never does)"""
+        self.page_optional.scroll_window_with_parameter("4000")
+        for _ in range(30):
+            try:
+                return self.get_init_payload(friendly_name="ProfileCometTimelineFeedRefetchQuery")
+            except Exception:
+                self.deadline.sleep(1)
+        return None
+
+    def _collect_logged_in_over_http(self, fb_username_or_userid: str, days_limit: int, profile_feed: list,
+                                     display_progress: bool = True, pipeline: bool = False):
+        """Paginate the timeline through requests_flow with the browser's logged-in session.
+        Returns None when the timeline request could not be captured or nothing came back."""
+        init_payload = self._capture_timeline_query()
+        if init_payload is None:
+            return None
+
+        user_id = str(init_payload["variables"]["id"])
+        doc_id = str(init_payload["doc_id"])
+        cookies, form, headers = self.export_browser_session(init_payload=init_payload)
+        if "c_user" not in cookies or "fb_dtsg" not in form:
+            print("The browser session is not logged in.")
+            return None
+
+        self.use_authenticated_session(cookies=cookies, form=form, headers=headers)
+        try:
+            res = self.requests_flow(
+                doc_id=doc_id,
+                fb_username_or_userid=user_id,
+                days_limit=days_limit,
+                profile_feed=profile_feed,
+                display_progress=display_progress,
+                pipeline=pipeline,
             )
-            body = response.content
-            decoded_body = body.decode("utf-8")
-            body_content = decoded_body.split("\n")
-            self.requests_parser.parse_body(body_content=body_content)
-
-            # Check progress
-            next_page_status = get_next_page_status(body_content=body_content)
-            
-            before_time = str(self.requests_parser.creation_list[-1])
-            if not next_page_status:
-                print("There are no more posts.")
-                break
-            
-            # date_object = int(datetime.strptime(before_time, "%Y-%m-%d"))
-            if compare_timestamp(timestamp=int(before_time), days_limit=days_limit, display_progress=display_progress):
-                print(f"The scraper has successfully retrieved posts from the past {str(days_limit)} days.")
-                break
-
-        res_out = self.requests_parser.collect_posts()
-        new_reactions = self.process_reactions(res_in=res_out)
-        # create result
-        final_res = self.format_data(
-            res_in=res_out, 
-            fb_username_or_userid=fb_username_or_userid, 
-            new_reactions=new_reactions
-        )
-        return {
-            "fb_username_or_userid": fb_username_or_userid,
-            "profile": profile_feed,
-            "data": final_res,
-        }
\ No newline at end of file
+        finally:
+            self.clear_authenticated_session()
+        if not res["data"] and self.stop_reason not in (STOP_DEADLINE, STOP_RATE_LIMITED, STOP_CANCELLED):
+            return None
+        return res
@@ -0,0 +1,760 @@
+# -*- coding: utf-8 -*-
+import functools
+import json
+import os
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager, nullcontext
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import quote
+import requests
+from requests.adapters import HTTPAdapter
+from fb_graphql_scraper.scrape_session import ScrapeSession, SessionScope, session_attribute
+from fb_graphql_scraper.utils.cache import SingleFlight, TTLCache
+from fb_graphql_scraper.utils.deadline import (
+    STOP_COMPLETED, STOP_INCOMPLETE, STOP_RATE_LIMITED, STOP_REJECTED, Deadline, DeadlineExceeded
+)
+from fb_graphql_scraper.utils.engagement import ENGAGEMENT_COLUMNS, engagement_row, find_feedback, get_feedback_payload
+from fb_graphql_scraper.utils.rate_limiter import (
+    DEFAULT_IDENTITY, OUTCOME_ERROR, OUTCOME_OK, classify_response, get_rate_limiter
+)
+from fb_graphql_scraper.utils.utils import (
+    compare_timestamp, get_before_time, get_last_creation_time, get_next_cursor,
+    get_next_page_status, get_next_payload, get_page_info, get_payload, get_payload_key, iter_json_lines
+)
+
+# Bytes read from the socket at a time while streaming a GraphQL body
+STREAM_CHUNK_SIZE = 64 * 1024
+# "1" profiles every crawl into ./profiles, any other value is the directory of the reports
+PROFILE_ENV = "FB_SCRAPER_PROFILE"
+DEFAULT_PROFILE_DIR = "profiles"
+_NO_STAGE = nullcontext()
+
+
+def get_profile_dir(profile=None):
+    """Directory of the profiling reports, None when the crawl is not profiled.
+    `profile` is a bool or a directory, None defers to the FB_SCRAPER_PROFILE environment variable."""
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV, "")
+        if profile.lower() in ("", "0", "false", "no", "off"):
+            return None
+        if profile.lower() in ("1", "true", "yes", "on"):
+            profile = True
+    if profile is True:
+        return DEFAULT_PROFILE_DIR
+    return profile or None
+
+
+def profiled_stage(name: str):
+    """Count the calls of a client method as the stage `name` of a profiled crawl"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = self.profiler
+            if profiler is None:
+                return method(self, *args, **kwargs)
+            with profiler.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class FacebookHttpClient(object):
+    """ Browser-free client: paginates a profile's timeline over plain HTTP.
+    Importing it does not load selenium / selenium-wire, use it when the
+    numeric user id and the timeline doc_id are already known.
+
+    How to use:
+    from fb_graphql_scraper.http_client import FacebookHttpClient
+
+    client = FacebookHttpClient()
+    res = client.crawl(user_id="100044253168423", doc_id="1234567890123456", days_limit=30)
+
+    Every crawl runs in its own ScrapeSession, so one client can be shared
+    by the threads of a pool. `time_budget` (seconds) or a `Deadline` bounds
+    a crawl end to end, its result tells why it stopped in "stop_reason".
+    """
+    # Per-crawl state, read from / written to the current ScrapeSession
+    requests_parser = session_attribute("requests_parser")
+    crawl_profile = session_attribute("profile")
+    egress = session_attribute("egress")
+    egress_profile = session_attribute("egress_profile")
+    # Cookies / form tokens / headers of a logged-in session, sent with every GraphQL request
+    auth_cookies = session_attribute("auth_cookies")
+    auth_form = session_attribute("auth_form")
+    auth_headers = session_attribute("auth_headers")
+    deadline = session_attribute("deadline")
+    stop_reason = session_attribute("stop_reason")
+    metadata_future = session_attribute("metadata_future")
+    profiler = session_attribute("profiler")
+
+    def __init__(self, rate_limiter=None, proxy_pool=None, archive=None, pool_size: int = 32,
+                 request_timeout: float = 30, metadata_ttl: float = 6 * 3600, media_downloader=None,
+                 post_index=None, page_cache_ttl: float = 30, page_cache_size: int = 64 * 1024 * 1024):
+        # Shared by every scraper in the process unless a dedicated limiter is given
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.proxy_pool = proxy_pool
+        # Optional ResponseArchive (or its directory) receiving every raw GraphQL body
+        if isinstance(archive, str):
+            from fb_graphql_scraper.utils.archive import ResponseArchive
+            archive = ResponseArchive(directory=archive)
+        self.archive = archive
+        # Optional MediaDownloader, downloads attachments while the posts are parsed
+        self.media_downloader = media_downloader
+        # Optional PostIndex (or its path), every formatted post is added to it
+        if isinstance(post_index, str):
+            from fb_graphql_scraper.utils.post_index import PostIndex
+            post_index = PostIndex(path=post_index)
+        self.post_index = post_index
+        # Upper bound of a single HTTP request, the crawl's deadline may cut it shorter
+        self.request_timeout = request_timeout
+        # Profile metadata (follower counts, ...) changes slowly: fetched next to the posts, cached for `metadata_ttl`
+        self.metadata_cache = TTLCache(ttl=metadata_ttl)
+        self._metadata_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fb-metadata")
+        # Crawls of the same profile (jobs, shards, re-runs) send identical GraphQL requests:
+        # one of them goes upstream, the others wait for it, and the pages are kept for
+        # `page_cache_ttl` seconds within `page_cache_size` characters (0 / None: no cache)
+        self.page_cache_ttl = page_cache_ttl
+        self.page_cache = TTLCache(
+            ttl=page_cache_ttl, max_entries=4096, max_size=page_cache_size,
+            sizeof=lambda lines: sum(len(line) for line in lines),
+        ) if page_cache_ttl else None
+        self.page_flights = SingleFlight()
+        self._sessions = SessionScope(factory=self._new_scrape_session)
+        # Connection pool shared by all crawls; cookies are never stored on it,
+        # each request carries the cookies of its own egress / session
+        self.http = requests.Session()
+        self.http.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+
+    @property
+    def session(self) -> ScrapeSession:
+        """ScrapeSession of the crawl running in this thread"""
+        return self._sessions.current
+
+    def _new_scrape_session(self) -> ScrapeSession:
+        session = ScrapeSession(archive=self.archive, media=self.media_downloader)
+        if self.media_downloader is not None:
+            session.requests_parser.resolve_post_images = functools.partial(self._resolve_post_images, session)
+        return session
+
+    def _resolve_post_images(self, session: ScrapeSession, post_id: str) -> list:
+        """get_post_images from a media download thread, in the session of the crawl that parsed the post"""
+        with self.new_session(session=session):
+            return self.get_post_images(post_id=post_id)
+
+    def new_session(self, session: ScrapeSession = None):
+        """`with client.new_session():` runs the block in a fresh (or the given) ScrapeSession"""
+        return self._sessions.enter(session=session)
+
+    def close(self):
+        """Stop the metadata threads and close the connection pool, once the crawls are done"""
+        self._metadata_executor.shutdown(wait=False, cancel_futures=True)
+        self.http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @contextmanager
+    def _profiling(self, profile, label: str):
+        """Run the block under a CrawlProfiler when `profile` (see get_profile_dir) asks for it.
+        Yields the profiler, None when profiling is off or the session is profiled already."""
+        out_dir = get_profile_dir(profile)
+        if out_dir is None or self.profiler is not None:
+            yield None
+            return
+        # cProfile / tracemalloc are only imported for a profiled crawl
+        from fb_graphql_scraper.utils.profiler import CrawlProfiler
+        profiler = self.profiler = CrawlProfiler(label=label, out_dir=out_dir)
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            self.profiler = None
+
+    def _stage(self, name: str):
+        """`with self._stage(name):` counts the block as a stage of a profiled crawl"""
+        profiler = self.profiler
+        return _NO_STAGE if profiler is None else profiler.stage(name)
+
+    def _profiled(self, name: str, func):
+        profiler = self.profiler
+        return func if profiler is None else profiler.wrap(name, func)
+
+    def _iterate(self, name: str, iterable):
+        profiler = self.profiler
+        return iterable if profiler is None else profiler.iterate(name, iterable)
+
+    def _set_deadline(self, time_budget: float = None, deadline: Deadline = None):
+        """Bound the current session by `deadline`, or by a new one of `time_budget` seconds"""
+        self.deadline = deadline or Deadline(budget=time_budget)
+        self.stop_reason = None
+
+    def _get_stop_reason(self) -> str:
+        return self.stop_reason or STOP_COMPLETED
+
+    def _acquire_egress(self, profile: str):
+        """Take the profile's egress from the proxy pool"""
+        if self.proxy_pool is None:
+            self.egress = None
+            return
+        self.egress_profile = profile
+        self.egress = self.proxy_pool.acquire(profile=profile)
+
+    def _release_egress(self):
+        if self.proxy_pool is not None and self.egress is not None:
+            self.proxy_pool.release(self.egress)
+        self.egress = None
+
+    @property
+    def egress_identity(self) -> str:
+        """Rate limiter key of the current egress"""
+        return self.egress.identity if self.egress else DEFAULT_IDENTITY
+
+    def _request_kwargs(self) -> dict:
+        """proxies / headers / cookies of the current egress and session for requests calls"""
+        request_kwargs = self.egress.request_kwargs() if self.egress else {}
+        if self.auth_cookies:
+            request_kwargs["cookies"] = {**request_kwargs.get("cookies", {}), **self.auth_cookies}
+        if self.auth_headers:
+            request_kwargs["headers"] = {**request_kwargs.get("headers", {}), **self.auth_headers}
+        request_kwargs["timeout"] = self.deadline.timeout(self.request_timeout)
+        return request_kwargs
+
+    def use_authenticated_session(self, cookies: dict, form: dict, headers: dict = None):
+        """Send the following GraphQL requests as a logged-in user.
+
+        Args:
+            cookies (dict): Session cookies, `c_user` and `xs` are the ones that matter.
+            form (dict): Form fields Facebook expects next to `variables`/`doc_id`
+                (fb_dtsg, lsd, jazoest, __user, av, ...).
+            headers (dict): Extra headers, e.g. the browser's User-Agent.
+        """
+        self.auth_cookies = dict(cookies)
+        self.auth_form = {k: v for k, v in form.items() if k not in ("variables", "doc_id")}
+        self.auth_headers = dict(headers or {})
+        if self.auth_form.get("lsd"):
+            self.auth_headers.setdefault("X-FB-LSD", self.auth_form["lsd"])
+
+    def clear_authenticated_session(self):
+        self.auth_cookies, self.auth_form, self.auth_headers = {}, {}, {}
+
+    def _report_egress(self, outcome: str):
+        """Report one request to the pool, moving off the egress if it just went into cooldown"""
+        if self.proxy_pool is None or self.egress is None:
+            return
+        self.proxy_pool.report(self.egress, outcome)
+        if outcome != OUTCOME_OK:
+            self.proxy_pool.release(self.egress)
+            self.egress = self.proxy_pool.acquire(profile=self.egress_profile)
+            # The browser this crawl runs on would keep going out through the old egress
+            if self.session.base_page is not None:
+                self.session.base_page.apply_egress(self.egress)
+
+    def get_page(self, url: str, cookies: dict = None, allow_redirects: bool = True) -> requests.Response:
+        """GET a facebook.com page (embed plugins, /me...) through the current egress, under the same rate limiter.
+        `cookies` are sent on top of the egress and session ones."""
+        request_kwargs = self._request_kwargs()
+        if cookies:
+            request_kwargs["cookies"] = {**request_kwargs.get("cookies", {}), **cookies}
+        with self.rate_limiter.request(self.egress_identity, timeout=self.deadline.timeout()) as permit:
+            try:
+                response = self.http.get(url=url, allow_redirects=allow_redirects, **request_kwargs)
+            except requests.RequestException:
+                permit.outcome = OUTCOME_ERROR
+                raise
+            if 300 <= response.status_code < 400:
+                # A redirect has no body to classify
+                permit.outcome = OUTCOME_OK
+            else:
+                permit.outcome = classify_response(response.status_code, [response.text])
+        return response
+
+    def get_plugin_page_followers(self, fb_username_or_userid):
+        """透過嵌入式貼文取得粉絲專頁追蹤人數"""
+        from bs4 import BeautifulSoup
+        plugin_page_url = f"https://www.facebook.com/plugins/page.php?href=https%3A%2F%2Fwww.facebook.com%2F{fb_username_or_userid}&tabs=timeline&width=340&height=500&small_header=false&adapt_container_width=true&hide_cover=false&show_facepile=true&appId&locale=en_us"
+        plugin_response = self.get_page(url=plugin_page_url)
+        plugin_soup = BeautifulSoup(plugin_response.text, "html.parser")
+        plugin_soup = plugin_soup.find("div", class_="_1drq")
+        if not plugin_soup:
+            return plugin_soup
+        return plugin_soup.text
+
+    def get_post_images(self, post_id: str) -> list:
+        """scontent image urls of a post, read from its embed plugin"""
+        from bs4 import BeautifulSoup
+        profile = quote(self.crawl_profile or "facebook", safe="")
+        post_url = f"https://www.facebook.com/plugins/post.php?href=https%3A%2F%2Fwww.facebook.com%2F{profile}%2Fposts%2F{post_id}&show_text=true&width=800"
+        response = self.get_page(url=post_url)
+        response.raise_for_status()
+        soup = BeautifulSoup(response.text, "html.parser")
+        return [tag["src"] for tag in soup.find_all(src=re.compile(r"^https://scontent"))]
+
+    def get_cached_followers(self, fb_username_or_userid):
+        """get_plugin_page_followers served from the metadata cache while it is fresh"""
+        key = ("followers", fb_username_or_userid)
+        followers = self.metadata_cache.get(key)
+        if followers is None:
+            followers = self.get_plugin_page_followers(fb_username_or_userid=fb_username_or_userid)
+            if followers:
+                self.metadata_cache.set(key, followers)
+        return followers
+
+    def submit_metadata(self, func, *args) -> Future:
+        """Run a metadata lookup in the background, in the current ScrapeSession
+        (same egress, cookies and deadline), while the posts are being collected"""
+        session = self.session
+
+        def run():
+            with self.new_session(session=session):
+                return func(*args)
+        self.metadata_future = self._metadata_executor.submit(run)
+        return self.metadata_future
+
+    def collect_metadata(self, default: list = None) -> list:
+        """Result of the background metadata lookup, `default` if it failed or ran out of time"""
+        future, self.metadata_future = self.metadata_future, None
+        if future is None:
+            return default if default is not None else []
+        try:
+            return future.result(timeout=self.deadline.remaining())
+        except (Exception, DeadlineExceeded) as e:
+            print(f"Collect profile info failed, message: {e!r}")
+            return default if default is not None else []
+
+    @profiled_stage("format_data")
+    def format_data(self, res_in, fb_username_or_userid, new_reactions):
+        final_res = []
+        
+        # 直接使用 res_in 的資料（來自 collect_posts）
+        for i, post_data in enumerate(res_in):
+            # 確保 post_url 是字串格式而非列表
+            post_url = post_data['post_url'][0] if isinstance(post_data['post_url'], list) else post_data['post_url']
+
+            post_info = {
+                'post_id': post_data['post_id'],
+                'post_url': post_url,
+                'creation_time': post_data['creation_time'],
+                'attachments': post_data['attachments'],
+                'text': post_data['text'],
+                'total_reaction_count': post_data['total_reaction_count'],
+                'reactions': post_data['reactions'],
+                'comment_count': post_data['comment_count'],
+                'share_count': post_data['share_count']
+            }
+            
+            final_res.append(post_info)
+
+        filtered_post_id = set()
+        filtered_data = []
+        for each_data in final_res:
+            if each_data["post_id"] not in filtered_post_id:
+                filtered_data.append(each_data)
+                filtered_post_id.add(each_data["post_id"])
+
+        if self.post_index is not None:
+            self.post_index.add_posts(filtered_data, profile=self.crawl_profile or fb_username_or_userid)
+        return filtered_data
+
+    def process_reactions(self, res_in):
+        reactions_out = res_in
+        # for each_res in res_in:
+        #     each_reactions = each_res['top_reactions']['edges']
+        #     processed_reactions = self.requests_parser.process_reactions(
+        #         reactions_in=each_reactions)
+        #     reactions_out.append(processed_reactions)
+        return reactions_out
+
+    def crawl(self, user_id: str, doc_id: str, days_limit: int = 61, display_progress: bool = True,
+              pipeline: bool = False, profile_feed: list = None, time_budget: float = None,
+              deadline: Deadline = None, post_filter=None, profile=None,
+              fb_username_or_userid: str = None) -> dict:
+        """Collect posts of a profile whose numeric id and timeline doc_id are known.
+        `fb_username_or_userid` (default `user_id`) is the name the posts are archived and
+        indexed under, pass the username get_user_posts was called with to keep them together.
+        `profile` (bool or a directory, default FB_SCRAPER_PROFILE) profiles the crawl, see requests_flow."""
+        fb_username_or_userid = fb_username_or_userid or user_id
+        with self.new_session():
+            self._set_deadline(time_budget=time_budget, deadline=deadline)
+            self.requests_parser.post_filter = post_filter
+            self.crawl_profile = fb_username_or_userid
+            self._acquire_egress(profile=fb_username_or_userid)
+            try:
+                return self.requests_flow(
+                    doc_id=doc_id,
+                    fb_username_or_userid=user_id,
+                    days_limit=days_limit,
+                    profile_feed=profile_feed or [],
+                    display_progress=display_progress,
+                    pipeline=pipeline,
+                    profile=profile,
+                )
+            finally:
+                self._release_egress()
+
+    def refresh_engagement(self, post_ids: list, doc_id: str, chunk_size: int = 20, max_workers: int = 4,
+                           time_budget: float = None, deadline: Deadline = None) -> dict:
+        """Current reaction / comment / share counters of posts collected earlier.
+
+        Only the feedback of each post is requested, so tracking engagement over
+        time costs one request per watched post instead of whole timelines. The
+        feedback query takes a single `feedbackTargetID`, requests are not batched:
+        the ids are split in chunks of `chunk_size` posts, `max_workers` chunks run at
+        once, each in its own ScrapeSession (and egress); every request still goes
+        through the shared rate limiter. A post whose feedback is not in its response
+        is listed in "missing".
+
+        Args:
+            post_ids (list): `post_id`s (subscription_target_id) from get_user_posts.
+            doc_id (str): doc_id of a feedback query taking `feedbackTargetID`, e.g. the
+                CometUFIReactionsCountTooltipContentQuery request the browser sends
+                when hovering a reaction counter.
+
+        Returns:
+            dict: "columns", one row per post found in "data", "missing" ids and "stop_reason".
+        """
+        post_ids = list(dict.fromkeys(str(each) for each in post_ids))
+        deadline = deadline or Deadline(budget=time_budget)
+        # A logged-in caller shares its cookies / form tokens with the batches
+        caller = self.session
+        auth = (caller.auth_cookies, caller.auth_form, caller.auth_headers)
+        chunks = [post_ids[i:i + chunk_size] for i in range(0, len(post_ids), chunk_size)]
+
+        def refresh_chunk(chunk):
+            with self.new_session():
+                self._set_deadline(deadline=deadline)
+                self.auth_cookies, self.auth_form, self.auth_headers = auth
+                self._acquire_egress(profile=None)
+                try:
+                    return self._refresh_chunk(chunk=chunk, doc_id=doc_id), self._get_stop_reason()
+                finally:
+                    self._release_egress()
+
+        rows, stop_reason = {}, STOP_COMPLETED
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fb-engagement") as executor:
+            for chunk_rows, chunk_stop_reason in executor.map(refresh_chunk, chunks):
+                rows.update(chunk_rows)
+                if chunk_stop_reason != STOP_COMPLETED:
+                    stop_reason = chunk_stop_reason
+        return {
+            "columns": list(ENGAGEMENT_COLUMNS),
+            "data": [rows[each] for each in post_ids if each in rows],
+            "missing": [each for each in post_ids if each not in rows],
+            "stop_reason": stop_reason,
+        }
+
+    def _refresh_chunk(self, chunk: list, doc_id: str) -> dict:
+        url = "https://www.facebook.com/api/graphql/"
+        rows = {}
+        for post_id in chunk:
+            try:
+                body_content = self.fetch_graphql_page(
+                    url=url, payload_in=get_feedback_payload(doc_id_in=doc_id, post_id=post_id), archive=False)
+            except DeadlineExceeded as e:
+                print(f"Stop refreshing engagement ({e.reason}).")
+                self.stop_reason = e.reason
+                break
+            if body_content is None:
+                print(f"Refresh engagement of post {post_id} failed.")
+                continue
+            for each_body in body_content:
+                try:
+                    feedback = find_feedback(json.loads(each_body), post_id=post_id)
+                except ValueError:
+                    continue
+                if feedback:
+                    rows[post_id] = engagement_row(post_id=post_id, feedback=feedback, fetched_at=int(time.time()))
+                    break
+        return rows
+
+    @profiled_stage("fetch")
+    def fetch_graphql_page(self, url: str, payload_in: dict, max_retries: int = 5, archive: bool = True,
+                           on_line=None):
+        """Send one GraphQL request paced by the rate limiter.
+
+        Throttled responses are retried after the limiter's cooldown,
+        other error payloads are retried a couple of times.
+        Timeline pages are appended to the archive unless `archive=False`.
+        With a proxy pool, every outcome feeds the egress health and a
+        failing egress is swapped for another one before retrying.
+
+        The body is streamed and decompressed chunk by chunk; `on_line(line)`
+        is called for every json line as soon as it has arrived, so parsing
+        overlaps the download. Lines of an attempt that is retried may have
+        been passed to it already (the parser skips posts it has seen).
+
+        Identical requests (same viewer, doc_id and variables) are not sent twice:
+        a request already in flight is waited for, and successful pages are kept
+        for `page_cache_ttl` seconds. Their lines are then passed to `on_line`
+        from memory, the shared line list must not be modified, and the page is
+        archived for this crawl as well.
+
+        Returns:
+            list: Response body split into json lines, None if every attempt failed.
+
+        Raises:
+            DeadlineExceeded: The crawl's budget ran out or it was cancelled.
+        """
+        key = (url, self.auth_cookies.get("c_user"),
+               *get_payload_key(payload_in, now_window=self.page_cache_ttl or 0.0))
+        body_content = self.page_cache.get(key) if self.page_cache is not None else None
+        if body_content is None:
+            def fetch():
+                body = self._fetch_graphql_page(
+                    url=url, payload_in=payload_in, max_retries=max_retries, archive=archive, on_line=on_line)
+                if body is not None and self.page_cache is not None:
+                    self.page_cache.set(key, body)
+                return body
+            body_content, shared = self.page_flights.do(key, fetch, wait=self._wait_for_flight)
+            if not shared:
+                return body_content
+            if body_content is None:
+                # The request we waited for failed, maybe through a bad egress: try on our own
+                return fetch()
+        # Served by another crawl's request: this crawl's archive still gets the page
+        if archive:
+            self._archive_page(payload_in=payload_in, body_content=body_content)
+        if on_line is not None:
+            for each_body in body_content:
+                on_line(each_body)
+        return body_content
+
+    def _wait_for_flight(self, future: Future):
+        """Wait for an identical request sent by another crawl, within this crawl's deadline"""
+        while True:
+            try:
+                return future.result(timeout=self.deadline.timeout(1.0))
+            except FutureTimeoutError:
+                continue
+
+    def _fetch_graphql_page(self, url: str, payload_in: dict, max_retries: int, archive: bool, on_line) -> list:
+        errors = 0
+        for _ in range(max_retries):
+            identity = self.egress_identity
+            body_content, status_code = None, None
+            try:
+                with self.rate_limiter.request(identity, timeout=self.deadline.timeout()) as permit:
+                    request_kwargs = self._request_kwargs()
+                    try:
+                        with self.http.post(
+                            url=url,
+                            data={**self.auth_form, **payload_in},
+                            stream=True,
+                            **request_kwargs,
+                        ) as response:
+                            status_code = response.status_code
+                            body_content = []
+                            # The status alone classifies a failed response, its body is not read
+                            if status_code < 400:
+                                chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+                                for each_body in self._iterate("decode", iter_json_lines(chunks)):
+                                    body_content.append(each_body)
+                                    if on_line is not None:
+                                        on_line(each_body)
+                        permit.outcome = classify_response(
+                            status_code=status_code, body_content=body_content)
+                    except requests.RequestException as e:
+                        # Cut short by the deadline: not the egress' fault
+                        self.deadline.check()
+                        print(f"Request through {identity} failed, message: {e}")
+                        permit.outcome = OUTCOME_ERROR
+            except TimeoutError:
+                # The rate limiter could not hand out a request before the deadline,
+                # which has not necessarily run out yet: the limiter gives up early
+                raise DeadlineExceeded(self.deadline.stop_reason or STOP_RATE_LIMITED) from None
+            self._report_egress(outcome=permit.outcome)
+
+            if permit.outcome == OUTCOME_OK:
+                if archive:
+                    self._archive_page(payload_in=payload_in, body_content=body_content)
+                return body_content
+            if permit.outcome == OUTCOME_ERROR:
+                errors += 1
+                print(f"GraphQL returned an error payload (status {status_code}).")
+                if errors >= 2 and self.proxy_pool is None:
+                    return None
+        return None
+
+    def _archive_page(self, payload_in: dict, body_content: list):
+        if self.archive is None:
+            return
+        variables = json.loads(payload_in["variables"])
+        self.archive.append(
+            body=body_content,
+            profile=self.crawl_profile or variables.get("id"),
+            cursor=variables.get("cursor"),
+        )
+
+    def requests_flow(self, doc_id:str, fb_username_or_userid:str, days_limit:int, profile_feed:list, display_progress=True, pipeline=False,
+                      profile=False):
+        """
+        Fetch more posts from a user's Facebook profile using the requests module.
+
+        Flow:
+            1. Get the document ID of the target Facebook profile.
+            2. Use the requests module to fetch data from the profile.
+            3. Continuously fetch data by checking for new posts until the specified days limit is reached.
+
+        Args:
+            doc_id (str): The document ID of the target Facebook account.
+            fb_username_or_userid (str): The Facebook username or user ID of the target account.
+            days_limit (int): The number of days for which to fetch posts (limits the time range of retrieved posts).
+            profile_feed (list): A list containing the posts retrieved from the target profile.
+            pipeline (bool): Only read `page_info` and the last creation time from the tail of each
+                response, send the next request at once and leave `parse_body` to a worker thread.
+            profile (bool | str): Run under cProfile + tracemalloc and write a report (to this
+                directory, ./profiles for True); "profiling" of the result has its paths and stage stats.
+                None follows the FB_SCRAPER_PROFILE environment variable.
+
+        Helper Functions:
+            1. get_before_time:
+                Retrieves Facebook posts from a specified time period before the current date.
+
+            2. get_payload:
+                Prepares the payload for the next round of requests to the server.
+
+            3. get_next_page_status:
+                Checks whether the target Facebook user has more posts available for retrieval,
+                a page without page_info ends the crawl with "stop_reason" "incomplete".
+
+            4. compare_timestamp:
+                Verifies whether a retrieved post falls within the specified time period for collection.
+
+            5. fetch_graphql_page:
+                Sends each request through the shared rate limiter, retrying throttled pages.
+
+            6. get_page_info / get_last_creation_time:
+                Cheap tail extraction used by the pipelined mode.
+
+        When the session's deadline runs out (or it is cancelled) the posts parsed so far
+        are returned, "stop_reason" of the result says why the crawl ended.
+        """
+        with self._profiling(profile=profile, label=fb_username_or_userid) as profiler:
+            res = self._requests_flow(
+                doc_id=doc_id,
+                fb_username_or_userid=fb_username_or_userid,
+                days_limit=days_limit,
+                profile_feed=profile_feed,
+                display_progress=display_progress,
+                pipeline=pipeline,
+            )
+        if profiler is not None:
+            res["profiling"] = profiler.save()
+        return res
+
+    def _requests_flow(self, doc_id: str, fb_username_or_userid: str, days_limit: int, profile_feed: list,
+                       display_progress: bool, pipeline: bool) -> dict:
+        url = "https://www.facebook.com/api/graphql/"
+        before_time = get_before_time()
+        loop_limit = 5000
+        next_cursor = None
+        last_creation_time = None
+        # A single parse worker keeps the parser's lists in response order
+        parse_executor = ThreadPoolExecutor(max_workers=1) if pipeline else None
+        pending_parses = []
+        # A cursor that does not move would be served from the page cache again and again
+        requested_pages = set()
+        try:
+            # Extract data
+            for i in range(loop_limit):
+                if i == 0:
+                    payload_in = get_payload(
+                        doc_id_in=doc_id, 
+                        id_in=fb_username_or_userid, 
+                        before_time=before_time
+                    )
+                # if not the first time send request, use function 'get_next_payload' with the end cursor to scrape next round
+                else:
+                    payload_in = get_next_payload(
+                        doc_id_in=doc_id, 
+                        id_in=fb_username_or_userid, 
+                        before_time=before_time, # input before_time
+                        cursor_in=next_cursor
+                    )
+                payload_key = get_payload_key(payload_in)
+                if payload_key in requested_pages:
+                    print("The next page was requested before, stop collecting posts.")
+                    self.stop_reason = STOP_INCOMPLETE
+                    break
+                requested_pages.add(payload_key)
+
+                try:
+                    # Without the pipeline, lines are parsed while the rest of the body is downloading
+                    body_content = self.fetch_graphql_page(
+                        url=url, payload_in=payload_in,
+                        on_line=None if pipeline else self._profiled("parse_body", self.requests_parser.parse_line))
+                except DeadlineExceeded as e:
+                    print(f"Stop collecting posts ({e.reason}), return the posts collected so far.")
+                    self.stop_reason = e.reason
+                    break
+                if body_content is None:
+                    print("Facebook keeps rejecting the requests, stop collecting posts.")
+                    self.stop_reason = STOP_REJECTED
+                    break
+
+                # Check progress
+                if pipeline:
+                    pending_parses.append(
+                        parse_executor.submit(self._profiled("parse_body", self.requests_parser.parse_body), body_content))
+                    page_info = get_page_info(body_content=body_content) or {}
+                    next_cursor = page_info.get("end_cursor")
+                    next_page_status = page_info.get("has_next_page")
+                    last_creation_time = get_last_creation_time(body_content=body_content) or last_creation_time
+                    # max_posts counts the posts the parser kept: wait for this page's parse,
+                    # otherwise the next pages are requested before it is known to be full
+                    if self.requests_parser.post_filter is not None and self.requests_parser.post_filter.max_posts is not None:
+                        pending_parses[-1].result()
+                else:
+                    next_cursor = get_next_cursor(body_content_in=body_content)
+                    next_page_status = get_next_page_status(body_content=body_content)
+                    last_creation_time = self.requests_parser.last_creation_time
+
+                if self.requests_parser.is_full():
+                    print(f"Collected {self.requests_parser.post_filter.max_posts} posts, stop collecting posts.")
+                    break
+                if last_creation_time is None:
+                    print("No posts found in the response.")
+                    break
+                before_time = str(last_creation_time)
+                if next_page_status is None:
+                    # Assuming another page would request the same unreadable page over and over
+                    print("The response has no page_info, stop collecting posts.")
+                    self.stop_reason = STOP_INCOMPLETE
+                    break
+                if not next_page_status:
+                    print("There are no more posts.")
+                    break
+
+                # date_object = int(datetime.strptime(before_time, "%Y-%m-%d"))
+                if compare_timestamp(timestamp=int(before_time), days_limit=days_limit, display_progress=display_progress):
+                    print(f"The scraper has successfully retrieved posts from the past {str(days_limit)} days.")
+                    break
+        finally:
+            if parse_executor is not None:
+                parse_executor.shutdown(wait=True)
+        for each_parse in pending_parses:
+            each_parse.result()
+
+        with self._stage("collect_posts"):
+            res_out = self.requests_parser.collect_posts()
+        new_reactions = self.process_reactions(res_in=res_out)
+        # create result
+        final_res = self.format_data(
+            res_in=res_out, 
+            fb_username_or_userid=fb_username_or_userid, 
+            new_reactions=new_reactions
+        )
+        return {
+            "fb_username_or_userid": fb_username_or_userid,
+            "profile": profile_feed,
+            "data": final_res,
+            "stop_reason": self._get_stop_reason(),
+        }
@@ -1,15 +1,21 @@
 # -*- coding: utf-8 -*-
 from fb_graphql_scraper.utils.locator import *
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
-import time
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from fb_graphql_scraper.utils.deadline import SYSTEM_CLOCK
+
+# Selenium's own default for driver.get
+PAGE_LOAD_TIMEOUT = 300
+# Same as WebDriverWait's default poll frequency
+POLL_FREQUENCY = 0.5
 
 
 class PageOptional(object):
-    def __init__(self, driver=None, fb_account: str = None, fb_pwd: str = None):
+    def __init__(self, driver=None, fb_account: str = None, fb_pwd: str = None, session_store=None, clock=None,
+                 http_client=None):
         self.locator = PageLocators
         self.xpath_elements = PageXpath
         self.class_elements = PageClass
@@ -17,22 +23,41 @@ class PageOptional(object):
         self.driver = driver
         self.fb_account = fb_account
         self.fb_pwd = fb_pwd
+        self.session_store = session_store
+        # FacebookHttpClient checking a saved session, through the egress the driver goes out through
+        self.http_client = http_client
+        # Waits and pauses go through the clock, a VirtualClock replays them instantly
+        self.clock = clock or SYSTEM_CLOCK
 
-        # Loggin account
+        # Loggin account, a saved session skips the login form
         if self.fb_account and self.fb_pwd:
-            login_page_url = "https://www.facebook.com/login"
-            self.driver.get(url=login_page_url)
-            self.login_page()
+            if self.session_store is not None and self.session_store.restore_to_driver(
+                    account=self.fb_account, driver=self.driver, http_client=self.http_client):
+                print("Restored the saved session, skip login.")
+            else:
+                login_page_url = "https://www.facebook.com/login"
+                self.driver.get(url=login_page_url)
+                self.login_page()
+                self.save_session()
 
     def login_page(self):
         try:
             self.login_account(user=self.fb_account, 
                                password=self.fb_pwd,
             )
-            time.sleep(5)
+            self.clock.sleep(5)
         except Exception as e:
             print(f"Login faield, message: {e}")
 
+    def save_session(self):
+        """Persist the logged-in session so the next driver can skip login"""
+        if self.session_store is None or self.driver.get_cookie("c_user") is None:
+            return
+        try:
+            self.session_store.save_from_driver(account=self.fb_account, driver=self.driver)
+        except Exception as e:
+            print(f"Save session failed, message: {e}")
+
     def clean_requests(self):
         print(f"Before cleaning driver requests, the number of requests are: {len(self.driver.requests)}")
         try:
@@ -67,11 +92,31 @@ class PageOptional(object):
     def move_to_element(self, element_in):
         ActionChains(self.driver).move_to_element(element_in).perform()
 
-    def load_next_page(self, url:str, clear_limit:int=20):
+    @staticmethod
+    def _wait_time(seconds: float, deadline=None) -> float:
+        """`seconds` capped by what is left of the crawl's Deadline"""
+        return seconds if deadline is None else deadline.timeout(seconds)
+
+    def _wait_until(self, condition, seconds: float, deadline=None):
+        """WebDriverWait(driver, seconds).until(condition), polling on self.clock"""
+        end_time = self.clock.monotonic() + self._wait_time(seconds, deadline)
+        while True:
+            try:
+                value = condition(self.driver)
+                if value:
+                    return value
+            except NoSuchElementException:
+                pass
+            if self.clock.monotonic() >= end_time:
+                raise TimeoutException(f"Condition not met within {seconds} seconds")
+            self.clock.sleep(POLL_FREQUENCY)
+
+    def load_next_page(self, url:str, clear_limit:int=20, deadline=None):
         """>> Move on to target facebook user page,
         before moving, clean driver's requests first,
         or driver would store previous account's data.
-        Args: url (str): user(kol) links"""
+        Args: url (str): user(kol) links
+              deadline (Deadline): page load may not take longer than the crawl has left"""
         i = 0
         while i <= clear_limit:
             self.clean_requests()
@@ -79,7 +124,16 @@ class PageOptional(object):
                 print("Cleared all driver requests!")
                 break
             i += 1
-        self.driver.get(url=url)
+        self.driver.set_page_load_timeout(self._wait_time(PAGE_LOAD_TIMEOUT, deadline))
+        try:
+            self.driver.get(url=url)
+        except TimeoutException:
+            if deadline is not None:
+                deadline.check()
+            raise
+        finally:
+            # The driver outlives this crawl (pooled or shared), the next one starts from the full timeout
+            self.driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
 
     def click_display_button(self):
         elements = self.driver.find_elements(self.locator.DISPLAY_MORE)
@@ -112,13 +166,13 @@ class PageOptional(object):
                         print(
                             f"Click display more unsucessfully, error message:\n{e}")
 
-    def click_reject_login_button(self):
+    def click_reject_login_button(self, deadline=None):
         """Attempts to reject Facebook login popup with multiple fallback strategies"""
 
         # Strategy 1: Try primary locator
         try:
-            reject_login_button = WebDriverWait(self.driver, 5).until(
-                EC.visibility_of_element_located(self.locator.CLOSELOGIN))
+            reject_login_button = self._wait_until(
+                EC.visibility_of_element_located(self.locator.CLOSELOGIN), 5, deadline)
             reject_login_button.click()
             print("Successfully closed login popup using primary locator")
             return
@@ -127,8 +181,8 @@ class PageOptional(object):
 
         # Strategy 2: Try alternative XPath from PageXpath
         try:
-            reject_login_button = WebDriverWait(self.driver, 3).until(
-                EC.visibility_of_element_located((By.XPATH, self.xpath_elements.CLOSE_LOGIN_BUTTON)))
+            reject_login_button = self._wait_until(
+                EC.visibility_of_element_located((By.XPATH, self.xpath_elements.CLOSE_LOGIN_BUTTON)), 3, deadline)
             reject_login_button.click()
             print("Successfully closed login popup using alternative XPath")
             return
@@ -159,7 +213,7 @@ class PageOptional(object):
         # Strategy 5: Press ESC key to dismiss modal
         try:
             ActionChains(self.driver).send_keys(Keys.ESCAPE).perform()
-            time.sleep(1)
+            self.clock.sleep(1)
             print("Successfully dismissed login popup using ESC key")
             return
         except Exception as e:
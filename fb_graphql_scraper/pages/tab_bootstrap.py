@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import json
+from urllib.parse import parse_qs, urlsplit
+from fb_graphql_scraper.utils.deadline import Deadline, DeadlineExceeded
+
+GRAPHQL_URL = "https://www.facebook.com/api/graphql/"
+TIMELINE_QUERY_NAME = "ProfileCometTimelineFeedRefetchQuery"
+
+# Close the logged-out login popup if there is one, then scroll so the timeline query is sent
+DISMISS_AND_SCROLL_SCRIPT = (
+    "var buttons = document.querySelectorAll("
+    "'div[aria-label=\"Close\"], div[aria-label=\"關閉\"], div[aria-label=\"关闭\"]');"
+    "if (buttons.length) { buttons[0].click(); }"
+    "window.scrollBy(0, 4000);"
+)
+
+
+def profile_from_referer(referer: str):
+    """Profile part of a facebook.com page url: user name, or the id of profile.php?id=..."""
+    if not referer:
+        return None
+    parts = urlsplit(referer)
+    path = parts.path.strip("/")
+    if path == "profile.php":
+        return parse_qs(parts.query).get("id", [None])[0]
+    return path.split("/")[0] or None
+
+
+class TabBootstrap(object):
+    """Resolve (user_id, doc_id) of several profiles at once in tabs of one Chrome.
+
+    Each profile is opened in its own tab; the timeline GraphQL request a tab
+    sends is attributed to its profile through the Referer header (or the
+    profile id in the request variables for numeric profiles). Up to
+    `max_tabs` profiles are open at the same time.
+
+    How to use:
+        bootstrap = TabBootstrap(driver=fb_spider.page_optional.driver)
+        ids = bootstrap.resolve(["love.yuweishao", "KaiCenat"])  # {profile: (user_id, doc_id)}
+    """
+
+    def __init__(self, driver, max_tabs: int = 8, timeout: float = 30, poll_interval: float = 0.5):
+        self.driver = driver
+        self.max_tabs = max_tabs
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+    def _open_tabs(self, profiles: list) -> list:
+        known_handles = set(self.driver.window_handles)
+        for profile in profiles:
+            self.driver.execute_script(
+                "window.open(arguments[0], '_blank');",
+                f"https://www.facebook.com/{profile}?locale=en_us",
+            )
+        return [each for each in self.driver.window_handles if each not in known_handles]
+
+    def _close_tabs(self, handles: list, main_handle: str):
+        for handle in handles:
+            try:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            except Exception as e:
+                print(f"Close bootstrap tab failed, message: {e}")
+        self.driver.switch_to.window(main_handle)
+
+    def _nudge_tabs(self, handles: list):
+        """Let every tab get past the login popup and load its timeline"""
+        for handle in handles:
+            try:
+                self.driver.switch_to.window(handle)
+                self.driver.execute_script(DISMISS_AND_SCROLL_SCRIPT)
+            except Exception as e:
+                print(f"Scroll bootstrap tab failed, message: {e}")
+
+    def _collect(self, pending: dict, resolved: dict):
+        """Attribute the captured timeline requests to their profiles.
+        `pending` maps the lower-cased profile to the profile as it was given."""
+        for req in self.driver.requests:
+            if req.url != GRAPHQL_URL or not req.body:
+                continue
+            body = req.body.decode("utf-8", errors="ignore")
+            if TIMELINE_QUERY_NAME not in body:
+                continue
+            try:
+                form = parse_qs(body)
+                user_id = str(json.loads(form["variables"][0])["id"])
+                doc_id = form["doc_id"][0]
+            except (KeyError, IndexError, ValueError):
+                continue
+            referer = profile_from_referer(req.headers.get("Referer"))
+            for key in (referer, user_id):
+                profile = pending.get((key or "").lower())
+                if profile is not None:
+                    resolved[profile] = (user_id, doc_id)
+                    del pending[profile.lower()]
+                    break
+
+    def _resolve_chunk(self, profiles: list, deadline: Deadline, resolved: dict):
+        main_handle = self.driver.current_window_handle
+        del self.driver.requests
+        handles = self._open_tabs(profiles)
+        pending = {profile.lower(): profile for profile in profiles}
+        try:
+            while pending:
+                self._nudge_tabs(handles)
+                self._collect(pending, resolved)
+                if not pending:
+                    break
+                deadline.sleep(self.poll_interval)
+        except DeadlineExceeded:
+            # Out of time for this chunk, keep what was captured
+            pass
+        finally:
+            self._close_tabs(handles, main_handle)
+            del self.driver.requests
+
+    def resolve(self, profiles: list, deadline: Deadline = None) -> dict:
+        """Returns:
+            dict: {profile: (user_id, doc_id)} for the profiles whose timeline request was captured.
+        """
+        deadline = deadline or Deadline()
+        resolved = {}
+        for start in range(0, len(profiles), self.max_tabs):
+            chunk = profiles[start:start + self.max_tabs]
+            if deadline.stop_reason is not None:
+                # Out of time (or cancelled) before this chunk, keep what the previous ones resolved
+                break
+            # Each chunk gets `timeout` seconds, a cancelled crawl stops it at its next poll
+            self._resolve_chunk(chunk, deadline=deadline.child(self.timeout), resolved=resolved)
+        missing = [profile for profile in profiles if profile not in resolved]
+        if missing:
+            print(f"Could not capture the timeline request of: {', '.join(missing)}")
+        return resolved
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import threading
+from contextlib import contextmanager
+from fb_graphql_scraper.utils.deadline import Deadline
+from fb_graphql_scraper.utils.parser import RequestsParser
+
+
+class ScrapeSession(object):
+    """Everything a single crawl mutates.
+
+    A scraper keeps its configuration (rate limiter, proxy pool, archive,
+    browser, ...) on the instance and creates one ScrapeSession per call,
+    so one scraper can serve concurrent crawls from a thread pool.
+    """
+
+    def __init__(self, archive=None, deadline: Deadline = None, media=None):
+        self.requests_parser = RequestsParser(driver=None, archive=archive, media=media)
+        self.requests_parser._clean_res()
+        # Profile the caller asked for, under which the posts are indexed
+        self.profile = None
+        # Time budget / cancellation of this crawl, and why it stopped early
+        self.deadline = deadline or Deadline()
+        self.stop_reason = None
+        # Egress taken from the proxy pool for this crawl
+        self.egress = None
+        self.egress_profile = None
+        # Logged-in session exported from a browser
+        self.auth_cookies = {}
+        self.auth_form = {}
+        self.auth_headers = {}
+        # Browser leased from a BrowserPool for this crawl
+        self.base_page = None
+        self.page_optional = None
+        # Browser flow containers and stop conditions
+        self.post_id_list = []
+        self.reaction_count_list = []
+        self.profile_feed = []
+        self.res = {
+            "post_caption": [],
+            "post_date": [],
+            "post_likes": [],
+            "comment_share_type": [],
+            "comment_share_value": []
+        }
+        self.pre_diff_days = float("-inf")
+        self.counts_of_same_diff_days = 0
+        # Captured browser requests already handed to the parser
+        self.parsed_requests = 0
+        # Profile metadata collected next to the posts (a Future), merged into the result at the end
+        self.metadata_future = None
+        # CrawlProfiler of a crawl run with profile=True, None otherwise
+        self.profiler = None
+
+
+def session_attribute(name: str) -> property:
+    """Instance attribute that really lives on the current ScrapeSession"""
+    def getter(self):
+        return getattr(self.session, name)
+
+    def setter(self, value):
+        setattr(self.session, name, value)
+    return property(getter, setter)
+
+
+class SessionScope(object):
+    """Per-thread stack of ScrapeSessions, the innermost one is current.
+    Outside of any crawl every thread gets a default session of its own."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._local = threading.local()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @property
+    def current(self) -> ScrapeSession:
+        stack = self._stack()
+        if not stack:
+            stack.append(self._factory())
+        return stack[-1]
+
+    @contextmanager
+    def enter(self, session: ScrapeSession = None):
+        stack = self._stack()
+        session = session or self._factory()
+        stack.append(session)
+        try:
+            yield session
+        finally:
+            stack.pop()
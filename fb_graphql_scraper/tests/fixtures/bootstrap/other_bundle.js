@@ -0,0 +1,4 @@
+;/*FB_PKG_DELIM*/
+
+__d("CometRelayEF",["ExecutionEnvironment"],(function(a,b,c,d,e,f,g){"use strict";g["default"]={}}),98);
+__d("ProfileCometHeaderQuery_facebookRelayOperation",[],(function(a,b,c,d,e,f){e.exports="7089417554444361"}),null);
@@ -0,0 +1,5 @@
+;/*FB_PKG_DELIM*/
+
+__d("ProfileCometHeaderQuery_facebookRelayOperation",[],(function(a,b,c,d,e,f){e.exports="7089417554444361"}),null);
+__d("ProfileCometTimelineFeedRefetchQuery_facebookRelayOperation",[],(function(a,b,c,d,e,f){e.exports="8573212549359124"}),null);
+__d("ProfileCometTimelineFeedRefetchQuery.graphql",["ProfileCometTimelineFeedRefetchQuery_facebookRelayOperation"],(function(a,b,c,d,e,f){"use strict";a={fragment:{kind:"Fragment",name:"ProfileCometTimelineFeedRefetchQuery"},kind:"Request",params:{id:b("ProfileCometTimelineFeedRefetchQuery_facebookRelayOperation"),metadata:{},name:"ProfileCometTimelineFeedRefetchQuery",operationKind:"query",text:null}};e.exports=a}),null);
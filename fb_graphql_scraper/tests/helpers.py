@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Synthetic GraphQL bodies and a stub HTTP session shared by the tests"""
+import json
+import threading
+import time
+
+import requests
+
+DAY = 86400
+
+
+def story_line(post_id: str, creation_time: int, text: str = "", reactions: int = 0, comments: int = 0,
+               attachments: list = None) -> str:
+    """One json line of a timeline response holding a story"""
+    return json.dumps({"data": {"node": {
+        "feedback": {
+            "subscription_target_id": post_id,
+            "reaction_count": {"count": reactions},
+            "top_reactions": {"edges": [{"node": {"localized_name": "讚"}, "reaction_count": reactions}]},
+            "comment_rendering_instance": {"comments": {"total_count": comments}},
+            "share_count": {"count": 0},
+        },
+        "story": {"creation_time": creation_time, "message": {"text": text}},
+        "attachments": attachments or [],
+    }}}, ensure_ascii=False)
+
+
+def page_info_line(cursor: str, has_next_page: bool = True) -> str:
+    return json.dumps({"data": {"page_info": {"end_cursor": cursor, "has_next_page": has_next_page}}})
+
+
+def timeline_page(page_no: int, per_page: int = 3, pages: int = 5, now: int = None) -> bytes:
+    """Page `page_no` of a timeline with one post a day, newest first"""
+    now = int(time.time()) if now is None else now
+    lines = []
+    for k in range(per_page):
+        index = page_no * per_page + k
+        lines.append(story_line(f"{page_no}{k}", now - DAY * index, text=f"post {index}", reactions=index))
+    lines.append(page_info_line(f"c{page_no}", has_next_page=page_no < pages - 1))
+    return "\n".join(lines).encode("utf-8")
+
+
+class StubResponse(object):
+    """Enough of requests.Response for fetch_graphql_page, the body arrives in small chunks"""
+
+    def __init__(self, body: bytes, status_code: int = 200, chunk_size: int = 7):
+        self.content = body
+        self.status_code = status_code
+        self.chunk_size = chunk_size
+        self.text = body.decode("utf-8", "replace")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+    def iter_content(self, chunk_size: int = 1):
+        for i in range(0, len(self.content), self.chunk_size):
+            yield self.content[i:i + self.chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class StubTimeline(object):
+    """Replaces `client.http`: answers timeline requests from `timeline_page`.
+    `responses` are served first (bytes or StubResponse), e.g. a throttled page."""
+
+    def __init__(self, responses: list = None, delay: float = 0.0, **page_kwargs):
+        self.responses = list(responses or [])
+        self.delay = delay
+        self.page_kwargs = page_kwargs
+        self.cursors = []
+        self._lock = threading.Lock()
+
+    def close(self):
+        pass
+
+    def post(self, url, data, **kwargs):
+        variables = json.loads(data["variables"])
+        with self._lock:
+            self.cursors.append(variables.get("cursor"))
+            queued = self.responses.pop(0) if self.responses else None
+        if self.delay:
+            time.sleep(self.delay)
+        if queued is not None:
+            return queued if isinstance(queued, StubResponse) else StubResponse(queued)
+        cursor = variables.get("cursor")
+        page_no = 0 if cursor is None else int(cursor[1:]) + 1
+        return StubResponse(timeline_page(page_no, **self.page_kwargs))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip("zstandard")
+
+from fb_graphql_scraper.http_client import FacebookHttpClient
+from fb_graphql_scraper.tests.helpers import StubTimeline, story_line
+from fb_graphql_scraper.utils.archive import ResponseArchive, reparse
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+
+
+def test_records_are_read_back_across_segments(tmp_path):
+    archive = ResponseArchive(directory=str(tmp_path), segment_size=200)
+    for i in range(5):
+        archive.append(body=[story_line(str(i), 1760000000 - i, text="x" * 100)], profile="p", cursor=f"c{i}")
+    assert len(archive.segments()) > 1
+    assert len(archive) == 5
+    assert [record.cursor for record in archive] == [f"c{i}" for i in range(5)]
+    assert archive.read(archive.segments()[-1], 0).cursor == "c4"
+    archive.close()
+
+
+def test_a_grown_segment_is_remapped_and_the_old_map_closed(tmp_path):
+    archive = ResponseArchive(directory=str(tmp_path))
+    archive.append(body="first", profile="p")
+    assert archive.read(1, 0).body == "first"
+    old_map = archive._maps[1]
+    archive.append(body="second", profile="p")
+    assert archive.read(1, 1).body == "second"
+    assert old_map.closed
+    assert not archive._maps[1].closed
+    archive.close()
+
+
+def test_http_pages_are_archived_under_the_crawled_profile(tmp_path):
+    archive = ResponseArchive(directory=str(tmp_path))
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000), archive=archive,
+                                page_cache_ttl=0)
+    client.http = StubTimeline(pages=2)
+    with client.new_session():
+        client.crawl_profile = "love.yuweishao"
+        client.requests_flow(doc_id="2", fb_username_or_userid="100044561550831", days_limit=30,
+                             profile_feed=[], display_progress=False)
+    assert {record.profile for record in archive} == {"love.yuweishao"}
+    posts = reparse(archive)
+    assert list(posts) == ["love.yuweishao"]
+    assert len(posts["love.yuweishao"]) == 6
+    archive.close()
+
+
+def test_cached_pages_are_archived_for_every_crawl(tmp_path):
+    archive = ResponseArchive(directory=str(tmp_path))
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000), archive=archive,
+                                page_cache_ttl=30)
+    client.http = StubTimeline(pages=2)
+    for profile in ("love.yuweishao", "shard-2"):
+        client.crawl("100044561550831", "2", days_limit=30, display_progress=False, fb_username_or_userid=profile)
+    # The second crawl was served from the page cache, its archive has no gap
+    assert client.http.cursors == [None, "c0"]
+    posts = reparse(archive)
+    assert sorted(posts) == ["love.yuweishao", "shard-2"]
+    assert len(posts["shard-2"]) == len(posts["love.yuweishao"]) == 6
+    archive.close()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import os
+
+import requests
+
+from fb_graphql_scraper.facebook_graphql_scraper import FacebookGraphqlScraper
+from fb_graphql_scraper.tests.helpers import StubTimeline
+from fb_graphql_scraper.utils.bootstrap import (
+    DEFAULT_HEADERS, HttpBootstrapResolver, extract_doc_id, extract_profile_id, extract_script_urls
+)
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "bootstrap")
+BUNDLES = {
+    "https://static.xx.fbcdn.net/rsrc.php/v3/yK/r/a7Pc9lH0ZkR.js?_nc_x=Ij3Wp8lg5Kz": "other_bundle.js",
+    "https://static.xx.fbcdn.net/rsrc.php/v3iM2X4/yL/l/en_US/qE3yXy5pRt9.js?_nc_x=Ij3Wp8lg5Kz&_nc_eui2=AeHk":
+        "other_bundle.js",
+    "https://static.xx.fbcdn.net/rsrc.php/v3/yt/r/Jm8cS1dQh5o.js?_nc_x=Ij3Wp8lg5Kz": "timeline_bundle.js",
+}
+PAGES = {
+    "https://www.facebook.com/love.yuweishao?locale=en_us": "profile_page.html",
+    "https://www.facebook.com/KaiCenat?locale=en_us": "logged_out_page.html",
+}
+
+
+def fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def serve_fixtures(monkeypatch, resolver: HttpBootstrapResolver) -> list:
+    fetched = []
+
+    def get(url, request_kwargs):
+        fetched.append(url)
+        name = {**PAGES, **BUNDLES}.get(url)
+        if name is None:
+            raise requests.HTTPError(f"404 for {url}")
+        return fixture(name)
+    monkeypatch.setattr(resolver, "_get", get)
+    return fetched
+
+
+def test_extract_profile_id_skips_the_logged_out_viewer():
+    assert extract_profile_id(fixture("profile_page.html")) == "100044561550831"
+    # Only "userID":"0" of the viewer comes before the profile's id
+    assert extract_profile_id(fixture("logged_out_page.html")) == "100063702231120"
+    assert extract_profile_id('{"userID":"0"}') is None
+
+
+def test_extract_doc_id_from_preloaded_queries_and_bundles():
+    assert extract_doc_id(fixture("logged_out_page.html")) == "7634951233289847"
+    assert extract_doc_id(fixture("timeline_bundle.js")) == "8573212549359124"
+    # Another query's doc_id is not taken for the timeline's
+    assert extract_doc_id(fixture("other_bundle.js")) is None
+    assert extract_doc_id(fixture("profile_page.html")) is None
+
+
+def test_extract_script_urls_unescapes_and_dedupes():
+    assert extract_script_urls(fixture("profile_page.html")) == list(BUNDLES)
+
+
+def test_resolve_page_reads_the_bundles_when_the_page_has_no_doc_id(monkeypatch):
+    resolver = HttpBootstrapResolver(max_workers=1)
+    fetched = serve_fixtures(monkeypatch, resolver)
+    user_id, doc_id, html = resolver.resolve_page("love.yuweishao")
+    assert (user_id, doc_id) == ("100044561550831", "8573212549359124")
+    assert html == fixture("profile_page.html")
+    # The doc_id is cached for the next profile, only its page is fetched
+    del fetched[:]
+    assert resolver.resolve("KaiCenat") == ("100063702231120", "8573212549359124")
+    assert fetched == ["https://www.facebook.com/KaiCenat?locale=en_us"]
+
+
+def make_scraper(monkeypatch):
+    scraper = FacebookGraphqlScraper(
+        rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000), page_cache_ttl=0)
+    scraper.http = StubTimeline(pages=1)
+    serve_fixtures(monkeypatch, scraper.bootstrap_resolver)
+    plugin_calls = []
+
+    def followers(fb_username_or_userid):
+        plugin_calls.append(fb_username_or_userid)
+        return "1,484,829 followers"
+    monkeypatch.setattr(scraper, "get_plugin_page_followers", followers)
+    return scraper, plugin_calls
+
+
+def test_http_crawl_keeps_the_profile_intro_of_fan_pages(monkeypatch):
+    scraper, plugin_calls = make_scraper(monkeypatch)
+    res = scraper.get_user_posts("love.yuweishao", days_limit=30, display_progress=False)
+    assert len(res["data"]) == 3
+    assert res["profile"] == ["Page", " · Actor", "Taipei, Taiwan", "1,484,829 followers"]
+    assert plugin_calls == ["love.yuweishao"]
+
+
+def test_http_crawl_of_a_personal_profile_skips_the_plugin(monkeypatch):
+    scraper, plugin_calls = make_scraper(monkeypatch)
+    res = scraper.get_user_posts("KaiCenat", days_limit=30, display_progress=False)
+    assert res["profile"] == ["Streamer"]
+    assert plugin_calls == []
+
+
+def test_profile_pages_are_fetched_with_the_scrapers_session():
+    scraper = FacebookGraphqlScraper(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000))
+    assert scraper.bootstrap_resolver.http is scraper.http
+    fetched = []
+
+    class StubPageSession(object):
+        def get(self, url, **kwargs):
+            fetched.append((url, kwargs["headers"]["User-Agent"]))
+            response = requests.Response()
+            response.status_code, response._content = 200, fixture("logged_out_page.html").encode("utf-8")
+            return response
+
+    resolver = HttpBootstrapResolver(session=StubPageSession())
+    assert resolver.resolve("KaiCenat") == ("100063702231120", "7634951233289847")
+    assert fetched == [("https://www.facebook.com/KaiCenat?locale=en_us", DEFAULT_HEADERS["User-Agent"])]
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip("seleniumwire.webdriver")
+from fb_graphql_scraper.base.browser_pool import BrowserPool, PooledBrowser  # noqa: E402
+
+MIB = 1024 * 1024
+
+
+class StubDriver(object):
+    """Its JS heap belongs to the loaded page, like performance.memory and CDP metrics do"""
+
+    def __init__(self, page_heap: dict):
+        self.page_heap = page_heap
+        self.url = "about:blank"
+        self.window_handles = ["main"]
+        self.switch_to = self
+        self.requests = []
+        self.quit_called = False
+
+    def window(self, handle):
+        pass
+
+    def get(self, url):
+        self.url = url
+
+    def delete_all_cookies(self):
+        pass
+
+    def execute_script(self, script, *args):
+        return 1
+
+    def execute_cdp_cmd(self, cmd, params):
+        if cmd == "Performance.getMetrics":
+            return {"metrics": [{"name": "JSHeapUsedSize", "value": self.page_heap.get(self.url, MIB)}]}
+        return {}
+
+    def quit(self):
+        self.quit_called = True
+
+
+class StubBasePage(object):
+    def __init__(self, driver):
+        self.driver = driver
+
+    def clear_egress(self):
+        pass
+
+
+def make_pool(monkeypatch, page_heap: dict, **kwargs) -> BrowserPool:
+    monkeypatch.setattr(BrowserPool, "_process_tree_rss", staticmethod(lambda browser: None))
+    pool = BrowserPool(driver_path=None, size=1, **kwargs)
+    drivers = []
+
+    def create():
+        driver = StubDriver(page_heap)
+        drivers.append(driver)
+        browser = PooledBrowser(base_page=StubBasePage(driver), page_optional=None)
+        browser.baseline_memory = pool._memory_size(browser)
+        pool._created += 1
+        return browser
+    monkeypatch.setattr(pool, "_create", create)
+    pool.drivers = drivers
+    return pool
+
+
+def test_browser_is_recycled_when_the_leased_page_grew(monkeypatch):
+    pool = make_pool(monkeypatch, {"https://www.facebook.com/heavy": 900 * MIB}, max_heap_growth_mb=512)
+    with pool.lease() as browser:
+        browser.driver.get("https://www.facebook.com/heavy")
+    # Measured before the reset loaded about:blank
+    assert browser.memory == 900 * MIB
+    assert browser.driver.url == "about:blank"
+    with pool.lease() as second:
+        pass
+    assert second is not browser
+    assert pool.drivers[0].quit_called
+
+
+def test_browser_is_reused_while_it_stays_small(monkeypatch):
+    pool = make_pool(monkeypatch, {"https://www.facebook.com/light": 50 * MIB}, max_heap_growth_mb=512)
+    with pool.lease() as browser:
+        browser.driver.get("https://www.facebook.com/light")
+    with pool.lease() as second:
+        pass
+    assert second is browser
+    assert second.uses == 2
+
+
+def test_process_tree_rss_is_preferred_with_psutil(monkeypatch):
+    psutil = pytest.importorskip("psutil")
+    import os
+    driver = StubDriver({})
+    driver.service = type("Service", (), {"process": type("Popen", (), {"pid": os.getpid()})()})()
+    browser = PooledBrowser(base_page=StubBasePage(driver), page_optional=None)
+    assert BrowserPool._process_tree_rss(browser) >= psutil.Process().memory_info().rss
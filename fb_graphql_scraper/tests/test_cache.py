@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from fb_graphql_scraper.http_client import FacebookHttpClient
+from fb_graphql_scraper.tests.helpers import StubTimeline, timeline_page
+from fb_graphql_scraper.utils.cache import SingleFlight, TTLCache
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(ttl=0.05)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_the_least_recently_used_entry():
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_ttl_cache_evicts_by_size():
+    cache = TTLCache(ttl=60, max_size=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "yyyy")
+    assert cache.size == 8
+    cache.set("c", "zzzz")
+    assert cache.get("a") is None and cache.get("b") == "yyyy" and cache.get("c") == "zzzz"
+    assert cache.size == 8
+    # Bigger than the whole cache: not stored, and the entry it replaces is gone
+    cache.set("b", "w" * 11)
+    assert cache.get("b") is None
+    assert cache.size == 4
+    cache.delete("c")
+    assert cache.size == 0
+
+
+def test_single_flight_shares_one_call():
+    flights = SingleFlight()
+    calls = []
+    release = threading.Event()
+    results = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "body"
+
+    def run():
+        results.append(flights.do("key", slow))
+    threads = [threading.Thread(target=run) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while not calls:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert sorted(results) == [("body", False)] + [("body", True)] * 4
+    assert len(flights) == 0
+
+
+def test_single_flight_waiters_get_none_when_the_leader_fails():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    results, errors = [], []
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("upstream failed")
+
+    def lead():
+        try:
+            flights.do("key", failing)
+        except RuntimeError as e:
+            errors.append(e)
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(flights.do("key", lambda: "unused")))
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    assert len(errors) == 1
+    assert results == [(None, True)]
+
+
+def test_concurrent_crawls_of_a_profile_send_each_page_once():
+    http = StubTimeline(pages=3, delay=0.05)
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000), page_cache_ttl=30)
+    client.http = http
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        client.crawl("1", "2", days_limit=30, display_progress=False))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert sorted(http.cursors, key=str) == sorted([None, "c0", "c1"], key=str)
+    assert [len(res["data"]) for res in results] == [9] * 4
+
+
+def test_a_cursor_that_does_not_move_stops_the_crawl():
+    # The second page comes back with the same cursor and posts as the first one
+    page = timeline_page(0, now=int(time.time()))
+    http = StubTimeline(responses=[page, page])
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000), page_cache_ttl=30)
+    client.http = http
+    res = client.crawl("1", "2", days_limit=30, display_progress=False)
+    assert http.cursors == [None, "c0"]
+    assert len(res["data"]) == 3
+    assert res["stop_reason"] == "incomplete"
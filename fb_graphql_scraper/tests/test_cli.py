@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from fb_graphql_scraper import cli
+from fb_graphql_scraper.workers.crawl_worker import result_path, write_result
+
+
+class StubScraper(object):
+    """Stands in for build_scraper's FacebookGraphqlScraper, `failing` profiles raise"""
+
+    def __init__(self, failing: tuple = ()):
+        self.failing = failing
+        self.browser_pool = None
+        self.crawled = []
+        self.bootstrapped = []
+        self.calls = {}
+        self.closed = False
+
+    def bootstrap_profiles(self, profiles, max_tabs=8):
+        self.bootstrapped = list(profiles)
+        return {profile: (f"id-{profile}", "doc") for profile in profiles}
+
+    def get_user_posts(self, fb_username_or_userid, **kwargs):
+        self.crawled.append(fb_username_or_userid)
+        self.calls[fb_username_or_userid] = kwargs
+        if fb_username_or_userid in self.failing:
+            raise RuntimeError("boom")
+        return {"fb_username_or_userid": fb_username_or_userid, "profile": [], "data": [{"post_id": "1"}],
+                "stop_reason": "completed"}
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def scraper(monkeypatch):
+    monkeypatch.delenv("FB_ACCOUNT", raising=False)
+    scraper = StubScraper(failing=("broken",))
+    monkeypatch.setattr(cli, "build_scraper", lambda args, rate_limiter=None: scraper)
+    return scraper
+
+
+def write_profiles(tmp_path, lines: list) -> str:
+    path = tmp_path / "profiles.txt"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_read_profiles_skips_comments_blank_lines_and_duplicates(tmp_path):
+    path = write_profiles(tmp_path, ["# celebrities", "love.yuweishao", "", "KaiCenat  # streamer", "love.yuweishao"])
+    assert cli.read_profiles(path) == ["love.yuweishao", "KaiCenat"]
+
+
+def test_only_missing_or_cut_short_results_are_crawled_again(scraper, tmp_path):
+    out = tmp_path / "out"
+    write_result(str(out), "done", {"data": [], "stop_reason": "completed"})
+    write_result(str(out), "cut.short", {"data": [], "stop_reason": "deadline"})
+    write_result(str(out), "no.page.info", {"data": [], "stop_reason": "incomplete"})
+    with open(result_path(str(out), "corrupt"), "w", encoding="utf-8") as f:
+        f.write("{")
+    path = write_profiles(tmp_path, ["done", "cut.short", "no.page.info", "corrupt", "new"])
+    assert cli.main(["crawl", "--input", path, "--out", str(out)]) == 0
+    assert sorted(scraper.crawled) == ["corrupt", "cut.short", "new", "no.page.info"]
+    # The ids are bootstrapped for the whole batch at once
+    assert sorted(scraper.bootstrapped) == sorted(scraper.crawled)
+    assert scraper.calls["new"]["user_id"] == "id-new"
+    for profile in scraper.crawled:
+        assert cli.is_completed(str(out), profile)
+    assert scraper.closed
+
+
+def test_nothing_left_to_crawl(scraper, tmp_path):
+    out = tmp_path / "out"
+    write_result(str(out), "done", {"data": []})
+    assert cli.main(["crawl", "--input", write_profiles(tmp_path, ["done"]), "--out", str(out)]) == 0
+    assert scraper.crawled == []
+
+
+def test_failed_profiles_give_exit_code_1_and_are_retried(scraper, tmp_path):
+    out = tmp_path / "out"
+    path = write_profiles(tmp_path, ["love.yuweishao", "broken"])
+    assert cli.main(["crawl", "--input", path, "--out", str(out), "--concurrency", "2"]) == 1
+    assert cli.is_completed(str(out), "love.yuweishao")
+    assert not cli.is_completed(str(out), "broken")
+    scraper.crawled = []
+    assert cli.main(["crawl", "--input", path, "--out", str(out)]) == 1
+    assert scraper.crawled == ["broken"]
+
+
+def test_filter_arguments_build_a_post_filter(scraper, tmp_path):
+    path = write_profiles(tmp_path, ["love.yuweishao"])
+    argv = ["crawl", "--input", path, "--out", str(tmp_path / "out"), "--days", "7", "--max-posts", "5",
+            "--keyword", "新歌", "--keyword", "演唱會", "--no-has-attachments", "--time-budget", "60"]
+    assert cli.main(argv) == 0
+    kwargs = scraper.calls["love.yuweishao"]
+    assert kwargs["days_limit"] == 7
+    assert kwargs["time_budget"] == 60
+    post_filter = kwargs["post_filter"]
+    assert (post_filter.max_posts, post_filter.keywords, post_filter.has_attachments) == (5, ["新歌", "演唱會"], False)
+    with open(result_path(str(tmp_path / "out"), "love.yuweishao"), encoding="utf-8") as f:
+        assert json.load(f)["data"] == [{"post_id": "1"}]
+
+
+def test_no_filter_arguments_no_post_filter(scraper, tmp_path):
+    path = write_profiles(tmp_path, ["love.yuweishao"])
+    assert cli.main(["crawl", "--input", path, "--out", str(tmp_path / "out")]) == 0
+    assert scraper.calls["love.yuweishao"]["post_filter"] is None
+
+
+def test_a_command_is_required():
+    with pytest.raises(SystemExit):
+        cli.main([])
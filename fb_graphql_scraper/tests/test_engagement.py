@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import base64
+import json
+
+from fb_graphql_scraper.http_client import FacebookHttpClient
+from fb_graphql_scraper.tests.helpers import StubResponse, story_line
+from fb_graphql_scraper.utils.engagement import engagement_row, feedback_id_of, find_feedback
+from fb_graphql_scraper.utils.parser import REACTION_NAMES, RequestsParser
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+
+
+def feedback(post_id: str, reactions: int) -> dict:
+    return json.loads(story_line(post_id, 1760000000, reactions=reactions, comments=2))["data"]["node"]["feedback"]
+
+
+class StubFeedbackHttp(object):
+    """Answers feedback queries with the counters of the requested post"""
+
+    def __init__(self, missing: tuple = (), others: dict = None):
+        self.missing = missing
+        # post_id: id of the only feedback in its response, e.g. the one of a comment
+        self.others = others or {}
+
+    def post(self, url, data, **kwargs):
+        feedback_id = json.loads(data["variables"])["feedbackTargetID"]
+        post_id = base64.b64decode(feedback_id).decode("utf-8").split(":", 1)[1]
+        if post_id in self.missing:
+            return StubResponse(json.dumps({"data": {"feedback": None}}).encode("utf-8"))
+        answered = self.others.get(post_id, post_id)
+        body = {"data": {"feedback": {"id": feedback_id, **feedback(answered, reactions=int(answered))}}}
+        return StubResponse(json.dumps(body, ensure_ascii=False).encode("utf-8"))
+
+
+def test_feedback_id_is_the_relay_id_of_the_post():
+    assert base64.b64decode(feedback_id_of("123")) == b"feedback:123"
+
+
+def test_find_feedback_only_returns_the_requested_post():
+    data = {"data": {"nodes": [{"feedback": feedback("1", 3)}, {"feedback": feedback("2", 5)}]}}
+    assert find_feedback(data)["subscription_target_id"] == "1"
+    assert find_feedback(data, post_id="2")["subscription_target_id"] == "2"
+    assert find_feedback(data, post_id="3") is None
+
+
+def test_engagement_reactions_match_get_user_posts():
+    parser = RequestsParser(driver=None)
+    parser._clean_res()
+    parser.parse_line(story_line("7", 1760000000, reactions=7, comments=2))
+    post = parser.collect_posts()[0]
+    row = engagement_row(post_id="7", feedback=feedback("7", 7), fetched_at=0)
+    assert row["reactions"] == post["reactions"]
+    assert [list(each)[0] for each in row["reactions"]] == REACTION_NAMES
+    assert (row["reaction_count"], row["comment_count"], row["share_count"]) == (
+        post["total_reaction_count"], post["comment_count"], post["share_count"])
+
+
+def test_refresh_engagement_in_chunks():
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000), page_cache_ttl=0)
+    client.http = StubFeedbackHttp(missing=("4",), others={"5": "9"})
+    table = client.refresh_engagement(["1", "2", "3", "4", "5", "2"], doc_id="99", chunk_size=2, max_workers=2)
+    assert [row["post_id"] for row in table["data"]] == ["1", "2", "3"]
+    assert [row["reaction_count"] for row in table["data"]] == [1, 2, 3]
+    assert table["data"][0]["reactions"][0] == {"讚": 1}
+    # The counters of another post are not recorded as the ones of post 5
+    assert table["missing"] == ["4", "5"]
+    assert table["stop_reason"] == "completed"
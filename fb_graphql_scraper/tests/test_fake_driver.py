@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+import pytest
+
+from fb_graphql_scraper.base.fake_driver import FakeBrowserPool, FakeDriver, RecordedSession, VirtualClock
+from fb_graphql_scraper.facebook_graphql_scraper import FacebookGraphqlScraper
+from fb_graphql_scraper.pages.page_optional import PAGE_LOAD_TIMEOUT, PageOptional
+from fb_graphql_scraper.tests.helpers import StubTimeline
+from fb_graphql_scraper.utils.deadline import Deadline, DeadlineExceeded
+from fb_graphql_scraper.utils.post_filter import PostFilter
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+
+RECORDING = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "recorded_session.jsonl")
+PROFILE_URL = "https://www.facebook.com/love.yuweishao?locale=en_us"
+
+
+def load_session() -> RecordedSession:
+    return RecordedSession.load(RECORDING)
+
+
+def make_scraper(monkeypatch, pool: FakeBrowserPool, **kwargs) -> FacebookGraphqlScraper:
+    scraper = FacebookGraphqlScraper(browser_pool=pool, http_bootstrap=False, **kwargs)
+    # The recorded profile is a Page, its follower count would be looked up online
+    monkeypatch.setattr(scraper, "get_plugin_page_followers", lambda fb_username_or_userid: "12 followers")
+    return scraper
+
+
+def test_recording_is_rebased_to_now():
+    session = load_session()
+    assert len(session.requests) == 5
+    assert abs(session.recorded_at - time.time()) < 60
+    assert '"creation_time": 1760000000' not in session.requests[0]["response"]["body"]
+
+
+def test_load_next_page_runs_on_the_virtual_clock():
+    clock = VirtualClock()
+    driver = FakeDriver(session=load_session(), clock=clock)
+    page = PageOptional(driver=driver, clock=clock)
+    started = time.monotonic()
+    page.load_next_page(url=PROFILE_URL, deadline=Deadline(budget=60, clock=clock))
+    assert time.monotonic() - started < 1
+    assert clock.now == 2.5
+    # The timeout capped by the deadline only applies to this page load
+    assert driver.page_load_timeout == PAGE_LOAD_TIMEOUT
+    assert "ProfileTilesFeed_0" in driver.page_source
+    # The page load request has arrived, the next one waits for a scroll and its latency
+    assert len(driver.requests) == 1
+    page.scroll_window()
+    assert len(driver.requests) == 1
+    clock.advance(0.4)
+    assert len(driver.requests) == 2
+
+
+def test_page_load_past_the_deadline_stops_the_crawl():
+    clock = VirtualClock()
+    driver = FakeDriver(session=load_session(), clock=clock)
+    page = PageOptional(driver=driver, clock=clock)
+    with pytest.raises(DeadlineExceeded):
+        page.load_next_page(url=PROFILE_URL, deadline=Deadline(budget=1, clock=clock))
+    assert clock.now == 1
+    assert driver.page_load_timeout == PAGE_LOAD_TIMEOUT
+
+
+def test_load_next_page_clears_the_previous_profile():
+    clock = VirtualClock()
+    driver = FakeDriver(session=load_session(), clock=clock)
+    page = PageOptional(driver=driver, clock=clock)
+    page.load_next_page(url=PROFILE_URL)
+    page.scroll_window()
+    clock.advance(1)
+    page.load_next_page(url=PROFILE_URL)
+    assert len(driver.requests) == 1
+
+
+def test_logged_in_browser_flow_replays_the_recording(monkeypatch):
+    clock = VirtualClock()
+    pool = FakeBrowserPool(session=load_session(), clock=clock)
+    scraper = make_scraper(monkeypatch, pool, fb_account="recorded", hybrid_login=False)
+    started = time.monotonic()
+    res = scraper.get_user_posts("love.yuweishao", days_limit=30, display_progress=False,
+                                 deadline=Deadline(clock=clock))
+    assert time.monotonic() - started < 5
+    assert len(res["data"]) == 15
+    assert res["stop_reason"] == "completed"
+    assert res["profile"] == ["Page", " · Actor", "Taipei, Taiwan", "12 followers"]
+    assert clock.now > 0
+    assert pool.last_driver.stats["scrolls"] > 0
+
+
+def test_logged_out_browser_bootstrap_then_http_pagination(monkeypatch):
+    clock = VirtualClock()
+    pool = FakeBrowserPool(session=load_session(), clock=clock)
+    scraper = make_scraper(monkeypatch, pool, page_cache_ttl=0,
+                           rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000))
+    scraper.http = StubTimeline(pages=2)
+    res = scraper.get_user_posts("love.yuweishao", days_limit=30, display_progress=False,
+                                 deadline=Deadline(clock=clock))
+    # The ids captured from the recorded request drive the HTTP pagination
+    assert scraper.http.cursors == [None, "c0"]
+    assert len(res["data"]) == 6
+
+
+def test_deadline_on_the_virtual_clock_stops_the_browser_flow(monkeypatch):
+    clock = VirtualClock()
+    pool = FakeBrowserPool(session=load_session(), clock=clock)
+    scraper = make_scraper(monkeypatch, pool, fb_account="recorded", hybrid_login=False)
+    res = scraper.get_user_posts("love.yuweishao", days_limit=30, display_progress=False,
+                                 deadline=Deadline(budget=8, clock=clock))
+    assert res["stop_reason"] == "deadline"
+    assert 0 < len(res["data"]) < 15
+
+
+def test_max_posts_stops_scrolling_the_page(monkeypatch):
+    clock = VirtualClock()
+    pool = FakeBrowserPool(session=load_session(), clock=clock)
+    scraper = make_scraper(monkeypatch, pool, fb_account="recorded", hybrid_login=False)
+    res = scraper.get_user_posts("love.yuweishao", days_limit=30, display_progress=False,
+                                 deadline=Deadline(clock=clock), post_filter=PostFilter(max_posts=4))
+    assert len(res["data"]) == 4
+    assert res["stop_reason"] == "completed"
+    # The recording has five pages, the scrolling stops before the last ones are requested
+    assert len(pool.last_driver.requests) < 5
+
+
+def test_missing_timeline_ids_do_not_fall_back_to_the_previous_crawl(monkeypatch):
+    clock = VirtualClock()
+    pool = FakeBrowserPool(session=load_session(), clock=clock)
+    scraper = make_scraper(monkeypatch, pool, page_cache_ttl=0,
+                           rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000))
+    scraper.http = StubTimeline(pages=2)
+    scraper.get_user_posts("love.yuweishao", days_limit=30, display_progress=False, deadline=Deadline(clock=clock))
+    assert scraper.http.cursors == [None, "c0"]
+    # The next profile's page sends no timeline request
+    pool.session = load_session()
+    pool.session.requests = []
+    res = scraper.get_user_posts("someone.else", days_limit=30, display_progress=False,
+                                 deadline=Deadline(clock=clock))
+    assert scraper.http.cursors == [None, "c0"]
+    assert res["data"] == []
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fb_graphql_scraper.http_client import FacebookHttpClient
+from fb_graphql_scraper.tests.helpers import StubResponse
+from fb_graphql_scraper.utils.media import MediaDownloader
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+
+CONTENT = bytes(range(256)) * 400
+
+
+class MediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0, honor_range: bool = True):
+        super().__init__(("127.0.0.1", 0), MediaHandler)
+        self.delay = delay
+        self.honor_range = honor_range
+        self.ranges = []
+        self.active = {}
+        self.max_active = {}
+        self.lock = threading.Lock()
+
+    def url(self, path: str, host: str = "127.0.0.1") -> str:
+        return f"http://{host}:{self.server_address[1]}{path}"
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        host = self.headers["Host"]
+        with server.lock:
+            server.ranges.append(self.headers.get("Range"))
+            server.active[host] = server.active.get(host, 0) + 1
+            server.max_active[host] = max(server.max_active.get(host, 0), server.active[host])
+        try:
+            time.sleep(server.delay)
+            body, status = CONTENT, 200
+            if self.path.startswith("/other"):
+                body = CONTENT[::-1]
+            requested = self.headers.get("Range")
+            if requested and server.honor_range:
+                start = int(requested[len("bytes="):].rstrip("-"))
+                body, status = body[start:], 206
+            self.send_response(status)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active[host] -= 1
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**kwargs) -> MediaServer:
+        server = MediaServer(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def write_partial(media: MediaDownloader, url: str, length: int):
+    with open(media._partial_path(url), "wb") as f:
+        f.write(CONTENT[:length])
+
+
+def test_interrupted_download_is_resumed_with_a_range_request(serve, tmp_path):
+    server = serve()
+    url = server.url("/photo.jpg")
+    with MediaDownloader(directory=str(tmp_path), chunk_size=1000) as media:
+        write_partial(media, url, 12345)
+        media_file = media.submit(url).result(timeout=10)
+    assert server.ranges == ["bytes=12345-"]
+    assert media_file.sha256 == hashlib.sha256(CONTENT).hexdigest()
+    assert media_file.size == len(CONTENT)
+    with open(media_file.path, "rb") as f:
+        assert f.read() == CONTENT
+    assert os.listdir(os.path.join(str(tmp_path), ".partial")) == []
+
+
+def test_download_starts_over_when_the_range_is_ignored(serve, tmp_path):
+    server = serve(honor_range=False)
+    url = server.url("/photo.jpg")
+    with MediaDownloader(directory=str(tmp_path)) as media:
+        write_partial(media, url, 5000)
+        media_file = media.submit(url).result(timeout=10)
+    assert media_file.sha256 == hashlib.sha256(CONTENT).hexdigest()
+    assert media_file.size == len(CONTENT)
+
+
+def test_downloads_are_limited_per_host(serve, tmp_path):
+    server = serve(delay=0.05)
+    urls = [server.url(f"/p{i}.jpg", host=host) for host in ("127.0.0.1", "localhost") for i in range(6)]
+    with MediaDownloader(directory=str(tmp_path), max_workers=8, per_host=2) as media:
+        futures = [media.submit(url) for url in urls]
+        files = [future.result(timeout=10) for future in futures]
+    assert set(server.max_active.values()) == {2}
+    # The same content behind twelve urls is stored once
+    assert len({each.path for each in files}) == 1
+    assert sum(each.duplicate for each in files) == 11
+
+
+def test_manifest_skips_known_urls_on_the_next_run(serve, tmp_path):
+    server = serve()
+    url = server.url("/photo.jpg")
+    with MediaDownloader(directory=str(tmp_path)) as media:
+        media.submit(url).result(timeout=10)
+    with MediaDownloader(directory=str(tmp_path)) as media:
+        assert media.submit(url).result(timeout=10).sha256 == hashlib.sha256(CONTENT).hexdigest()
+    assert len(server.ranges) == 1
+
+
+def test_post_images_are_resolved_through_the_given_resolver(serve, tmp_path):
+    server = serve()
+    resolved = []
+
+    def resolve_images(post_id):
+        resolved.append(post_id)
+        return [server.url("/other.jpg")]
+    with MediaDownloader(directory=str(tmp_path), post_images=True) as media:
+        media.submit_post("123", [server.url("/photo.jpg")], resolve_images=resolve_images)
+        media.submit_post("456", [])
+        assert media.wait(timeout=10)
+    assert resolved == ["123"]
+    assert len(media.files) == 2
+
+
+class StubPluginHttp(object):
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        return StubResponse(b'<div><img src="https://scontent.xx.fbcdn.net/v/t39/1.jpg">'
+                            b'<img src="https://static.xx.fbcdn.net/rsrc.php/icon.png"></div>')
+
+
+def test_post_images_go_through_the_scrapers_session(tmp_path):
+    media = MediaDownloader(directory=str(tmp_path), post_images=True)
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000), media_downloader=media)
+    client.http = StubPluginHttp()
+    session = client._new_scrape_session()
+    session.profile = "love.yuweishao"
+    # Called from a media thread, outside of the crawl's thread
+    images = []
+    worker = threading.Thread(target=lambda: images.extend(session.requests_parser.resolve_post_images("987")))
+    worker.start()
+    worker.join(5)
+    assert images == ["https://scontent.xx.fbcdn.net/v/t39/1.jpg"]
+    assert "love.yuweishao%2Fposts%2F987" in client.http.urls[0]
+    media.close()
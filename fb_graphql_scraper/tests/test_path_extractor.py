@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+from fb_graphql_scraper.base.fake_driver import RecordedSession
+from fb_graphql_scraper.utils.path_extractor import PathMemoExtractor, shape_key
+from fb_graphql_scraper.utils.utils import (
+    find_creation, find_feedback_with_subscription_target_id, find_message_text, find_owning_profile,
+)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIND_HELPERS = {
+    "feedback": find_feedback_with_subscription_target_id,
+    "message_text": find_message_text,
+    "creation_time": find_creation,
+    "owning_profile": find_owning_profile,
+}
+
+
+def load_lines(name: str) -> list:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def recorded_lines() -> list:
+    lines = []
+    for request in RecordedSession.load(os.path.join(FIXTURES, "recorded_session.jsonl")).requests:
+        lines.extend(json.loads(line) for line in request["response"]["body"].split("\n") if line.strip())
+    return lines
+
+
+def assert_matches_find_helpers(lines: list, extractor: PathMemoExtractor):
+    for json_data in lines:
+        shape = shape_key(json_data)
+        for field, find in FIND_HELPERS.items():
+            # An empty value is None either way
+            assert extractor.find(json_data, field, shape) == (find(json_data) or None), (field, json_data)
+
+
+def test_reshares_read_their_own_text():
+    extractor = PathMemoExtractor()
+    lines = load_lines("reshared_stories.jsonl")
+    # The first story has no text of its own, its message path goes into the attached story
+    assert extractor.find(lines[0], "message_text", shape_key(lines[0])) == "原本的貼文"
+    assert extractor.find(lines[1], "message_text", shape_key(lines[1])) == "轉分享的留言"
+    assert_matches_find_helpers(lines, extractor)
+
+
+def test_memo_matches_find_helpers_in_any_order():
+    lines = load_lines("reshared_stories.jsonl") + recorded_lines()
+    extractor = PathMemoExtractor()
+    assert_matches_find_helpers(lines, extractor)
+    assert_matches_find_helpers(list(reversed(lines)), extractor)
+    assert extractor.hits > 0
+
+
+def test_learnt_paths_are_reused():
+    lines = recorded_lines()
+    extractor = PathMemoExtractor()
+    assert_matches_find_helpers(lines, extractor)
+    hits, misses = extractor.hits, extractor.misses
+    assert_matches_find_helpers(lines, extractor)
+    # The second time only the fields missing from a line are searched again
+    missing = sum(1 for each in lines for find in FIND_HELPERS.values() if not find(each))
+    assert extractor.misses - misses == missing
+    assert extractor.hits - hits == len(lines) * len(FIND_HELPERS) - missing
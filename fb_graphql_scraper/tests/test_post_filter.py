@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import time
+
+from fb_graphql_scraper.http_client import FacebookHttpClient
+from fb_graphql_scraper.tests.helpers import StubTimeline, page_info_line, story_line
+from fb_graphql_scraper.utils.parser import RequestsParser
+from fb_graphql_scraper.utils.post_filter import PostFilter
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+
+NOW = int(time.time())
+VIDEO = {"url": "https://video.xx.fbcdn.net/v/t42/1.mp4"}
+
+
+def make_parser(post_filter: PostFilter = None) -> RequestsParser:
+    parser = RequestsParser(driver=None)
+    parser._clean_res()
+    parser.post_filter = post_filter
+    return parser
+
+
+def kept_ids(parser: RequestsParser) -> list:
+    return [each["subscription_target_id"] for each in parser.feedback_list]
+
+
+def test_parse_line_keeps_stories_and_skips_other_lines():
+    parser = make_parser()
+    for line in [story_line("1", NOW, text="hello"), page_info_line("c0"), "", "for (;;);{\"error\":1}",
+                 story_line("2", NOW - 10, text="world")]:
+        parser.parse_line(line)
+    assert kept_ids(parser) == ["1", "2"]
+    assert parser.context_list == ["hello", "world"]
+    assert parser.last_creation_time == NOW - 10
+
+
+def test_parse_line_drops_duplicated_posts():
+    parser = make_parser()
+    parser.parse_line(story_line("1", NOW, text="first"))
+    parser.parse_line(story_line("1", NOW, text="again"))
+    assert kept_ids(parser) == ["1"]
+    assert parser.context_list == ["first"]
+
+
+def test_cheap_predicates():
+    post_filter = PostFilter(min_reactions=10, min_comments=2, keywords="Concert", regex=r"\d{4}")
+    parser = make_parser(post_filter)
+    parser.parse_line(story_line("1", NOW, text="concert 2025", reactions=12, comments=3))
+    parser.parse_line(story_line("2", NOW, text="concert 2025", reactions=9, comments=3))
+    parser.parse_line(story_line("3", NOW, text="concert 2025", reactions=12, comments=1))
+    parser.parse_line(story_line("4", NOW, text="show 2025", reactions=12, comments=3))
+    parser.parse_line(story_line("5", NOW, text="CONCERT soon", reactions=12, comments=3))
+    assert kept_ids(parser) == ["1"]
+    # A dropped post still moves the pagination on
+    assert parser.last_creation_time == NOW
+
+
+def test_attachment_predicate():
+    parser = make_parser(PostFilter(has_attachments=True))
+    parser.parse_line(story_line("1", NOW, attachments=[VIDEO]))
+    parser.parse_line(story_line("2", NOW))
+    assert kept_ids(parser) == ["1"]
+    assert parser.attachments_list == [["https://video.xx.fbcdn.net/v/t42/1.mp4"]]
+
+
+def test_max_posts_stops_parsing():
+    parser = make_parser(PostFilter(max_posts=2))
+    for i in range(4):
+        parser.parse_line(story_line(str(i), NOW - i))
+    assert kept_ids(parser) == ["0", "1"]
+    assert parser.is_full()
+    assert not make_parser().is_full()
+
+
+def make_client(http) -> FacebookHttpClient:
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000), page_cache_ttl=0)
+    client.http = http
+    return client
+
+
+def test_max_posts_ends_the_pagination():
+    for pipeline in (False, True):
+        http = StubTimeline(pages=5, delay=0.02)
+        client = make_client(http)
+        with client.new_session():
+            client.requests_parser.post_filter = PostFilter(max_posts=4)
+            res = client.requests_flow(doc_id="2", fb_username_or_userid="1", days_limit=30, profile_feed=[],
+                                       display_progress=False, pipeline=pipeline)
+        assert len(res["data"]) == 4
+        # The second page fills the filter, no page after it is requested
+        assert http.cursors == [None, "c0"]
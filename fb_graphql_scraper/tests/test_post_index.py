@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from fb_graphql_scraper.http_client import FacebookHttpClient
+from fb_graphql_scraper.tests.helpers import StubTimeline
+from fb_graphql_scraper.utils.post_index import PostIndex
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+
+
+def post(post_id: str, creation_time: str, text: str, reactions: int = 0) -> dict:
+    return {
+        "post_id": post_id,
+        "creation_time": creation_time,
+        "post_url": f"https://www.facebook.com/{post_id}",
+        "text": text,
+        "attachments": [],
+        "total_reaction_count": reactions,
+        "reactions": [{"like": reactions}],
+        "comment_count": 0,
+        "share_count": 0,
+    }
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = PostIndex(path=str(tmp_path / "posts.sqlite3"))
+    index.add_posts([
+        post("1", "2025-03-01 10:00:00", "今晚的演唱會謝謝大家"),
+        post("2", "2025-02-01 10:00:00", "New single out now"),
+        post("3", "2025-01-01 10:00:00", "演唱會 rehearsal day"),
+    ], profile="love.yuweishao")
+    index.add_posts([post("4", "2025-03-02 10:00:00", "another 演唱會")], profile="someone.else")
+    yield index
+    index.close()
+
+
+def test_search_matches_every_term_newest_first(index):
+    assert [each["post_id"] for each in index.search("演唱會")] == ["4", "1", "3"]
+    assert [each["post_id"] for each in index.search("演唱會 rehearsal")] == ["3"]
+    assert index.search("concert") == []
+
+
+def test_search_by_profile_and_time_range(index):
+    found = index.search("演唱會", profile="love.yuweishao", since="2025-02-01")
+    assert [each["post_id"] for each in found] == ["1"]
+    assert [each["post_id"] for each in index.search(until="2025-01-31")] == ["3"]
+    assert found[0]["creation_time"] == "2025-03-01 10:00:00"
+    assert found[0]["reactions"] == [{"like": 0}]
+
+
+def test_short_terms_and_quotes(index):
+    # Two characters are shorter than a trigram, they are matched with LIKE
+    assert [each["post_id"] for each in index.search("謝謝")] == ["1"]
+    assert index.search('"unbalanced') == []
+
+
+def test_recrawl_updates_the_post(index):
+    index.add_posts([post("2", "2025-02-01 10:00:00", "New single out now, 演唱會 soon", reactions=40)])
+    assert len(index) == 4
+    updated = index.search("演唱會 soon")
+    assert [each["post_id"] for each in updated] == ["2"]
+    # The profile is kept when the update does not give one
+    assert updated[0]["profile"] == "love.yuweishao"
+    assert updated[0]["total_reaction_count"] == 40
+
+
+def test_crawl_by_numeric_id_indexes_under_the_given_profile(tmp_path):
+    index = PostIndex(path=str(tmp_path / "posts.sqlite3"))
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000), post_index=index,
+                                page_cache_ttl=0)
+    client.http = StubTimeline(pages=2)
+    client.crawl("100044561550831", "2", days_limit=30, display_progress=False,
+                 fb_username_or_userid="love.yuweishao")
+    assert len(index.search(profile="love.yuweishao")) == 6
+    assert index.search(profile="100044561550831") == []
+    index.close()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+from fb_graphql_scraper.http_client import FacebookHttpClient, get_profile_dir
+from fb_graphql_scraper.tests.helpers import StubTimeline
+from fb_graphql_scraper.utils.profiler import OTHER_STAGE, CrawlProfiler
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+
+
+def make_client() -> FacebookHttpClient:
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000), page_cache_ttl=0)
+    client.http = StubTimeline(pages=2)
+    return client
+
+
+def test_stages_are_charged_exclusive_time(tmp_path):
+    profiler = CrawlProfiler(label="stages", out_dir=str(tmp_path))
+    profiler.start()
+    with profiler.stage("fetch"):
+        time.sleep(0.05)
+        with profiler.stage("parse_body"):
+            time.sleep(0.1)
+    profiler.stop()
+    assert profiler.stats["fetch"].calls == 1
+    assert 0.04 <= profiler.stats["fetch"].wall < 0.1
+    assert profiler.stats["parse_body"].wall >= 0.1
+    assert profiler.stats[OTHER_STAGE].wall < 0.05
+    saved = profiler.save()
+    assert os.path.exists(saved["report"]) and os.path.exists(saved["pstats"])
+
+
+def test_overlapping_profilers_share_tracemalloc(tmp_path):
+    assert not tracemalloc.is_tracing()
+    first_started, second_started, first_stopped = threading.Event(), threading.Event(), threading.Event()
+    profilers, errors = {}, []
+
+    def crawl(name, started, wait_for, then=None):
+        try:
+            profiler = profilers[name] = CrawlProfiler(label=name, out_dir=str(tmp_path))
+            profiler.start()
+            started.set()
+            wait_for.wait(5)
+            with profiler.stage("parse_body"):
+                [bytearray(1024) for _ in range(10)]
+            profiler.stop()
+            profiler.save()
+            if then is not None:
+                then.set()
+        except BaseException as e:
+            errors.append(e)
+
+    # The first crawl finishes while the second one is still running
+    second = threading.Thread(target=crawl, args=("second", second_started, first_stopped))
+    first = threading.Thread(target=crawl, args=("first", first_started, second_started, first_stopped))
+    first.start()
+    first_started.wait(5)
+    second.start()
+    first.join(5)
+    second.join(5)
+    assert errors == []
+    assert profilers["first"].snapshot is not None and profilers["second"].snapshot is not None
+    assert not tracemalloc.is_tracing()
+
+
+def test_profiler_keeps_tracing_started_by_someone_else(tmp_path):
+    tracemalloc.start()
+    try:
+        profiler = CrawlProfiler(label="outer", out_dir=str(tmp_path))
+        profiler.start()
+        profiler.stop()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_profiled_crawl_reports_its_stages(tmp_path):
+    res = make_client().crawl("1", "2", days_limit=30, display_progress=False, profile=str(tmp_path))
+    assert len(res["data"]) == 6
+    stages = res["profiling"]["stages"]
+    assert {"fetch", "decode", "parse_body", "collect_posts", "format_data"} <= set(stages)
+    assert os.path.exists(res["profiling"]["report"])
+
+
+def test_profile_dir_follows_the_environment(monkeypatch):
+    monkeypatch.delenv("FB_SCRAPER_PROFILE", raising=False)
+    assert get_profile_dir(None) is None
+    assert get_profile_dir(True) == "profiles"
+    assert get_profile_dir("out") == "out"
+    monkeypatch.setenv("FB_SCRAPER_PROFILE", "1")
+    assert get_profile_dir(None) == "profiles"
+    assert get_profile_dir(False) is None
+    monkeypatch.setenv("FB_SCRAPER_PROFILE", "/tmp/reports")
+    assert get_profile_dir(None) == "/tmp/reports"
+
+
+def test_nothing_is_imported_when_profiling_is_off():
+    code = (
+        "import sys\n"
+        "from fb_graphql_scraper.http_client import FacebookHttpClient\n"
+        "from fb_graphql_scraper.tests.helpers import StubTimeline\n"
+        "client = FacebookHttpClient()\n"
+        "client.http = StubTimeline(pages=1)\n"
+        "res = client.crawl('1', '2', days_limit=30, display_progress=False)\n"
+        "assert 'profiling' not in res\n"
+        "print(sorted(m for m in ('cProfile', 'pstats', 'tracemalloc') if m in sys.modules))\n"
+    )
+    env = {k: v for k, v in os.environ.items() if k != "FB_SCRAPER_PROFILE"}
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=root, env=env, check=True)
+    assert out.stdout.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import os
+
+from fb_graphql_scraper.base.fake_driver import FakeBasePage, FakeBrowserPool, FakeDriver, RecordedSession, VirtualClock
+from fb_graphql_scraper.facebook_graphql_scraper import FacebookGraphqlScraper
+from fb_graphql_scraper.http_client import FacebookHttpClient
+from fb_graphql_scraper.tests.helpers import StubTimeline
+from fb_graphql_scraper.utils.deadline import Deadline
+from fb_graphql_scraper.utils.proxy_pool import EgressConfig, ProxyPool
+from fb_graphql_scraper.utils.rate_limiter import (
+    OUTCOME_ERROR, OUTCOME_OK, OUTCOME_THROTTLED, AdaptiveRateLimiter,
+)
+
+THROTTLED_BODY = b'for (;;);{"error":1675004,"errorSummary":"Rate limit exceeded"}'
+PROXIES = ["http://10.0.0.1:3128", "http://10.0.0.2:3128"]
+COOKIE_EGRESSES = [
+    EgressConfig(proxy_url=PROXIES[0], cookies={"datr": "a"}),
+    EgressConfig(proxy_url=PROXIES[1], cookies={"c": "b"}),
+]
+RECORDING = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "recorded_session.jsonl")
+PROFILE_URL = "https://www.facebook.com/love.yuweishao?locale=en_us"
+
+
+class ProxiedTimeline(StubTimeline):
+    """Also records the proxy each request went through"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.proxies = []
+
+    def post(self, url, data, **kwargs):
+        self.proxies.append((kwargs.get("proxies") or {}).get("https"))
+        return super().post(url, data, **kwargs)
+
+
+def test_egress_request_kwargs():
+    egress = EgressConfig(proxy_url=PROXIES[0], headers={"User-Agent": "ua"}, cookies={"datr": "x"})
+    assert egress.identity == PROXIES[0]
+    assert egress.request_kwargs() == {
+        "proxies": {"http": PROXIES[0], "https": PROXIES[0]},
+        "headers": {"User-Agent": "ua"},
+        "cookies": {"datr": "x"},
+    }
+    assert EgressConfig(name="direct-2").request_kwargs() == {}
+    assert EgressConfig().seleniumwire_proxy() == {}
+
+
+def test_profiles_stick_to_their_egress():
+    pool = ProxyPool(PROXIES)
+    first = pool.acquire(profile="a")
+    second = pool.acquire(profile="b")
+    assert first is not second
+    pool.release(first)
+    assert pool.acquire(profile="a") is first
+    assert [each["active"] for each in pool.health()] == [1, 1]
+
+
+def test_throttled_or_failing_egress_cools_down():
+    pool = ProxyPool(PROXIES, cooldown=60, failure_threshold=2)
+    first = pool.acquire(profile="a")
+    pool.report(first, OUTCOME_THROTTLED)
+    assert pool.acquire(profile="a") is not first
+    other = pool.egresses[1]
+    pool.report(other, OUTCOME_ERROR)
+    assert pool.health()[1]["cooldown"] == 0
+    pool.report(other, OUTCOME_ERROR)
+    assert pool.health()[1]["cooldown"] > 0
+    # Everything is cooling down: the egress that recovers first
+    assert pool.acquire() is first
+
+
+def test_success_resets_the_failure_count():
+    pool = ProxyPool(PROXIES, failure_threshold=2)
+    egress = pool.egresses[0]
+    pool.report(egress, OUTCOME_ERROR)
+    pool.report(egress, OUTCOME_OK)
+    pool.report(egress, OUTCOME_ERROR)
+    assert pool.health()[0]["cooldown"] == 0
+
+
+def test_throttled_page_is_retried_through_another_egress():
+    http = ProxiedTimeline(responses=[THROTTLED_BODY], pages=1)
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000, throttle_penalty=0.01),
+                                proxy_pool=ProxyPool(PROXIES), page_cache_ttl=0)
+    client.http = http
+    res = client.crawl("1", "2", days_limit=30, display_progress=False)
+    assert len(res["data"]) == 3
+    assert http.proxies[0] != http.proxies[1]
+    assert [each["active"] for each in client.proxy_pool.health()] == [0, 0]
+
+
+def test_swapped_egress_is_applied_to_the_sessions_browser():
+    client = FacebookHttpClient(proxy_pool=ProxyPool(PROXIES))
+    with client.new_session():
+        client.session.base_page = FakeBasePage(driver=FakeDriver(session=RecordedSession(url=PROFILE_URL)))
+        client._acquire_egress(profile="a")
+        client.session.base_page.apply_egress(client.egress)
+        first = client.egress
+        client._report_egress(outcome=OUTCOME_THROTTLED)
+        assert client.egress is not first
+        assert client.session.base_page.egress is client.egress
+
+
+def test_egress_cookies_do_not_leak_into_the_next_egress():
+    driver = FakeDriver(session=RecordedSession(url=PROFILE_URL, cookies=[{"name": "datr", "value": "own"}]))
+    driver.get(PROFILE_URL)
+    page = FakeBasePage(driver=driver)
+    first, second = COOKIE_EGRESSES
+    page.apply_egress(first)
+    assert driver.get_cookie("datr")["value"] == "a"
+    page.apply_egress(second)
+    assert {each["name"]: each["value"] for each in driver.get_cookies()} == {"datr": "own", "c": "b"}
+    page.clear_egress()
+    assert {each["name"]: each["value"] for each in driver.get_cookies()} == {"datr": "own"}
+    assert driver.proxy == {}
+    # Cookies are set without navigating away
+    assert driver.current_url == PROFILE_URL
+    assert driver.stats["get"] == 1
+
+
+def test_egress_swapped_mid_crawl_keeps_the_browser_on_the_profile(monkeypatch):
+    clock = VirtualClock()
+    pool = FakeBrowserPool(session=RecordedSession.load(RECORDING), clock=clock)
+    scraper = FacebookGraphqlScraper(
+        browser_pool=pool, http_bootstrap=False, page_cache_ttl=0, proxy_pool=ProxyPool(COOKIE_EGRESSES),
+        rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000, throttle_penalty=0.01))
+    monkeypatch.setattr(scraper, "get_plugin_page_followers", lambda fb_username_or_userid: "12 followers")
+    scraper.http = ProxiedTimeline(responses=[THROTTLED_BODY], pages=2)
+    res = scraper.get_user_posts("love.yuweishao", days_limit=30, display_progress=False,
+                                 deadline=Deadline(clock=clock))
+    assert len(res["data"]) == 6
+    assert scraper.http.proxies[0] != scraper.http.proxies[1]
+    driver = pool.last_driver
+    assert driver.current_url == PROFILE_URL
+    # The recorded datr the first egress replaced is back, only the egress the crawl moved to has its cookies set
+    assert {each["name"]: each["value"] for each in driver.get_cookies()} == {"datr": "rec0rded", "c": "b"}
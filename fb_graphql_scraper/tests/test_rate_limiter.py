@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+
+import pytest
+
+from fb_graphql_scraper.utils.rate_limiter import (
+    OUTCOME_ERROR, OUTCOME_OK, OUTCOME_THROTTLED, AdaptiveRateLimiter, AIMDController, TokenBucket, classify_response,
+)
+
+DATA_LINE = json.dumps({"data": {"node": {"id": "1"}}})
+
+
+def errors_line(code: int, message: str = "Something went wrong") -> str:
+    return json.dumps({"errors": [{"code": code, "message": message}]})
+
+
+@pytest.mark.parametrize("status_code, body_content, outcome", [
+    (429, [], OUTCOME_THROTTLED),
+    (503, [], OUTCOME_THROTTLED),
+    (500, [DATA_LINE], OUTCOME_ERROR),
+    (200, [], OUTCOME_ERROR),
+    (200, [DATA_LINE], OUTCOME_OK),
+    (200, [errors_line(4)], OUTCOME_THROTTLED),
+    (200, [errors_line(17)], OUTCOME_THROTTLED),
+    (200, [errors_line(368)], OUTCOME_THROTTLED),
+    (200, [errors_line(1, "Too many requests")], OUTCOME_THROTTLED),
+    (200, ['for (;;);{"error":1675004,"errorSummary":"Rate limit exceeded"}'], OUTCOME_THROTTLED),
+    (200, ['for (;;);{"error":1357001,"errorSummary":"Not logged in"}'], OUTCOME_ERROR),
+    (200, [errors_line(1)], OUTCOME_ERROR),
+    # Partial errors next to data still carry posts
+    (200, [DATA_LINE, errors_line(1)], OUTCOME_OK),
+    (200, [DATA_LINE, errors_line(368)], OUTCOME_THROTTLED),
+])
+def test_classify_response(status_code, body_content, outcome):
+    assert classify_response(status_code, body_content) == outcome
+
+
+def test_token_bucket_gives_up_without_waiting_past_the_timeout():
+    bucket = TokenBucket(rate=1, capacity=2)
+    assert bucket.acquire() and bucket.acquire()
+    started = time.monotonic()
+    assert not bucket.acquire(timeout=0.1)
+    assert time.monotonic() - started < 0.1
+    fast = TokenBucket(rate=100, capacity=1)
+    assert fast.acquire()
+    assert fast.acquire(timeout=1)
+
+
+def test_penalized_bucket_is_drained_and_blocked():
+    bucket = TokenBucket(rate=1000, capacity=10)
+    bucket.penalize(5)
+    assert bucket.tokens == 0
+    assert not bucket.acquire(timeout=1)
+
+
+def test_aimd_decreases_multiplicatively_and_grows_additively():
+    controller = AIMDController(initial=8, minimum=1, maximum=10)
+    for outcome in (OUTCOME_THROTTLED, OUTCOME_THROTTLED):
+        assert controller.acquire()
+        controller.release(outcome)
+    assert controller.limit == 2
+    # Roughly one slot per window of successes
+    for _ in range(2):
+        assert controller.acquire()
+        controller.release(OUTCOME_OK)
+    assert 2.8 < controller.limit < 3
+    for _ in range(4):
+        controller.acquire()
+        controller.release(OUTCOME_THROTTLED)
+    assert controller.limit == 1
+    for _ in range(200):
+        controller.acquire()
+        controller.release(OUTCOME_OK)
+    assert controller.limit == 10
+    # Errors neither grow nor shrink the window
+    controller.acquire()
+    controller.release(OUTCOME_ERROR)
+    assert controller.limit == 10
+
+
+def test_aimd_waits_for_a_free_slot():
+    controller = AIMDController(initial=1)
+    assert controller.acquire()
+    assert not controller.acquire(timeout=0.05)
+    controller.release(OUTCOME_OK)
+    assert controller.acquire(timeout=0.05)
+
+
+def test_cooldown_doubles_while_an_identity_keeps_being_throttled():
+    limiter = AdaptiveRateLimiter(rate=1000, burst=1000, throttle_penalty=10)
+    bucket, _ = limiter._get_state("proxy")
+    cooldowns = []
+    for _ in range(3):
+        limiter._record("proxy", bucket, OUTCOME_THROTTLED)
+        cooldowns.append(round(bucket.blocked_until - time.monotonic()))
+    assert cooldowns == [10, 20, 40]
+    limiter._record("proxy", bucket, OUTCOME_OK)
+    bucket.blocked_until = 0.0
+    limiter._record("proxy", bucket, OUTCOME_THROTTLED)
+    assert round(bucket.blocked_until - time.monotonic()) == 10
+    # Other identities keep their own bucket
+    assert limiter._get_state("direct")[0].acquire(timeout=0)
+
+
+def test_total_rate_is_shared_by_every_identity():
+    limiter = AdaptiveRateLimiter(rate=1000, burst=1000, total_rate=1, total_burst=1)
+    with limiter.request("a"):
+        pass
+    with pytest.raises(TimeoutError):
+        with limiter.request("b", timeout=0.1):
+            pass
+    # The slot taken for the refused request was given back
+    assert limiter._get_state("b")[1].in_flight == 0
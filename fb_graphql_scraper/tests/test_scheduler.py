@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import requests
+
+from fb_graphql_scraper.utils.bootstrap import HttpBootstrapResolver
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+from fb_graphql_scraper.workers.scheduler import DAY, ActivityScheduler, ProfileActivity
+
+
+class StubScraper(object):
+    def __init__(self, failing: tuple = ()):
+        self.crawled = []
+        self.failing = failing
+        self._lock = threading.Lock()
+
+    def get_user_posts(self, fb_username_or_userid, days_limit, display_progress, time_budget):
+        with self._lock:
+            self.crawled.append(fb_username_or_userid)
+        if fb_username_or_userid in self.failing:
+            raise RuntimeError("boom")
+        return {"data": [], "stop_reason": "completed"}
+
+
+def test_total_rate_is_shared_by_every_identity():
+    limiter = AdaptiveRateLimiter(rate=1000, burst=1000, max_concurrency=100, total_rate=20, total_burst=2)
+    started = time.monotonic()
+    for identity in ("a", "b", "c", "a", "b", "c"):
+        with limiter.request(identity, timeout=5):
+            pass
+    # 2 from the burst, 4 more at 20 per second
+    assert time.monotonic() - started >= 0.18
+
+
+def test_total_rate_gives_up_at_the_timeout():
+    limiter = AdaptiveRateLimiter(rate=1000, burst=1000, total_rate=0.01, total_burst=1)
+    with limiter.request("a", timeout=1):
+        pass
+    try:
+        with limiter.request("b", timeout=0.05):
+            pass
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError("the total budget was exceeded")
+
+
+def test_due_profiles_are_ordered_by_due_time_then_cost():
+    scheduler = ActivityScheduler(scraper=StubScraper())
+    now = time.time()
+    busy = ProfileActivity("busy", posts={str(i): now - i * 3600 for i in range(50)}, observed_since=now - 3 * DAY,
+                           last_crawled_at=now - 2 * DAY)
+    quiet = ProfileActivity("quiet", observed_since=now - 30 * DAY, last_crawled_at=now - 2 * DAY)
+    late = ProfileActivity("late", observed_since=now - 30 * DAY, last_crawled_at=now - 2 * DAY)
+    with scheduler._lock:
+        for activity, due_at in ((busy, now - 60), (quiet, now - 60), (late, now - 120)):
+            scheduler.profiles[activity.profile] = activity
+            scheduler._schedule(activity, due_at)
+    assert scheduler.estimate_requests(busy, now) > scheduler.estimate_requests(quiet, now)
+    assert [scheduler._pop_due().profile for _ in range(3)] == ["late", "quiet", "busy"]
+
+
+def test_run_crawls_due_profiles_and_saves_the_schedule(tmp_path):
+    scraper = StubScraper()
+    state_path = str(tmp_path / "state.json")
+    scheduler = ActivityScheduler(scraper=scraper, max_workers=2, state_path=state_path)
+    scheduler.add_profiles(["a", "b", "c"])
+    scheduler.run(until=time.time() + 0.5)
+    assert sorted(scraper.crawled) == ["a", "b", "c"]
+    resumed = ActivityScheduler(scraper=scraper, state_path=state_path)
+    assert all(activity.next_crawl_at > time.time() for activity in resumed.profiles.values())
+
+
+def test_profile_page_requests_go_through_the_rate_limiter(monkeypatch):
+    limiter = AdaptiveRateLimiter(throttle_penalty=0.01)
+    resolver = HttpBootstrapResolver(rate_limiter=limiter)
+    response = requests.Response()
+    response.status_code = 429
+
+    def throttled(url, request_kwargs):
+        raise requests.HTTPError(response=response)
+    monkeypatch.setattr(resolver, "_get", throttled)
+    assert resolver.resolve("someone", identity="proxy-1") == (None, None)
+    assert limiter._consecutive_throttles["proxy-1"] == 1
+
+
+def test_crawls_are_counted_in_stats_without_a_line_each(capsys):
+    results = []
+    scheduler = ActivityScheduler(scraper=StubScraper(failing=("b",)), max_workers=2,
+                                  on_result=lambda profile, result, new_posts: results.append(profile))
+    scheduler.add_profiles(["a", "b", "c"])
+    scheduler.run(until=time.time() + 0.5)
+    assert capsys.readouterr().out == ""
+    stats = scheduler.stats()
+    assert (stats["crawled"], stats["failed"]) == (2, 1)
+    assert sorted(results) == ["a", "c"]
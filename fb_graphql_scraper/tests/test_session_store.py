@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+import requests
+
+pytest.importorskip("cryptography")
+
+from fb_graphql_scraper.http_client import FacebookHttpClient
+from fb_graphql_scraper.tests.helpers import StubResponse
+from fb_graphql_scraper.utils.proxy_pool import EgressConfig, ProxyPool
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+from fb_graphql_scraper.utils.session_store import SessionStore
+
+PROXY = "http://10.0.0.1:3128"
+COOKIES = [
+    {"name": "c_user", "value": "1000", "domain": ".facebook.com", "expiry": int(time.time()) + 86400},
+    {"name": "xs", "value": "secret", "domain": ".facebook.com", "expiry": int(time.time()) + 86400},
+]
+
+
+class StubDriver(object):
+    def __init__(self, logged_in: bool = True):
+        self.logged_in = logged_in
+        self.urls = []
+        self.cookies = {}
+        self.current_url = None
+
+    def get(self, url):
+        self.urls.append(url)
+        self.current_url = url if self.logged_in else "https://www.facebook.com/login/"
+
+    def add_cookie(self, cookie):
+        self.cookies[cookie["name"]] = cookie
+
+    def get_cookie(self, name):
+        return self.cookies.get(name) if self.logged_in else None
+
+    def execute_script(self, script, *args):
+        return None
+
+
+class StubPageHttp(object):
+    """Replaces `client.http`: answers /me with a redirect to `location`, or fails when it is None"""
+
+    def __init__(self, location: str = None):
+        self.location = location
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(kwargs)
+        if self.location is None:
+            raise requests.ConnectionError("offline")
+        response = StubResponse(b"", status_code=302)
+        response.headers = {"Location": self.location}
+        return response
+
+    def close(self):
+        pass
+
+
+def make_client(location: str = None) -> FacebookHttpClient:
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000),
+                                proxy_pool=ProxyPool([EgressConfig(proxy_url=PROXY, cookies={"datr": "x"})]))
+    client.http = StubPageHttp(location=location)
+    return client
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SessionStore(directory=str(tmp_path), key="passphrase")
+    store.save("me@example.com", cookies=COOKIES, local_storage={"k": "v"})
+    return store
+
+
+def test_sessions_are_encrypted_per_account(store, tmp_path):
+    assert store.load("me@example.com")["local_storage"] == {"k": "v"}
+    assert store.load("other@example.com") is None
+    for path in tmp_path.iterdir():
+        assert b"secret" not in path.read_bytes()
+    assert SessionStore(directory=str(tmp_path), key="wrong").load("me@example.com") is None
+
+
+def test_live_session_is_restored_with_one_page_load(store):
+    client = make_client(location="https://www.facebook.com/profile.php?id=1000")
+    driver = StubDriver()
+    assert store.restore_to_driver("me@example.com", driver, http_client=client)
+    assert driver.urls == ["https://www.facebook.com/"]
+    assert set(driver.cookies) == {"c_user", "xs"}
+
+
+def test_session_is_checked_through_the_clients_egress_and_limiter(store):
+    client = make_client(location="https://www.facebook.com/profile.php?id=1000")
+    with client.new_session():
+        client._acquire_egress(profile="me@example.com")
+        assert store.restore_to_driver("me@example.com", StubDriver(), http_client=client)
+    call = client.http.calls[0]
+    assert call["proxies"]["https"] == PROXY
+    assert call["cookies"] == {"datr": "x", "c_user": "1000", "xs": "secret"}
+    assert call["allow_redirects"] is False
+    # The redirect counted as a success of the egress
+    assert client.rate_limiter.concurrency(PROXY) > 2
+
+
+def test_dead_session_costs_no_page_load(store):
+    client = make_client(location="https://www.facebook.com/login/?next=%2Fme")
+    driver = StubDriver()
+    assert not store.restore_to_driver("me@example.com", driver, http_client=client)
+    assert driver.urls == []
+    assert store.load("me@example.com") is None
+
+
+def test_unchecked_session_is_checked_in_the_browser(store):
+    driver = StubDriver(logged_in=False)
+    assert not store.restore_to_driver("me@example.com", driver, http_client=make_client(location=None))
+    assert driver.urls == ["https://www.facebook.com/"] * 2
+    assert store.load("me@example.com") is None
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import json
+import random
+import time
+
+import pytest
+
+from fb_graphql_scraper.http_client import FacebookHttpClient
+from fb_graphql_scraper.tests.helpers import StubResponse, StubTimeline, story_line
+from fb_graphql_scraper.utils.parser import RequestsParser
+from fb_graphql_scraper.utils.rate_limiter import AdaptiveRateLimiter
+from fb_graphql_scraper.utils.utils import iter_json_lines
+
+THROTTLED_BODY = b'for (;;);{"error":1675004,"errorSummary":"Rate limit exceeded"}'
+
+
+def make_client(http) -> FacebookHttpClient:
+    client = FacebookHttpClient(
+        rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000, throttle_penalty=0.01), page_cache_ttl=0)
+    client.http = http
+    return client
+
+
+def test_iter_json_lines_matches_split_for_any_chunking():
+    rng = random.Random(7)
+    for _ in range(200):
+        lines = [json.dumps({"text": "測試" * rng.randint(0, 20), "i": i}, ensure_ascii=False)
+                 for i in range(rng.randint(0, 6))]
+        body = "\n".join(lines) + ("\n" if rng.random() < 0.3 else "")
+        raw = body.encode("utf-8")
+        cuts = sorted(rng.sample(range(len(raw) + 1), min(len(raw) + 1, rng.randint(0, 12))))
+        chunks = [raw[a:b] for a, b in zip([0] + cuts, cuts + [len(raw)])]
+        assert list(iter_json_lines(chunks)) == body.split("\n")
+        assert list(iter_json_lines(raw)) == body.split("\n")
+
+
+def test_iter_json_lines_is_lazy():
+    def chunks():
+        yield b'{"a": 1}\n{"b"'
+        raise AssertionError("read past the first complete line")
+
+    assert next(iter_json_lines(chunks())) == '{"a": 1}'
+
+
+def test_parse_line_skips_lines_that_are_not_json():
+    parser = RequestsParser(driver=None)
+    parser._clean_res()
+    parser.parse_line(THROTTLED_BODY.decode())
+    parser.parse_line("")
+    assert parser.res_new == []
+
+
+def test_streamed_throttle_page_backs_off_and_retries():
+    http = StubTimeline(responses=[THROTTLED_BODY], pages=1)
+    res = make_client(http).crawl("1", "2", days_limit=30, display_progress=False)
+    # The throttled page is retried instead of aborting the crawl
+    assert http.cursors == [None, None]
+    assert [post["post_id"] for post in res["data"]] == ["00", "01", "02"]
+    assert res["stop_reason"] == "completed"
+
+
+def test_error_status_body_is_not_parsed():
+    http = StubTimeline(responses=[StubResponse(b"<html>oops</html>", status_code=500)], pages=1)
+    res = make_client(http).crawl("1", "2", days_limit=30, display_progress=False)
+    assert len(res["data"]) == 3
+
+
+def test_rate_limiter_giving_up_before_the_deadline_is_reported_as_rate_limited():
+    http = StubTimeline(pages=3)
+    client = FacebookHttpClient(rate_limiter=AdaptiveRateLimiter(rate=0.01, burst=1), page_cache_ttl=0)
+    client.http = http
+    # The second page's token would only arrive long after the budget
+    res = client.crawl("1", "2", days_limit=30, display_progress=False, time_budget=30)
+    assert http.cursors == [None]
+    assert len(res["data"]) == 3
+    assert res["stop_reason"] == "rate_limited"
+
+
+def test_close_stops_the_metadata_threads():
+    with make_client(StubTimeline(pages=1)) as client:
+        assert client.submit_metadata(lambda: 1).result() == 1
+    with pytest.raises(RuntimeError):
+        client.submit_metadata(lambda: 1)
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_page_without_page_info_stops_as_incomplete(pipeline):
+    page = story_line("1", int(time.time()), text="post 0").encode("utf-8")
+    http = StubTimeline(responses=[page])
+    res = make_client(http).crawl("1", "2", days_limit=30, display_progress=False, pipeline=pipeline)
+    assert http.cursors == [None]
+    assert len(res["data"]) == 1
+    assert res["stop_reason"] == "incomplete"
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+from urllib.parse import urlencode
+
+from fb_graphql_scraper.base.fake_driver import VirtualClock
+from fb_graphql_scraper.pages.tab_bootstrap import GRAPHQL_URL, TIMELINE_QUERY_NAME, TabBootstrap
+from fb_graphql_scraper.utils.deadline import Deadline
+
+USER_IDS = {"love.yuweishao": "100044561550831", "kaicenat": "100044253168423"}
+
+
+class StubRequest(object):
+    def __init__(self, profile: str):
+        self.url = GRAPHQL_URL
+        self.body = urlencode({
+            "fb_api_req_friendly_name": TIMELINE_QUERY_NAME,
+            "variables": json.dumps({"id": USER_IDS[profile.lower()]}),
+            "doc_id": "8573212549359124",
+        }).encode("utf-8")
+        self.headers = {"Referer": f"https://www.facebook.com/{profile}?locale=en_us"}
+
+
+class StubSwitchTo(object):
+    def __init__(self, driver):
+        self.driver = driver
+
+    def window(self, handle):
+        self.driver.current_window_handle = handle
+
+
+class StubTabDriver(object):
+    """Each opened tab of a known profile sends its timeline request at once,
+    `on_close` runs when a tab is closed and `on_nudge` when a tab is scrolled"""
+
+    def __init__(self, on_close=None, on_nudge=None):
+        self.window_handles = ["main"]
+        self.current_window_handle = "main"
+        self.switch_to = StubSwitchTo(self)
+        self.on_close = on_close
+        self.on_nudge = on_nudge
+        self._requests = []
+
+    @property
+    def requests(self):
+        return list(self._requests)
+
+    @requests.deleter
+    def requests(self):
+        self._requests = []
+
+    def execute_script(self, script, *args):
+        if script.startswith("window.open"):
+            profile = args[0].split("/")[-1].split("?")[0]
+            self.window_handles.append(f"tab-{len(self.window_handles)}")
+            if profile.lower() in USER_IDS:
+                self._requests.append(StubRequest(profile))
+        elif self.on_nudge is not None:
+            self.on_nudge()
+
+    def close(self):
+        self.window_handles.remove(self.current_window_handle)
+        if self.on_close is not None:
+            self.on_close()
+
+
+def test_profiles_are_resolved_in_chunks_of_tabs():
+    driver = StubTabDriver()
+    resolved = TabBootstrap(driver=driver, max_tabs=1).resolve(["love.yuweishao", "KaiCenat"])
+    assert resolved == {
+        "love.yuweishao": ("100044561550831", "8573212549359124"),
+        "KaiCenat": ("100044253168423", "8573212549359124"),
+    }
+    assert driver.window_handles == ["main"]
+
+
+def test_deadline_running_out_between_chunks_returns_what_was_resolved():
+    deadline = Deadline()
+    driver = StubTabDriver(on_close=deadline.cancel)
+    resolved = TabBootstrap(driver=driver, max_tabs=1).resolve(["love.yuweishao", "KaiCenat"], deadline=deadline)
+    assert resolved == {"love.yuweishao": ("100044561550831", "8573212549359124")}
+
+
+def test_cancel_during_a_chunk_stops_it_at_once():
+    clock = VirtualClock()
+    deadline = Deadline(clock=clock)
+    driver = StubTabDriver(on_nudge=deadline.cancel)
+    started = time.monotonic()
+    resolved = TabBootstrap(driver=driver, max_tabs=2, timeout=30).resolve(
+        ["love.yuweishao", "unknown.profile", "KaiCenat"], deadline=deadline)
+    assert resolved == {"love.yuweishao": ("100044561550831", "8573212549359124")}
+    # The chunk waiting for the unknown profile did not run until its own timeout
+    assert time.monotonic() - started < 5
+    assert clock.now < 30
+    assert driver.window_handles == ["main"]
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from fb_graphql_scraper.workers.crawl_worker import CrawlWorker
+from fb_graphql_scraper.workers.work_queue import (
+    STATUS_DONE, STATUS_FAILED, STATUS_LEASED, STATUS_QUEUED, RedisWorkQueue, SqliteWorkQueue
+)
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_queue(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "sqlite":
+            return SqliteWorkQueue(path=str(tmp_path / "jobs.sqlite3"), **kwargs)
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        return RedisWorkQueue(client=fakeredis.FakeRedis(), **kwargs)
+    return make
+
+
+def test_jobs_are_leased_once_and_completed(make_queue):
+    queue = make_queue()
+    job_id = queue.put(profile="KaiCenat", days_limit=30)
+    job = queue.lease("w1")
+    assert (job.job_id, job.profile, job.days_limit, job.attempts) == (job_id, "KaiCenat", 30, 1)
+    assert queue.lease("w2") is None
+    assert queue.extend(job, "w1")
+    assert queue.complete(job, {"data": [1, 2]})
+    assert queue.result(job_id) == {"data": [1, 2]}
+    assert queue.stats()[STATUS_DONE] == 1
+
+
+def test_failed_job_is_retried_then_parked(make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.put(profile="KaiCenat")
+    assert queue.fail(queue.lease("w1"), "boom")
+    job = queue.lease("w1")
+    assert job.attempts == 2
+    assert queue.fail(job, "boom again")
+    assert queue.lease("w1") is None
+    assert queue.stats()[STATUS_FAILED] == 1
+
+
+def test_expired_lease_cannot_be_used_by_its_old_owner(make_queue):
+    queue = make_queue(visibility_timeout=0.05)
+    job_id = queue.put(profile="KaiCenat")
+    stale = queue.lease("w1")
+    time.sleep(0.1)
+    current = queue.lease("w2")
+    assert current.job_id == job_id and current.attempts == 2
+    # The first worker wakes up: none of its calls may touch the new lease
+    assert not queue.extend(stale, "w1")
+    assert not queue.fail(stale, "late failure")
+    assert not queue.complete(stale, {"data": ["stale"]})
+    assert queue.result(job_id) is None
+    assert queue.stats().get(STATUS_QUEUED, 0) == 0
+    assert queue.complete(current, {"data": ["fresh"]})
+    assert queue.result(job_id) == {"data": ["fresh"]}
+
+
+def test_lease_token_is_checked_not_the_worker_id(make_queue):
+    queue = make_queue(visibility_timeout=0.05)
+    queue.put(profile="KaiCenat")
+    stale = queue.lease("w1")
+    time.sleep(0.1)
+    current = queue.lease("w1")
+    assert not queue.complete(stale, {"data": []})
+    assert queue.stats()[STATUS_LEASED] == 1
+    assert queue.complete(current, {"data": []})
+
+
+class StubScraper(object):
+    def __init__(self, fail_on=()):
+        self.fail_on = fail_on
+
+    def get_user_posts(self, fb_username_or_userid, days_limit, display_progress, deadline):
+        if fb_username_or_userid in self.fail_on:
+            raise RuntimeError("crawl failed")
+        return {"data": [{"post_id": "1"}], "stop_reason": "completed"}
+
+
+def test_worker_drains_the_queue(make_queue, tmp_path):
+    queue = make_queue(max_attempts=1)
+    ok_id = queue.put(profile="ok")
+    queue.put(profile="broken")
+    worker = CrawlWorker(scraper=StubScraper(fail_on={"broken"}), queue=queue, out_dir=str(tmp_path / "out"))
+    worker.run(exit_when_empty=True)
+    assert queue.result(ok_id)["data"] == [{"post_id": "1"}]
+    assert queue.stats()[STATUS_FAILED] == 1
+    assert (tmp_path / "out" / "ok.json").exists()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+
+# offset in segment, compressed length, timestamp
+INDEX_RECORD = struct.Struct("<QId")
+SEGMENT_SUFFIX = ".zst"
+INDEX_SUFFIX = ".idx"
+
+
+def _load_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "ResponseArchive needs the 'zstandard' package: pip install facebook-graphql-scraper[archive]"
+        ) from None
+    return zstandard
+
+
+class ArchiveRecord(object):
+    def __init__(self, profile: str, cursor: str, timestamp: float, source: str, body: str):
+        self.profile = profile
+        self.cursor = cursor
+        self.timestamp = timestamp
+        self.source = source
+        self.body = body
+
+    @property
+    def body_content(self) -> list:
+        """Body split into json lines, as `parse_body` expects it"""
+        return self.body.split("\n")
+
+    def __repr__(self):
+        return f"ArchiveRecord(profile={self.profile!r}, cursor={self.cursor!r}, timestamp={self.timestamp})"
+
+
+class ResponseArchive(object):
+    """Append-only archive of raw GraphQL bodies.
+
+    Every record is its own zstd frame inside a segment file
+    (`segment-000001.zst`), preceded by a one line json header with the
+    profile, cursor, timestamp and source. A fixed-width index next to each
+    segment (`segment-000001.idx`) stores where each frame starts, so a
+    single record is read through mmap without touching the others.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024, level: int = 3):
+        zstandard = _load_zstandard()
+        self.directory = directory
+        self.segment_size = segment_size
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._lock = threading.Lock()
+        self._map_lock = threading.Lock()
+        self._maps = {}
+        os.makedirs(directory, exist_ok=True)
+        segments = self.segments()
+        self._segment_no = segments[-1] if segments else 1
+
+    def _segment_path(self, segment_no: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment_no:06d}{SEGMENT_SUFFIX}")
+
+    def _index_path(self, segment_no: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment_no:06d}{INDEX_SUFFIX}")
+
+    def segments(self) -> list:
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith("segment-") and name.endswith(SEGMENT_SUFFIX):
+                numbers.append(int(name[len("segment-"):-len(SEGMENT_SUFFIX)]))
+        return sorted(numbers)
+
+    def append(self, body, profile: str = None, cursor: str = None, source: str = "requests_flow",
+               timestamp: float = None):
+        """Store one raw body, `body` may be bytes, str or a list of json lines"""
+        if isinstance(body, list):
+            body = "\n".join(body)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        if timestamp is None:
+            timestamp = time.time()
+        header = json.dumps({
+            "profile": profile,
+            "cursor": cursor,
+            "timestamp": timestamp,
+            "source": source,
+        }).encode("utf-8")
+        frame = self._compressor.compress(header + b"\n" + body)
+
+        with self._lock:
+            segment_path = self._segment_path(self._segment_no)
+            if os.path.exists(segment_path) and os.path.getsize(segment_path) >= self.segment_size:
+                self._segment_no += 1
+                segment_path = self._segment_path(self._segment_no)
+            with open(segment_path, "ab") as segment:
+                offset = segment.tell()
+                segment.write(frame)
+            with open(self._index_path(self._segment_no), "ab") as index:
+                index.write(INDEX_RECORD.pack(offset, len(frame), timestamp))
+
+    def _index(self, segment_no: int) -> list:
+        with open(self._index_path(segment_no), "rb") as index:
+            raw = index.read()
+        usable = len(raw) - len(raw) % INDEX_RECORD.size
+        return list(INDEX_RECORD.iter_unpack(raw[:usable]))
+
+    def _frame(self, segment_no: int, offset: int, length: int) -> bytes:
+        """Bytes of one frame, the segment is remapped when it grew past the frame"""
+        with self._map_lock:
+            current = self._maps.get(segment_no)
+            if current is None or len(current) < offset + length:
+                if current is not None:
+                    current.close()
+                with open(self._segment_path(segment_no), "rb") as segment:
+                    current = mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment_no] = current
+            return current[offset:offset + length]
+
+    def _decode(self, frame: bytes) -> ArchiveRecord:
+        raw = self._decompressor.decompress(frame)
+        header, _, body = raw.partition(b"\n")
+        meta = json.loads(header)
+        return ArchiveRecord(body=body.decode("utf-8"), **meta)
+
+    def read(self, segment_no: int, position: int) -> ArchiveRecord:
+        """Read the `position`-th record of a segment"""
+        offset, length, _ = self._index(segment_no)[position]
+        return self._decode(self._frame(segment_no, offset, length))
+
+    def __iter__(self):
+        for segment_no in self.segments():
+            for offset, length, _ in self._index(segment_no):
+                yield self._decode(self._frame(segment_no, offset, length))
+
+    def __len__(self):
+        return sum(len(self._index(segment_no)) for segment_no in self.segments())
+
+    def close(self):
+        with self._map_lock:
+            for each in self._maps.values():
+                each.close()
+            self._maps = {}
+
+
+def reparse(archive, profile: str = None) -> dict:
+    """Rerun RequestsParser over an archive, no request is sent.
+
+    Args:
+        archive (ResponseArchive | str): Archive, or the directory of one.
+        profile (str): Only reparse the records of this profile.
+
+    Returns:
+        dict: {profile: posts} with the posts `collect_posts` builds.
+    """
+    from fb_graphql_scraper.utils.parser import RequestsParser
+
+    if isinstance(archive, str):
+        archive = ResponseArchive(directory=archive)
+    parsers = {}
+    for record in archive:
+        if profile is not None and record.profile != profile:
+            continue
+        if record.profile not in parsers:
+            parsers[record.profile] = RequestsParser(driver=None)
+            parsers[record.profile]._clean_res()
+        parsers[record.profile].parse_body(body_content=record.body_content)
+    return {each_profile: parser.collect_posts() for each_profile, parser in parsers.items()}
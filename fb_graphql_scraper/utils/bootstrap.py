@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from fb_graphql_scraper.utils.rate_limiter import DEFAULT_IDENTITY, OUTCOME_ERROR, classify_response
+
+
+TIMELINE_QUERY_NAMES = ("ProfileCometTimelineFeedRefetchQuery",)
+
+# A desktop browser user agent, Facebook serves a stripped page to unknown clients
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Sec-Fetch-Mode": "navigate",
+}
+
+# Ordered from the most to the least specific place the numeric id shows up
+PROFILE_ID_PATTERNS = [
+    re.compile(r'"props":\{"userID":"(\d+)"'),
+    re.compile(r'"profile_owner":\{"id":"(\d+)"'),
+    re.compile(r'"userID":"(\d+)"'),
+    re.compile(r'"pageID":"(\d+)"'),
+    re.compile(r'fb://(?:profile|page)/(?:\?id=)?(\d+)'),
+    re.compile(r'"delegate_page":\{[^{}]*?"id":"(\d+)"'),
+]
+
+SCRIPT_URL_PATTERNS = [
+    re.compile(r'<script[^>]+src="(https://static\.xx\.fbcdn\.net/rsrc\.php/[^"]+?\.js[^"]*)"'),
+    # Bundles listed in the bootloader maps are json-escaped
+    re.compile(r'"(https:\\/\\/static\.xx\.fbcdn\.net\\/rsrc\.php\\/[^"]+?\.js[^"]*)"'),
+]
+
+
+def extract_profile_id(html: str):
+    """Numeric id of the profile from the embedded data of its page, None if absent"""
+    for pattern in PROFILE_ID_PATTERNS:
+        for match in pattern.finditer(html):
+            # "0" is what logged-out pages use for the viewer, the profile's id may come later
+            if match.group(1) != "0":
+                return match.group(1)
+    return None
+
+
+def extract_doc_id(text: str, query_names: tuple = TIMELINE_QUERY_NAMES):
+    """Timeline query doc_id from a JS bundle or from the preloaded queries of a page"""
+    for query_name in query_names:
+        name = re.escape(query_name)
+        patterns = [
+            # __d("<query>_facebookRelayOperation",[],(function(a,b,c,d,e,f){e.exports="<doc_id>"}),null);
+            re.compile(name + r'_facebookRelayOperation",\[\],\(function\([a-z,]*\)\{e\.exports="(\d+)"'),
+            re.compile(r'"queryName":"' + name + r'"[^{}]*?"queryID":"(\d+)"'),
+            re.compile(r'"queryID":"(\d+)"[^{}]*?"queryName":"' + name + r'"'),
+            re.compile(name + r'[^{}]{0,200}?"(?:doc_id|queryID)":"(\d+)"'),
+        ]
+        for pattern in patterns:
+            match = pattern.search(text)
+            if match:
+                return match.group(1)
+    return None
+
+
+def extract_script_urls(html: str) -> list:
+    """JS bundle urls referenced by a page, in page order and without duplicates"""
+    urls = []
+    seen = set()
+    for pattern in SCRIPT_URL_PATTERNS:
+        for match in pattern.finditer(html):
+            url = match.group(1).replace("\\/", "/").replace("&amp;", "&")
+            if url not in seen:
+                seen.add(url)
+                urls.append(url)
+    return urls
+
+
+class HttpBootstrapResolver(object):
+    """Resolve (user_id, doc_id) of a profile over plain HTTP.
+
+    1. Fetch the profile page and read the numeric id from its embedded data.
+    2. Look for the timeline query doc_id in the preloaded queries of the
+       page, then in the JS bundles it references.
+
+    The doc_id belongs to Facebook's current build, not to a profile, so it
+    is cached and shared by every profile resolved afterwards. With a
+    `rate_limiter` the profile page requests go through the same budget as the
+    timeline requests (the JS bundles come from the CDN and are not counted).
+    `session` is the requests.Session the pages are fetched with, the scraper
+    passes its pooled one so the connections are reused by the GraphQL requests.
+    """
+
+    def __init__(self, headers: dict = None, max_scripts: int = 80, max_workers: int = 8, timeout: float = 15,
+                 rate_limiter=None, session: requests.Session = None):
+        self.headers = headers or DEFAULT_HEADERS
+        self.rate_limiter = rate_limiter
+        self.http = session if session is not None else requests.Session()
+        self.max_scripts = max_scripts
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.doc_id = None
+        self._lock = threading.Lock()
+
+    def _get(self, url: str, request_kwargs: dict) -> str:
+        kwargs = dict(request_kwargs or {})
+        headers = dict(self.headers)
+        headers.update(kwargs.pop("headers", {}))
+        kwargs.setdefault("timeout", self.timeout)
+        response = self.http.get(url=url, headers=headers, **kwargs)
+        response.raise_for_status()
+        return response.text
+
+    def fetch_profile_html(self, fb_username_or_userid: str, request_kwargs: dict = None,
+                           identity: str = DEFAULT_IDENTITY, timeout: float = None) -> str:
+        url = f"https://www.facebook.com/{fb_username_or_userid}?locale=en_us"
+        if self.rate_limiter is None:
+            return self._get(url=url, request_kwargs=request_kwargs)
+        with self.rate_limiter.request(identity, timeout=timeout) as permit:
+            try:
+                return self._get(url=url, request_kwargs=request_kwargs)
+            except requests.RequestException as e:
+                response = getattr(e, "response", None)
+                status_code = response.status_code if response is not None else None
+                permit.outcome = classify_response(status_code, []) if status_code else OUTCOME_ERROR
+                error = e
+        # Raised outside of the permit so a 429 counts as throttled, not as an error
+        raise error
+
+    def find_doc_id(self, html: str, request_kwargs: dict = None):
+        doc_id = extract_doc_id(html)
+        if doc_id:
+            return doc_id
+        script_urls = extract_script_urls(html)[:self.max_scripts]
+        if not script_urls:
+            return None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._get, url, request_kwargs) for url in script_urls]
+            for future in as_completed(futures):
+                try:
+                    doc_id = extract_doc_id(future.result())
+                except requests.RequestException:
+                    continue
+                if doc_id:
+                    for each in futures:
+                        each.cancel()
+                    return doc_id
+        return None
+
+    def resolve(self, fb_username_or_userid: str, request_kwargs: dict = None, identity: str = DEFAULT_IDENTITY,
+                timeout: float = None):
+        """Returns:
+            tuple: (user_id, doc_id), either may be None when it could not be found.
+        """
+        user_id, doc_id, _ = self.resolve_page(
+            fb_username_or_userid, request_kwargs=request_kwargs, identity=identity, timeout=timeout)
+        return user_id, doc_id
+
+    def resolve_page(self, fb_username_or_userid: str, request_kwargs: dict = None,
+                     identity: str = DEFAULT_IDENTITY, timeout: float = None):
+        """resolve() that also returns the profile page it fetched, for the profile info.
+
+        Returns:
+            tuple: (user_id, doc_id, html), html is None when the page could not be fetched.
+        """
+        try:
+            html = self.fetch_profile_html(
+                fb_username_or_userid, request_kwargs=request_kwargs, identity=identity, timeout=timeout)
+        except requests.RequestException as e:
+            print(f"Fetch profile page failed, message: {e}")
+            return None, None, None
+        except TimeoutError:
+            print("No request budget left to fetch the profile page.")
+            return None, None, None
+
+        user_id = fb_username_or_userid if fb_username_or_userid.isdigit() else extract_profile_id(html)
+        with self._lock:
+            doc_id = self.doc_id
+        if doc_id is None:
+            doc_id = self.find_doc_id(html, request_kwargs=request_kwargs)
+            if doc_id:
+                with self._lock:
+                    self.doc_id = doc_id
+        return user_id, doc_id, html
+
+    def remember_doc_id(self, doc_id: str):
+        """Cache a doc_id found some other way, e.g. by a browser capture"""
+        with self._lock:
+            self.doc_id = doc_id
+
+    def forget_doc_id(self):
+        """Drop the cached doc_id, e.g. after Facebook rejected it"""
+        with self._lock:
+            self.doc_id = None
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TTLCache(object):
+    """Thread-safe mapping whose entries expire `ttl` seconds after they were set.
+    Holds at most `max_entries`, the least recently used entry is dropped first.
+    With `max_size` the entries are also evicted once their total `sizeof(value)`
+    goes over it, a value bigger than `max_size` on its own is not stored.
+
+    How to use:
+        cache = TTLCache(ttl=6 * 3600)
+        cache.set(("followers", "love.yuweishao"), "1,234,567 followers")
+        cache.get(("followers", "love.yuweishao"))  # None once expired
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024, max_size: int = None, sizeof=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.sizeof = sizeof or (lambda value: 1)
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        _, _, size = self._entries.pop(key)
+        self.size -= size
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value, _ = entry
+            if time.monotonic() >= expires_at:
+                self._pop(key)
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            if self.max_size is not None and size > self.max_size:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_size is not None and self.size > self.max_size):
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SingleFlight(object):
+    """Concurrent calls with the same key share one execution.
+
+    The first caller of a key runs `func`, callers arriving while it runs wait
+    for its result instead of running `func` again. If the first caller raises,
+    the exception stays its own and the waiting callers get None.
+
+    How to use:
+        flights = SingleFlight()
+        body, shared = flights.do(key, lambda: fetch(key))
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, wait=None):
+        """Returns (result, shared), `shared` is True when another caller ran `func`.
+        `wait(future)` blocks a waiting caller until the result is there, it defaults
+        to future.result() and may raise to give up waiting."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return (wait or Future.result)(future), True
+        result = None
+        try:
+            result = func()
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+            future.set_result(result)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._calls)
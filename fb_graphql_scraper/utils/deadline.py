@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+
+# Why a crawl stopped, reported as "stop_reason" in its result
+STOP_COMPLETED = "completed"
+STOP_REJECTED = "rejected"
+STOP_DEADLINE = "deadline"
+STOP_CANCELLED = "cancelled"
+# The rate limiter could not hand out the next request before the deadline
+STOP_RATE_LIMITED = "rate_limited"
+# A page came back without page_info, whether more posts follow is unknown
+STOP_INCOMPLETE = "incomplete"
+
+
+class DeadlineExceeded(BaseException):
+    """Raised inside a crawl once its budget is spent or it was cancelled.
+    Like KeyboardInterrupt it is not an Exception, so the broad
+    `except Exception` retries of the browser flow do not swallow it."""
+
+    def __init__(self, reason: str = STOP_DEADLINE):
+        super().__init__(f"Crawl stopped: {reason}")
+        self.reason = reason
+
+
+class SystemClock(object):
+    """Wall clock. Deadlines and page waits read time through a clock so a
+    VirtualClock (base/fake_driver.py) can replay the browser flow offline"""
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def wait(self, event: threading.Event, seconds: float = None) -> bool:
+        """Sleep until `event` is set or `seconds` have passed"""
+        return event.wait(seconds)
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class Deadline(object):
+    """Time budget and cancellation flag shared by everything a crawl waits on.
+
+    HTTP timeouts, WebDriver waits, rate limiter waits and retry pauses all
+    take what is left of the budget, so a crawl cannot outlive it by more
+    than one short step. `cancel()` may be called from any thread; the crawl
+    notices at its next checkpoint and returns what it collected so far.
+
+    How to use:
+        deadline = Deadline(budget=300)
+        res = fb_spider.get_user_posts("KaiCenat", days_limit=30, deadline=deadline)
+        res["stop_reason"]  # "completed", "rejected", "deadline", "rate_limited" or "cancelled"
+    """
+
+    def __init__(self, budget: float = None, clock=None):
+        self.budget = budget
+        self.clock = clock or SYSTEM_CLOCK
+        self.expires_at = None if budget is None else self.clock.monotonic() + budget
+        self._cancelled = threading.Event()
+
+    def remaining(self):
+        """Seconds left, None for an unlimited deadline"""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - self.clock.monotonic(), 0.0)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def stop_reason(self):
+        """None while the crawl may go on"""
+        if self._cancelled.is_set():
+            return STOP_CANCELLED
+        if self.expires_at is not None and self.clock.monotonic() >= self.expires_at:
+            return STOP_DEADLINE
+        return None
+
+    def check(self):
+        reason = self.stop_reason
+        if reason is not None:
+            raise DeadlineExceeded(reason)
+
+    def timeout(self, default: float = None):
+        """`default` capped by the remaining budget, for one blocking call"""
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if default is None:
+            return remaining
+        return min(default, remaining)
+
+    def child(self, budget: float = None):
+        """Deadline for one step of the crawl: at most `budget` seconds, never past this
+        deadline, and cancelled together with it"""
+        child = Deadline(budget=budget, clock=self.clock)
+        if self.expires_at is not None and (child.expires_at is None or self.expires_at < child.expires_at):
+            child.expires_at = self.expires_at
+        child._cancelled = self._cancelled
+        return child
+
+    def sleep(self, seconds: float):
+        """Like time.sleep, but wakes up on cancel and never sleeps past the deadline"""
+        self.clock.wait(self._cancelled, self.timeout(seconds))
+        self.check()
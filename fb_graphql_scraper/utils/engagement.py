@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import base64
+import json
+from fb_graphql_scraper.utils.parser import standardize_reactions
+from fb_graphql_scraper.utils.post_filter import comment_count_of, reaction_count_of, share_count_of
+
+
+# Columns of a refreshed engagement row
+ENGAGEMENT_COLUMNS = ("post_id", "reaction_count", "comment_count", "share_count", "reactions", "fetched_at")
+
+
+def feedback_id_of(post_id: str) -> str:
+    """Relay id of a post's feedback, what the UFI queries take as `feedbackTargetID`"""
+    return base64.b64encode(f"feedback:{post_id}".encode("utf-8")).decode("ascii")
+
+
+def get_feedback_payload(doc_id_in: str, post_id: str) -> dict:
+    feedback_id = feedback_id_of(post_id)
+    variables_dict = {
+        "feedbackTargetID": feedback_id,
+        "id": feedback_id,
+        "scale": 3,
+        "__relay_internal__pv__CometUFIReactionsEnableShortNamerelayprovider": False,
+    }
+    return {
+        "variables": json.dumps(variables_dict),
+        "doc_id": doc_id_in,
+    }
+
+
+def _is_feedback(node: dict) -> bool:
+    return 'reaction_count' in node or 'share_count' in node or 'comment_rendering_instance' in node
+
+
+def find_feedback(data, post_id: str = None):
+    """First feedback object (a dict carrying the counters) of a response.
+    With `post_id` only the feedback of that post, None if the response does not have it:
+    the feedback of a comment or of a shared post must not be counted for it."""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if _is_feedback(node) and (post_id is None or node.get('subscription_target_id') == post_id):
+                return node
+            stack.extend(reversed([value for value in node.values() if isinstance(value, (dict, list))]))
+        elif isinstance(node, list):
+            stack.extend(reversed([item for item in node if isinstance(item, (dict, list))]))
+    return None
+
+
+def _reaction_edges(feedback: dict) -> list:
+    top_reactions = feedback.get('top_reactions')
+    if isinstance(top_reactions, dict) and isinstance(top_reactions.get('edges'), list):
+        return top_reactions['edges']
+    return []
+
+
+def engagement_row(post_id: str, feedback: dict, fetched_at: int) -> dict:
+    """Counters of one post, the same numbers (and "reactions" list) as get_user_posts"""
+    return {
+        "post_id": post_id,
+        "reaction_count": reaction_count_of(feedback),
+        "comment_count": comment_count_of(feedback),
+        "share_count": share_count_of(feedback),
+        "reactions": standardize_reactions(_reaction_edges(feedback)),
+        "fetched_at": fetched_at,
+    }
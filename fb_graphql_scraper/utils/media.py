@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class MediaFile(object):
+    """A downloaded attachment, stored as <sha256><ext> under the downloader's directory"""
+
+    def __init__(self, url: str, path: str, sha256: str, size: int, duplicate: bool = False):
+        self.url = url
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        # The same content had already been downloaded from another url
+        self.duplicate = duplicate
+
+    def to_dict(self) -> dict:
+        return {"url": self.url, "path": self.path, "sha256": self.sha256, "size": self.size}
+
+    def __repr__(self):
+        return f"MediaFile({self.path!r}, size={self.size})"
+
+
+class _Download(object):
+    def __init__(self, url: str, post_id: str = None):
+        self.url = url
+        self.post_id = post_id
+        self.host = urlsplit(url).netloc
+        self.future = Future()
+
+
+class MediaDownloader(object):
+    """Download post attachments concurrently while the posts are being parsed.
+
+    - One pooled requests.Session for every download, at most `per_host`
+      downloads per host at a time (`max_workers` in total).
+    - Bodies are streamed to disk in `chunk_size` pieces, never held in memory.
+    - Files are named after the sha256 of their content, the same picture
+      behind two urls is stored once. A manifest maps urls to files so
+      known urls are not downloaded again by the next run.
+    - An interrupted download is resumed with a Range request.
+
+    How to use:
+        media = MediaDownloader(directory="media/")
+        fb_spider = FacebookGraphqlScraper(driver_path=driver_path, media_downloader=media)
+        res = fb_spider.get_user_posts(fb_username_or_userid="love.yuweishao", days_limit=30)
+        media.wait()
+        media.files  # {url: MediaFile}
+    """
+
+    MANIFEST_NAME = "manifest.jsonl"
+
+    def __init__(self, directory: str, max_workers: int = 8, per_host: int = 2, chunk_size: int = 256 * 1024,
+                 timeout: float = 60, post_images: bool = False, headers: dict = None):
+        self.directory = directory
+        self.partial_directory = os.path.join(directory, ".partial")
+        os.makedirs(self.partial_directory, exist_ok=True)
+        self.per_host = per_host
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        # Also download the scontent images of each post, read from its embed plugin by the scraper
+        self.post_images = post_images
+        self.http = requests.Session()
+        if headers:
+            self.http.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fb-media")
+        self._lock = threading.Lock()
+        self._active = defaultdict(int)
+        self._waiting = defaultdict(deque)
+        self._downloads = {}
+        self._pending = set()
+        self._idle = threading.Condition(self._lock)
+        self.files = {}
+        self._load_manifest()
+
+    def _load_manifest(self):
+        path = os.path.join(self.directory, self.MANIFEST_NAME)
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if os.path.exists(entry["path"]):
+                    self.files[entry["url"]] = MediaFile(**entry)
+
+    def _append_manifest(self, media_file: MediaFile):
+        with self._lock:
+            with open(os.path.join(self.directory, self.MANIFEST_NAME), "a", encoding="utf-8") as f:
+                f.write(json.dumps(media_file.to_dict(), ensure_ascii=False) + "\n")
+
+    def submit(self, url: str, post_id: str = None) -> Future:
+        """Queue one url, the Future resolves to its MediaFile. A url is only downloaded once."""
+        with self._lock:
+            if url in self._downloads:
+                return self._downloads[url].future
+            download = _Download(url=url, post_id=post_id)
+            self._downloads[url] = download
+            known = self.files.get(url)
+        if known is not None:
+            download.future.set_result(known)
+            return download.future
+        self._schedule(download)
+        return download.future
+
+    def submit_post(self, post_id: str, attachments: list, resolve_images=None):
+        """Queue the attachments of a post as soon as it is parsed.
+        With `post_images`, `resolve_images(post_id)` returns the post's image urls
+        (the scraper passes one that goes through the crawl's own session)."""
+        for url in attachments:
+            self.submit(url, post_id=post_id)
+        if self.post_images and post_id and resolve_images is not None:
+            self._track(self._executor.submit(self._submit_post_images, post_id, resolve_images))
+
+    def _submit_post_images(self, post_id: str, resolve_images):
+        try:
+            image_urls = resolve_images(post_id)
+        except (requests.RequestException, TimeoutError) as e:
+            print(f"Resolve images of post {post_id} failed, message: {e}")
+            return
+        for url in image_urls:
+            self.submit(url, post_id=post_id)
+
+    def _track(self, future: Future):
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._untrack)
+
+    def _untrack(self, future: Future):
+        with self._lock:
+            self._pending.discard(future)
+            self._idle.notify_all()
+
+    def _schedule(self, download: _Download):
+        self._track(download.future)
+        with self._lock:
+            if self._active[download.host] >= self.per_host:
+                self._waiting[download.host].append(download)
+                return
+            self._active[download.host] += 1
+        self._executor.submit(self._run, download)
+
+    def _run(self, download: _Download):
+        try:
+            media_file = self._download(download.url)
+            with self._lock:
+                self.files[download.url] = media_file
+            self._append_manifest(media_file)
+            download.future.set_result(media_file)
+        except Exception as e:
+            print(f"Download {download.url} failed, message: {e}")
+            download.future.set_exception(e)
+        finally:
+            with self._lock:
+                waiting = self._waiting[download.host]
+                next_download = waiting.popleft() if waiting else None
+                if next_download is None:
+                    self._active[download.host] -= 1
+            if next_download is not None:
+                self._executor.submit(self._run, next_download)
+
+    def _partial_path(self, url: str) -> str:
+        return os.path.join(self.partial_directory, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+    @staticmethod
+    def _extension(url: str, content_type: str) -> str:
+        extension = os.path.splitext(urlsplit(url).path)[1]
+        if 1 < len(extension) <= 5:
+            return extension.lower()
+        return mimetypes.guess_extension((content_type or "").split(";")[0].strip()) or ""
+
+    def _download(self, url: str) -> MediaFile:
+        partial_path = self._partial_path(url)
+        digest = hashlib.sha256()
+        offset = 0
+        if os.path.exists(partial_path):
+            # Hash what is already on disk, then ask for the rest only
+            with open(partial_path, "rb") as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                    digest.update(chunk)
+                    offset += len(chunk)
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with self.http.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if offset and response.status_code != 206:
+                # The server ignored the Range header, start over
+                digest, offset = hashlib.sha256(), 0
+            if response.status_code not in (200, 206):
+                if response.status_code == 416:
+                    # Range not satisfiable: the partial file is unusable
+                    os.remove(partial_path)
+                response.raise_for_status()
+                raise requests.HTTPError(f"Unexpected status {response.status_code}", response=response)
+            with open(partial_path, "ab" if offset else "wb") as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    offset += len(chunk)
+            content_type = response.headers.get("Content-Type")
+
+        sha256 = digest.hexdigest()
+        path = os.path.join(self.directory, sha256 + self._extension(url, content_type))
+        duplicate = os.path.exists(path)
+        if duplicate:
+            os.remove(partial_path)
+        else:
+            os.replace(partial_path, path)
+        return MediaFile(url=url, path=path, sha256=sha256, size=offset, duplicate=duplicate)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until every queued download has finished, False on timeout"""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._pending, timeout=timeout)
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown(wait=True)
+        self.http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
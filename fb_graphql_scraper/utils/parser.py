@@ -1,32 +1,69 @@
 # -*- coding: utf-8 -*-
-from seleniumwire.utils import decode
 import json
+from functools import lru_cache
 from urllib.parse import parse_qs, unquote
-from fb_graphql_scraper.utils.utils import *
+from fb_graphql_scraper.utils.path_extractor import get_path_extractor, shape_key
+from fb_graphql_scraper.utils.utils import iter_json_lines
 from typing import Dict, List
-from jsonpath_ng.ext import parse
+
+
+# Reactions of a post, in the order of its "reactions" field
+REACTION_NAMES = ["讚", "哈", "哇", "怒", "加油", "大心", "嗚"]
+
+
+def standardize_reactions(reaction_edges: list) -> list:
+    """[{name: count}] for every one of REACTION_NAMES, from the top_reactions edges of a feedback.
+    Reactions nobody used count 0."""
+    reactions_dict = {}
+    for reaction in reaction_edges:
+        reaction_name = (reaction.get('node') or {}).get('localized_name')
+        if reaction_name:
+            reactions_dict[reaction_name] = reaction.get('reaction_count', 0)
+    return [{name: reactions_dict.get(name, 0)} for name in REACTION_NAMES]
+
+
+@lru_cache(maxsize=None)
+def _compile_json_path(path: str):
+    # jsonpath_ng is slow to import and to compile, do both once and only when needed
+    from jsonpath_ng.ext import parse
+    return parse(path)
+
 
 def extract_json_path(data: Dict, path: str) -> List:
     """使用 JSONPath 從 JSON 資料中提取特定路徑的值"""
-    json_path = parse(path)
+    json_path = _compile_json_path(path)
     matches = json_path.find(data)
     return [match.value for match in matches]
 
 
 class RequestsParser(object):
-    def __init__(self, driver) -> None:
+    def __init__(self, driver, archive=None, media=None) -> None:
         self.driver = driver
+        self.archive = archive
+        # Optional MediaDownloader, receives the attachments of each post as soon as it is parsed
+        self.media = media
+        # resolve_post_images(post_id) -> image urls, through the session of the crawl (set by the scraper)
+        self.resolve_post_images = None
+        # Story fields are read through the key paths learnt from earlier responses
+        self.extractor = get_path_extractor()
+        # Optional PostFilter of the current crawl
+        self.post_filter = None
         self.reaction_names = ["讚", "哈", "怒", "大心", "加油", "哇", "嗚"]
         self.en_reaction_names = ["like", "haha", "angry", "love", "care", "sorry", "wow"]
 
-    def get_graphql_body_content(self, req_response, req_url):
+    def get_graphql_body_content(self, req_response, req_url, archive: bool = False, profile: str = None):
+        """Decode a GraphQL response captured by selenium-wire into an iterator of json lines.
+        With `archive=True` the raw body is also appended to the response archive."""
         target_url = "https://www.facebook.com/api/graphql/"
         if req_response and req_url == target_url:
+            from seleniumwire.utils import decode
             response = req_response
             body = decode(response.body, response.headers.get(
                 'Content-Encoding', 'identity'))
-            body_content = body.decode("utf-8").split("\n")
-            return body_content
+            if archive and self.archive is not None:
+                self.archive.append(body=body, profile=profile, source="selenium")
+            # Lines are decoded lazily, one at a time, while the caller iterates
+            return iter_json_lines(body)
         return None
     
     def _clean_res(self):
@@ -36,54 +73,72 @@ class RequestsParser(object):
         self.owning_profile = []
         self.res_new = []
         self.attachments_list = []  # 新增附件列表的清理
+        self.seen_post_ids = set()
+        # Creation time of the last story seen, kept or not, drives the pagination
+        self.last_creation_time = None
+
+    def is_full(self) -> bool:
+        """The post filter's max_posts is reached, nothing more needs to be parsed"""
+        return self.post_filter is not None and self.post_filter.is_full(len(self.feedback_list))
 
     def parse_body(self, body_content):
         for each_body in body_content:
+            if self.is_full():
+                break
+            self.parse_line(each_body)
+
+    def parse_line(self, each_body: str):
+        """Parse one json line of a response, called for each line as it is streamed in"""
+        if not each_body or self.is_full():
+            return
+        # Lines are parsed before the response is classified: error pages such as
+        # 'for (;;);{"error":1675004,...}' are left to the rate limiter
+        try:
             json_data = json.loads(each_body)
-            self.res_new.append(json_data)
-            try:
-                each_res = json_data['data']['node'].copy()
-                each_feedback = find_feedback_with_subscription_target_id(each_res)
-                if each_feedback:
-                    self.feedback_list.append(each_feedback)
-                    message_text = find_message_text(json_data)
-                    creation_time = find_creation(json_data)
-                    owing_profile = find_owning_profile(json_data)
-                    
-                    # 提取附件資訊並儲存到新的列表中
-                    attachments = self.extract_attachments_from_json(json_data)
-                    if not hasattr(self, 'attachments_list'):
-                        self.attachments_list = []
-                    self.attachments_list.append(attachments)
-                    
-                    if message_text:
-                        self.context_list.append(message_text)
-                    elif not message_text:
-                        self.context_list.append(None)
-                    if creation_time:
-                        self.creation_list.append(creation_time)
-                    self.owning_profile.append(owing_profile)
-
-            # Did not display or record error message at here
-            except Exception as e:
-                pass
+        except ValueError:
+            return
+        self.res_new.append(json_data)
+        try:
+            shape = shape_key(json_data)
+            each_res = json_data['data']['node']
+            each_feedback = self.extractor.find(each_res, "feedback", shape)
+            if each_feedback:
+                creation_time = self.extractor.find(json_data, "creation_time", shape)
+                if creation_time:
+                    self.last_creation_time = creation_time
+                post_id = each_feedback.get('subscription_target_id')
+                if post_id in self.seen_post_ids:
+                    return
+                self.seen_post_ids.add(post_id)
+
+                # Cheap predicates first, attachments are only extracted for posts that pass them
+                message_text = self.extractor.find(json_data, "message_text", shape)
+                if self.post_filter is not None and not self.post_filter.match_cheap(each_feedback, message_text):
+                    return
+                # 提取附件資訊並儲存到新的列表中
+                attachments = self.extract_attachments_from_json(json_data)
+                if self.post_filter is not None and not self.post_filter.match_attachments(attachments):
+                    return
+                owing_profile = self.extractor.find(json_data, "owning_profile", shape)
+
+                self.feedback_list.append(each_feedback)
+                self.attachments_list.append(attachments)
+                if self.media is not None:
+                    self.media.submit_post(post_id=post_id, attachments=attachments,
+                                           resolve_images=self.resolve_post_images)
+                self.context_list.append(message_text or None)
+                self.creation_list.append(creation_time)
+                self.owning_profile.append(owing_profile)
+
+        # Did not display or record error message at here
+        except Exception as e:
+            pass
 
     def collect_posts(self):
         res_out = []
         for i, each in enumerate(self.feedback_list):
-            # 建立反應字典 - 使用中文名稱
-            reactions_dict = {}
-            for reaction in each['top_reactions']['edges']:
-                reaction_name = reaction['node']['localized_name']
-                reaction_count = reaction['reaction_count']
-                reactions_dict[reaction_name] = reaction_count
-        
-            # 確保所有反應類型都存在（如果沒有就設為0）
-            reaction_names = ["讚", "哈", "哇", "怒", "加油", "大心", "嗚"]
-            standardized_reactions = []
-            for name in reaction_names:
-                count = reactions_dict.get(name, 0)
-                standardized_reactions.append({name: count})
+            # 反應使用中文名稱, 確保所有反應類型都存在（如果沒有就設為0）
+            standardized_reactions = standardize_reactions(each['top_reactions']['edges'])
         
             # 獲取對應的文字內容和創建時間
             text_content = self.context_list[i] if i < len(self.context_list) and self.context_list[i] else ""
@@ -99,9 +154,8 @@ class RequestsParser(object):
             # 建構貼文URL
             post_url = f"https://www.facebook.com/{each['subscription_target_id']}"
         
-            # 使用 JSONPath 提取附件
-            json_data = self.res_new[i] if i < len(self.res_new) else {}
-            attachments = self.extract_attachments_from_json(json_data)
+            # 附件已在 parse_body 中提取
+            attachments = self.attachments_list[i] if i < len(self.attachments_list) else []
         
             res_out.append({
                 "post_id": each['subscription_target_id'],
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import threading
+
+
+def _match_feedback(node: dict):
+    feedback = node.get('feedback')
+    if isinstance(feedback, dict) and 'subscription_target_id' in feedback:
+        return ('feedback',)
+    return None
+
+
+def _match_message_text(node: dict):
+    story = node.get('story')
+    if isinstance(story, dict) and isinstance(story.get('message'), dict) and 'text' in story['message']:
+        return ('story', 'message', 'text')
+    return None
+
+
+def _match_creation_time(node: dict):
+    story = node.get('story')
+    if isinstance(story, dict) and 'creation_time' in story:
+        return ('story', 'creation_time')
+    return None
+
+
+def _match_owning_profile(node: dict):
+    if isinstance(node.get('owning_profile'), dict):
+        return ('owning_profile',)
+    return None
+
+
+# Same conditions as find_feedback_with_subscription_target_id / find_message_text /
+# find_creation / find_owning_profile in utils.py
+FIELD_MATCHERS = {
+    "feedback": _match_feedback,
+    "message_text": _match_message_text,
+    "creation_time": _match_creation_time,
+    "owning_profile": _match_owning_profile,
+}
+
+
+def follow_path(data, path: tuple):
+    """Value at `path` (dict keys and list indices), None if the data has another shape"""
+    for key in path:
+        try:
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return data
+
+
+def search_path(data, matcher, path: tuple = ()):
+    """Depth-first search in the order of the find_* functions of utils.py.
+
+    Returns:
+        tuple: (path, value) of the first truthy match, (None, None) if there is none.
+    """
+    if isinstance(data, dict):
+        relative_path = matcher(data)
+        if relative_path:
+            # Like the find_* functions, the search does not go below a matching node,
+            # an empty value there is skipped in favour of the next siblings
+            value = follow_path(data, relative_path)
+            if value:
+                return path + relative_path, value
+            return None, None
+        for key, value in data.items():
+            if isinstance(value, (dict, list)):
+                found_path, found = search_path(value, matcher, path + (key,))
+                if found_path is not None:
+                    return found_path, found
+    elif isinstance(data, list):
+        for index, item in enumerate(data):
+            if isinstance(item, (dict, list)):
+                found_path, found = search_path(item, matcher, path + (index,))
+                if found_path is not None:
+                    return found_path, found
+    return None, None
+
+
+def shadowing_match(data, path: tuple, matcher):
+    """A node above the end of `path` matches on its own.
+    The search stops at such a node before it descends, so `path` is not what it would find."""
+    node = data
+    for depth in range(len(path)):
+        if isinstance(node, dict):
+            relative_path = matcher(node)
+            if relative_path:
+                # Reaching the node `path` was learnt on means nothing above it matched
+                return path[:depth] + relative_path != path
+        try:
+            node = node[path[depth]]
+        except (KeyError, IndexError, TypeError):
+            return False
+    return False
+
+
+def shape_key(json_data: dict):
+    """Responses of one query with the same stream label and node type share their shape"""
+    try:
+        typename = json_data['data']['node'].get('__typename')
+    except (KeyError, TypeError, AttributeError):
+        typename = None
+    return json_data.get('label'), typename
+
+
+class PathMemoExtractor(object):
+    """Find story fields by the key path learnt from earlier responses.
+
+    The first response of a shape is searched recursively and the concrete
+    path of every field is recorded; the next ones are read with direct
+    lookups. When a recorded path misses (Facebook changed the schema), or a
+    node above it matches too (e.g. the path was learnt from the
+    attached_story of a reshare and this post has its own text), the
+    recursive search runs again and the path is learnt anew.
+    """
+
+    def __init__(self):
+        self._paths = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def find(self, data, field: str, shape=None):
+        key = (shape, field)
+        matcher = FIELD_MATCHERS[field]
+        path = self._paths.get(key)
+        if path is not None:
+            value = follow_path(data, path)
+            if value and not shadowing_match(data, path, matcher):
+                self.hits += 1
+                return value
+        path, value = search_path(data, matcher)
+        with self._lock:
+            self.misses += 1
+            if path is not None:
+                self._paths[key] = path
+        return value
+
+    def stats(self) -> dict:
+        return {"paths": len(self._paths), "hits": self.hits, "misses": self.misses}
+
+    def forget(self):
+        with self._lock:
+            self._paths.clear()
+
+
+_shared_extractor = None
+_shared_lock = threading.Lock()
+
+
+def get_path_extractor() -> PathMemoExtractor:
+    """Process-wide extractor, the paths learnt by one crawl serve all the others"""
+    global _shared_extractor
+    with _shared_lock:
+        if _shared_extractor is None:
+            _shared_extractor = PathMemoExtractor()
+        return _shared_extractor
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import re
+
+
+def _feedback_count(feedback: dict, *path) -> int:
+    value = feedback
+    for key in path:
+        if not isinstance(value, dict):
+            return 0
+        value = value.get(key)
+    return value if isinstance(value, int) else 0
+
+
+def reaction_count_of(feedback: dict) -> int:
+    return _feedback_count(feedback, 'reaction_count', 'count')
+
+
+def comment_count_of(feedback: dict) -> int:
+    return (_feedback_count(feedback, 'comment_rendering_instance', 'comments', 'total_count')
+            or _feedback_count(feedback, 'comment_count', 'total_count'))
+
+
+def share_count_of(feedback: dict) -> int:
+    return _feedback_count(feedback, 'share_count', 'count')
+
+
+class PostFilter(object):
+    """Crawl-time predicates, applied while responses are parsed.
+
+    Counters and text are checked first, attachments are only extracted for
+    posts that passed them. With `max_posts` the crawl stops as soon as
+    enough posts were kept.
+
+    How to use:
+        post_filter = PostFilter(max_posts=20, min_reactions=100, keywords=["concert"])
+        res = fb_spider.get_user_posts(fb_username_or_userid="KaiCenat", days_limit=90, post_filter=post_filter)
+    """
+
+    def __init__(self, max_posts: int = None, min_reactions: int = None, min_comments: int = None,
+                 keywords: list = None, regex: str = None, has_attachments: bool = None):
+        self.max_posts = max_posts
+        self.min_reactions = min_reactions
+        self.min_comments = min_comments
+        if isinstance(keywords, str):
+            keywords = [keywords]
+        # Any of the keywords, case-insensitive
+        self.keywords = [each.lower() for each in keywords or []]
+        self.regex = re.compile(regex) if isinstance(regex, str) else regex
+        self.has_attachments = has_attachments
+
+    def match_cheap(self, feedback: dict, text: str) -> bool:
+        """Predicates on the counters and the text, no attachment extraction needed"""
+        if self.min_reactions is not None and reaction_count_of(feedback) < self.min_reactions:
+            return False
+        if self.min_comments is not None and comment_count_of(feedback) < self.min_comments:
+            return False
+        if self.keywords:
+            lowered = (text or "").lower()
+            if not any(keyword in lowered for keyword in self.keywords):
+                return False
+        if self.regex is not None and not self.regex.search(text or ""):
+            return False
+        return True
+
+    def match_attachments(self, attachments: list) -> bool:
+        if self.has_attachments is None:
+            return True
+        return bool(attachments) == self.has_attachments
+
+    def is_full(self, kept: int) -> bool:
+        return self.max_posts is not None and kept >= self.max_posts
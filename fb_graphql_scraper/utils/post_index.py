@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from fb_graphql_scraper.utils.utils import parse_creation_time
+
+POST_COLUMNS = (
+    "post_id", "profile", "creation_time", "post_url", "text", "attachments",
+    "total_reaction_count", "reactions", "comment_count", "share_count",
+)
+# Shortest term the trigram tokenizer can look up, shorter ones are matched with LIKE
+TRIGRAM_MIN_LENGTH = 3
+
+
+def _to_timestamp(value):
+    """Epoch seconds from a number, a datetime or 'YYYY-MM-DD[ HH:MM:SS]'"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if len(value) == 10:
+        return datetime.strptime(value, '%Y-%m-%d').timestamp()
+    return parse_creation_time(value)
+
+
+def _quote_term(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+class PostIndex(object):
+    """Local index of collected posts, one SQLite file.
+
+    - Full-text search on `text` through an FTS5 table. The trigram tokenizer
+      is used when SQLite has it, so Chinese text without spaces is searchable.
+    - B-tree indexes on (profile, creation_time) and creation_time for range queries.
+    - Posts are upserted by post_id: a re-crawl refreshes the counters.
+
+    How to use:
+        index = PostIndex(path="posts.sqlite3")
+        fb_spider = FacebookGraphqlScraper(driver_path=driver_path, post_index=index)
+        fb_spider.get_user_posts(fb_username_or_userid="love.yuweishao", days_limit=30)
+        index.search("演唱會", profile="love.yuweishao", since="2025-01-01", limit=20)
+    """
+
+    def __init__(self, path: str, tokenizer: str = None):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS posts (
+                    post_id TEXT PRIMARY KEY,
+                    profile TEXT,
+                    creation_time INTEGER,
+                    post_url TEXT,
+                    text TEXT,
+                    attachments TEXT,
+                    total_reaction_count INTEGER,
+                    reactions TEXT,
+                    comment_count INTEGER,
+                    share_count INTEGER,
+                    indexed_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS posts_profile_time ON posts (profile, creation_time)")
+            conn.execute("CREATE INDEX IF NOT EXISTS posts_time ON posts (creation_time)")
+        self.tokenizer = self._create_fts(conn, tokenizer)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite connections cannot be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _create_fts(conn: sqlite3.Connection, tokenizer: str = None) -> str:
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'posts_fts'").fetchone()
+        if row is not None:
+            return "trigram" if "trigram" in row[0] else "unicode61"
+        for candidate in [tokenizer] if tokenizer else ["trigram", "unicode61"]:
+            try:
+                with conn:
+                    conn.execute(
+                        "CREATE VIRTUAL TABLE posts_fts USING fts5("
+                        f"text, content='posts', content_rowid='rowid', tokenize='{candidate}')")
+                    # Keep the external content table and the full-text index in sync
+                    conn.execute("""
+                        CREATE TRIGGER posts_ai AFTER INSERT ON posts BEGIN
+                            INSERT INTO posts_fts (rowid, text) VALUES (new.rowid, new.text);
+                        END
+                    """)
+                    conn.execute("""
+                        CREATE TRIGGER posts_ad AFTER DELETE ON posts BEGIN
+                            INSERT INTO posts_fts (posts_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                        END
+                    """)
+                    conn.execute("""
+                        CREATE TRIGGER posts_au AFTER UPDATE OF text ON posts BEGIN
+                            INSERT INTO posts_fts (posts_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                            INSERT INTO posts_fts (rowid, text) VALUES (new.rowid, new.text);
+                        END
+                    """)
+                return candidate
+            except sqlite3.OperationalError:
+                # Older SQLite without the trigram tokenizer
+                continue
+        raise RuntimeError("SQLite was built without FTS5")
+
+    def add_posts(self, posts: list, profile: str = None) -> int:
+        """Upsert formatted posts (the "data" of a result), returns how many were written"""
+        now = time.time()
+        rows = []
+        for post in posts:
+            creation_time = parse_creation_time(post.get("creation_time"))
+            rows.append((
+                post["post_id"],
+                profile,
+                int(creation_time) if creation_time is not None else None,
+                post.get("post_url"),
+                post.get("text") or "",
+                json.dumps(post.get("attachments") or [], ensure_ascii=False),
+                post.get("total_reaction_count"),
+                json.dumps(post.get("reactions") or [], ensure_ascii=False),
+                post.get("comment_count"),
+                post.get("share_count"),
+                now,
+            ))
+        if not rows:
+            return 0
+        conn = self._connect()
+        with conn:
+            conn.executemany("""
+                INSERT INTO posts (post_id, profile, creation_time, post_url, text, attachments,
+                                   total_reaction_count, reactions, comment_count, share_count, indexed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (post_id) DO UPDATE SET
+                    profile = COALESCE(excluded.profile, posts.profile),
+                    creation_time = COALESCE(excluded.creation_time, posts.creation_time),
+                    post_url = excluded.post_url,
+                    text = excluded.text,
+                    attachments = excluded.attachments,
+                    total_reaction_count = excluded.total_reaction_count,
+                    reactions = excluded.reactions,
+                    comment_count = excluded.comment_count,
+                    share_count = excluded.share_count,
+                    indexed_at = excluded.indexed_at
+            """, rows)
+        return len(rows)
+
+    def _match_clause(self, query: str, raw: bool) -> tuple:
+        """FTS5 MATCH expression plus LIKE conditions for terms the tokenizer cannot look up"""
+        if raw:
+            return query, []
+        terms = query.split()
+        if self.tokenizer != "trigram":
+            return " ".join(_quote_term(term) for term in terms), []
+        long_terms = [term for term in terms if len(term) >= TRIGRAM_MIN_LENGTH]
+        short_terms = [term for term in terms if len(term) < TRIGRAM_MIN_LENGTH]
+        return " ".join(_quote_term(term) for term in long_terms), short_terms
+
+    def search(self, query: str = None, profile: str = None, since=None, until=None,
+               limit: int = 50, offset: int = 0, raw: bool = False) -> list:
+        """Posts matching every term of `query` (all posts without one), newest first.
+
+        Args:
+            query (str): Space separated terms, all of them must appear in the text.
+                With `raw=True` it is passed to FTS5 as is (OR, NEAR, prefix*...).
+            profile (str): Only posts collected for this profile.
+            since / until: Creation time range, epoch seconds, datetime or 'YYYY-MM-DD[ HH:MM:SS]'.
+        """
+        conditions, params = [], []
+        source = "posts"
+        if query and query.strip():
+            match, like_terms = self._match_clause(query.strip(), raw)
+            if match:
+                source = "posts_fts JOIN posts ON posts.rowid = posts_fts.rowid"
+                conditions.append("posts_fts MATCH ?")
+                params.append(match)
+            for term in like_terms:
+                conditions.append("posts.text LIKE ? ESCAPE '\\'")
+                params.append("%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if profile is not None:
+            conditions.append("posts.profile = ?")
+            params.append(profile)
+        if since is not None:
+            conditions.append("posts.creation_time >= ?")
+            params.append(_to_timestamp(since))
+        if until is not None:
+            conditions.append("posts.creation_time <= ?")
+            params.append(_to_timestamp(until))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        columns = ", ".join(f"posts.{column}" for column in POST_COLUMNS)
+        rows = self._connect().execute(
+            f"SELECT {columns} FROM {source} {where} ORDER BY posts.creation_time DESC LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        ).fetchall()
+        return [self._to_post(row) for row in rows]
+
+    @staticmethod
+    def _to_post(row) -> dict:
+        post = dict(zip(POST_COLUMNS, row))
+        if post["creation_time"] is not None:
+            post["creation_time"] = datetime.fromtimestamp(post["creation_time"]).strftime('%Y-%m-%d %H:%M:%S')
+        post["attachments"] = json.loads(post["attachments"] or "[]")
+        post["reactions"] = json.loads(post["reactions"] or "[]")
+        return post
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
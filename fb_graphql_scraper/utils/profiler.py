@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Order of the stages in the report, others are listed after them
+STAGES = ("bootstrap", "fetch", "decode", "parse_body", "collect_posts", "format_data")
+# Time spent outside of every stage, on the thread that started the profiler
+OTHER_STAGE = "(other)"
+MIB = 1024 * 1024
+
+# tracemalloc is process-wide: concurrent profiled crawls share it, the last one to finish stops it
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+
+def _start_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    """Stop tracemalloc once no profiler needs it, unless someone else had started it"""
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+class StageStats(object):
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.allocated = 0
+
+    def to_dict(self) -> dict:
+        return {"calls": self.calls, "wall": self.wall, "cpu": self.cpu, "allocated": self.allocated}
+
+
+class _Frame(object):
+    __slots__ = ("name", "wall", "cpu", "memory", "child_wall", "child_cpu", "child_memory")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        self.memory = tracemalloc.get_traced_memory()[0]
+        self.child_wall = self.child_cpu = 0.0
+        self.child_memory = 0
+
+
+class CrawlProfiler(object):
+    """cProfile + tracemalloc over one crawl, with time and memory attributed to its stages.
+
+    A stage is only charged what happens outside of the stages nested in it:
+    `fetch` does not include the `parse_body` of lines parsed while the body
+    is still streaming, `decode` (reading, decompressing and splitting the
+    body) shows the transfer in its wall time and the decoding in its CPU time.
+    Stages run by worker threads (pipelined parsing) are timed as well, but
+    cProfile only follows the thread that started the profiler, and the
+    allocations of concurrent stages are mixed since tracemalloc is global.
+
+    How to use:
+        res = fb_spider.get_user_posts("KaiCenat", days_limit=30, profile=True)
+        res["profiling"]["report"]  # profiles/KaiCenat-20250101-120000.txt
+        # or for every crawl: FB_SCRAPER_PROFILE=profiles/ python crawl.py
+    """
+
+    def __init__(self, label: str, out_dir: str = "profiles", top: int = 25):
+        self.label = label
+        self.out_dir = out_dir
+        self.top = top
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profile = None
+        self._started_at = None
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_memory = 0
+        self.snapshot = None
+
+    def start(self):
+        _start_tracing()
+        self._profile = cProfile.Profile()
+        try:
+            self._profile.enable()
+        except ValueError:
+            # Another profiler is active (a concurrent profiled crawl), keep the stage timers only
+            print("cProfile is already active, profile the stages only.")
+            self._profile = None
+        self._started_at = (time.perf_counter(), time.process_time())
+        self._stack().append(_Frame(OTHER_STAGE))
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+        self._exit(self._stack().pop())
+        self.wall = time.perf_counter() - self._started_at[0]
+        self.cpu = time.process_time() - self._started_at[1]
+        try:
+            if tracemalloc.is_tracing():
+                self.peak_memory = tracemalloc.get_traced_memory()[1]
+                self.snapshot = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__),
+                ))
+        finally:
+            _stop_tracing()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _exit(self, frame: _Frame):
+        wall = time.perf_counter() - frame.wall
+        cpu = time.thread_time() - frame.cpu
+        memory = tracemalloc.get_traced_memory()[0] - frame.memory
+        with self._lock:
+            stats = self.stats.get(frame.name)
+            if stats is None:
+                stats = self.stats[frame.name] = StageStats()
+            stats.calls += 1
+            stats.wall += wall - frame.child_wall
+            stats.cpu += cpu - frame.child_cpu
+            stats.allocated += memory - frame.child_memory
+        stack = self._stack()
+        if stack:
+            parent = stack[-1]
+            parent.child_wall += wall
+            parent.child_cpu += cpu
+            parent.child_memory += memory
+
+    @contextmanager
+    def stage(self, name: str):
+        frame = _Frame(name)
+        stack = self._stack()
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            self._exit(frame)
+
+    def wrap(self, name: str, func):
+        """`func` with every call counted as the stage `name`"""
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def iterate(self, name: str, iterable):
+        """Iterate over `iterable`, the time spent producing each item counts as the stage `name`"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def report(self) -> str:
+        lines = [
+            f"Profile of {self.label}: {self.wall:.2f} s wall, {self.cpu:.2f} s CPU, "
+            f"peak traced memory {self.peak_memory / MIB:.1f} MiB",
+            "",
+            f"{'stage':<16}{'calls':>8}{'wall s':>10}{'cpu s':>10}{'alloc MiB':>12}",
+        ]
+        names = [name for name in STAGES if name in self.stats]
+        names += sorted(name for name in self.stats if name not in STAGES and name != OTHER_STAGE)
+        names += [OTHER_STAGE] if OTHER_STAGE in self.stats else []
+        for name in names:
+            stats = self.stats[name]
+            lines.append(f"{name:<16}{stats.calls:>8}{stats.wall:>10.3f}{stats.cpu:>10.3f}"
+                         f"{stats.allocated / MIB:>12.2f}")
+        if self._profile is not None:
+            stream = io.StringIO()
+            pstats.Stats(self._profile, stream=stream).sort_stats("cumulative").print_stats(self.top)
+            lines += ["", "Top functions by cumulative time:", stream.getvalue().strip()]
+        if self.snapshot is not None:
+            lines += ["", "Top allocation sites still alive at the end:"]
+            for each in self.snapshot.statistics("lineno")[:self.top]:
+                lines.append(f"  {each}")
+        return "\n".join(lines) + "\n"
+
+    def save(self) -> dict:
+        """Write the text report and the pstats file, returns their paths and the stage stats"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = "".join(c if c.isalnum() or c in "-_." else "_" for c in self.label)
+        base = os.path.join(self.out_dir, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+        number = 1
+        report_path = f"{base}.txt"
+        # Several crawls of the same profile may finish within a second
+        while os.path.exists(report_path):
+            number += 1
+            report_path = f"{base}-{number}.txt"
+        base = report_path[:-len(".txt")]
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(self.report())
+        pstats_path = None
+        if self._profile is not None:
+            pstats_path = f"{base}.pstats"
+            self._profile.dump_stats(pstats_path)
+        return {
+            "report": report_path,
+            "pstats": pstats_path,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "peak_memory": self.peak_memory,
+            "stages": {name: stats.to_dict() for name, stats in self.stats.items()},
+        }
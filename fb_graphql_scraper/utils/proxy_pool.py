@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from fb_graphql_scraper.utils.rate_limiter import DEFAULT_IDENTITY, OUTCOME_OK, OUTCOME_THROTTLED
+
+
+class EgressConfig(object):
+    """One way out to Facebook: an optional proxy plus the headers/cookies sent with it"""
+
+    def __init__(self, proxy_url: str = None, headers: dict = None, cookies: dict = None, name: str = None):
+        self.proxy_url = proxy_url
+        self.headers = headers or {}
+        self.cookies = cookies or {}
+        self.name = name
+
+    @property
+    def identity(self) -> str:
+        """Key used by the rate limiter, every egress gets its own budget"""
+        return self.name or self.proxy_url or DEFAULT_IDENTITY
+
+    def request_kwargs(self) -> dict:
+        """Keyword arguments for requests.get / requests.post"""
+        kwargs = {}
+        if self.proxy_url:
+            kwargs["proxies"] = {"http": self.proxy_url, "https": self.proxy_url}
+        if self.headers:
+            kwargs["headers"] = dict(self.headers)
+        if self.cookies:
+            kwargs["cookies"] = dict(self.cookies)
+        return kwargs
+
+    def seleniumwire_proxy(self) -> dict:
+        """Value for selenium-wire's `proxy` option / `driver.proxy` setter"""
+        if not self.proxy_url:
+            return {}
+        return {
+            "http": self.proxy_url,
+            "https": self.proxy_url,
+            "no_proxy": "localhost,127.0.0.1",
+        }
+
+    def __repr__(self):
+        return f"EgressConfig(identity={self.identity!r})"
+
+
+class _EgressState(object):
+    def __init__(self):
+        self.score = 1.0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.active = 0
+
+
+class ProxyPool(object):
+    """Assign crawls to egress configurations with health scoring.
+
+    - Every egress keeps an exponentially weighted success score.
+    - Throttling, or `failure_threshold` failures in a row, puts an egress
+      into an exponentially growing cooldown.
+    - A profile sticks to the egress it was first assigned to for as long
+      as that egress stays healthy, so its session looks consistent.
+    """
+
+    def __init__(self, egresses: list, cooldown: float = 60.0, failure_threshold: int = 3,
+                 sticky: bool = True, smoothing: float = 0.2):
+        if not egresses:
+            raise ValueError("ProxyPool needs at least one EgressConfig")
+        self.egresses = [
+            each if isinstance(each, EgressConfig) else EgressConfig(proxy_url=each)
+            for each in egresses
+        ]
+        self.cooldown = cooldown
+        self.failure_threshold = failure_threshold
+        self.sticky = sticky
+        self.smoothing = smoothing
+        self._states = {id(each): _EgressState() for each in self.egresses}
+        self._assignments = {}
+        self._lock = threading.Lock()
+
+    def _is_available(self, egress, now):
+        return self._states[id(egress)].cooldown_until <= now
+
+    def acquire(self, profile: str = None) -> EgressConfig:
+        """Pick an egress for `profile`, preferring its sticky assignment"""
+        with self._lock:
+            now = time.monotonic()
+            egress = self._assignments.get(profile) if self.sticky and profile else None
+            if egress is None or not self._is_available(egress, now):
+                available = [each for each in self.egresses if self._is_available(each, now)]
+                if available:
+                    egress = max(
+                        available,
+                        key=lambda each: (self._states[id(each)].score, -self._states[id(each)].active),
+                    )
+                else:
+                    # Everything is cooling down, use the one that recovers first
+                    egress = min(self.egresses, key=lambda each: self._states[id(each)].cooldown_until)
+                if self.sticky and profile:
+                    self._assignments[profile] = egress
+            self._states[id(egress)].active += 1
+            return egress
+
+    def release(self, egress: EgressConfig):
+        with self._lock:
+            state = self._states[id(egress)]
+            state.active = max(state.active - 1, 0)
+
+    def report(self, egress: EgressConfig, outcome: str):
+        """Feed the outcome of one request back into the egress health"""
+        with self._lock:
+            state = self._states[id(egress)]
+            success = outcome == OUTCOME_OK
+            state.score = (1 - self.smoothing) * state.score + self.smoothing * (1.0 if success else 0.0)
+            if success:
+                state.consecutive_failures = 0
+                return
+            state.consecutive_failures += 1
+            if outcome == OUTCOME_THROTTLED or state.consecutive_failures >= self.failure_threshold:
+                strikes = max(state.consecutive_failures - self.failure_threshold, 0)
+                state.cooldown_until = time.monotonic() + self.cooldown * (2 ** min(strikes, 5))
+                print(f"Egress {egress.identity} is cooling down after {state.consecutive_failures} failures.")
+
+    def health(self) -> list:
+        """Snapshot of every egress: identity, score and remaining cooldown"""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "identity": each.identity,
+                    "score": round(self._states[id(each)].score, 3),
+                    "cooldown": max(self._states[id(each)].cooldown_until - now, 0.0),
+                    "active": self._states[id(each)].active,
+                }
+                for each in self.egresses
+            ]
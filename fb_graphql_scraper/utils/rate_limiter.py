@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Response classification results
+OUTCOME_OK = "ok"
+OUTCOME_THROTTLED = "throttled"
+OUTCOME_ERROR = "error"
+
+# Error codes Facebook uses for "too many requests" / "temporarily blocked"
+RATE_LIMIT_ERROR_CODES = {4, 17, 32, 368, 613, 1675004, 1675007}
+THROTTLE_STATUS_CODES = {429, 503}
+DEFAULT_IDENTITY = "direct"
+
+
+def _iter_error_payloads(body_content):
+    """Yield every json line of a GraphQL body that carries an error"""
+    for each_body in body_content:
+        if not each_body:
+            continue
+        # Some error pages are prefixed with an anti-hijacking guard
+        if each_body.startswith("for (;;);"):
+            each_body = each_body[len("for (;;);"):]
+        try:
+            json_data = json.loads(each_body)
+        except ValueError:
+            continue
+        if not isinstance(json_data, dict):
+            continue
+        if "errors" in json_data or "error" in json_data:
+            yield json_data
+
+
+def _error_codes(json_data):
+    codes = []
+    errors = json_data.get("errors")
+    if isinstance(errors, list):
+        for each_error in errors:
+            if isinstance(each_error, dict):
+                codes.append(each_error.get("code"))
+                codes.append(each_error.get("api_error_code"))
+    error = json_data.get("error")
+    if isinstance(error, dict):
+        codes.append(error.get("code"))
+    else:
+        codes.append(error)
+    return {code for code in codes if isinstance(code, int)}
+
+
+def classify_response(status_code: int, body_content: list) -> str:
+    """Classify a GraphQL response as ok, throttled or error.
+
+    Args:
+        status_code (int): HTTP status code of the response.
+        body_content (list): Response body split into json lines.
+
+    Returns:
+        str: One of OUTCOME_OK, OUTCOME_THROTTLED, OUTCOME_ERROR.
+    """
+    if status_code in THROTTLE_STATUS_CODES:
+        return OUTCOME_THROTTLED
+    if status_code is not None and status_code >= 400:
+        return OUTCOME_ERROR
+    if not body_content or not any(body_content):
+        return OUTCOME_ERROR
+
+    has_error = False
+    for json_data in _iter_error_payloads(body_content):
+        has_error = True
+        if _error_codes(json_data) & RATE_LIMIT_ERROR_CODES:
+            return OUTCOME_THROTTLED
+        message = json.dumps(json_data).lower()
+        if "rate limit" in message or "too many" in message:
+            return OUTCOME_THROTTLED
+
+    # A body made only of errors carries no data to parse
+    if has_error and not any('"data"' in each_body for each_body in body_content):
+        return OUTCOME_ERROR
+    return OUTCOME_OK
+
+
+class TokenBucket(object):
+    """Classic token bucket, refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        """Block until `tokens` are available, then consume them.
+        False if they did not become available within `timeout` seconds."""
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                wait_time = max(
+                    self.blocked_until - now,
+                    (tokens - self.tokens) / self.rate if self.rate > 0 else 1.0,
+                )
+            if give_up_at is not None:
+                if now + wait_time > give_up_at:
+                    return False
+            time.sleep(max(wait_time, 0.01))
+
+    def penalize(self, seconds: float):
+        """Stop handing out tokens for `seconds` and drain the burst"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class AIMDController(object):
+    """Concurrency window with additive increase / multiplicative decrease"""
+
+    def __init__(self, initial: float = 2, minimum: float = 1, maximum: float = 16,
+                 increase: float = 1.0, decrease: float = 0.5):
+        self.limit = float(initial)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.increase = increase
+        self.decrease = decrease
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float = None) -> bool:
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: self.in_flight < max(int(self.limit), 1), timeout=timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, outcome: str):
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == OUTCOME_OK:
+                # Grow by roughly one slot per full window of successes
+                self.limit = min(self.maximum, self.limit + self.increase / max(self.limit, 1.0))
+            elif outcome == OUTCOME_THROTTLED:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+            self._condition.notify_all()
+
+
+class RequestPermit(object):
+    """Handed out by AdaptiveRateLimiter.request, set `outcome` before leaving the block"""
+
+    def __init__(self, identity: str):
+        self.identity = identity
+        self.outcome = OUTCOME_OK
+
+
+class AdaptiveRateLimiter(object):
+    """Token bucket + AIMD concurrency per egress identity.
+
+    Each egress identity (a proxy, a session or simply "direct") gets its own
+    token bucket and concurrency window, so one throttled identity does not
+    slow down the others. With `total_rate` every request also takes a token
+    from one bucket shared by all identities, a budget for the whole process.
+    """
+
+    def __init__(self, rate: float = 2.0, burst: float = 4.0, initial_concurrency: float = 2,
+                 max_concurrency: float = 16, throttle_penalty: float = 30.0,
+                 total_rate: float = None, total_burst: float = None):
+        self.rate = rate
+        self.burst = burst
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.throttle_penalty = throttle_penalty
+        self._buckets = {}
+        self._controllers = {}
+        self._consecutive_throttles = {}
+        self._lock = threading.Lock()
+        self.total_bucket = None
+        if total_rate is not None:
+            self.total_bucket = TokenBucket(
+                rate=total_rate, capacity=total_burst if total_burst is not None else max(total_rate * 10, 1.0))
+
+    def _get_state(self, identity):
+        with self._lock:
+            if identity not in self._buckets:
+                self._buckets[identity] = TokenBucket(rate=self.rate, capacity=self.burst)
+                self._controllers[identity] = AIMDController(
+                    initial=self.initial_concurrency,
+                    maximum=self.max_concurrency,
+                )
+                self._consecutive_throttles[identity] = 0
+            return self._buckets[identity], self._controllers[identity]
+
+    @contextmanager
+    def request(self, identity: str = DEFAULT_IDENTITY, timeout: float = None):
+        """Wait for a concurrency slot and a token, then run the block.
+        Raises TimeoutError when both could not be had within `timeout` seconds.
+
+        Example:
+            with limiter.request(identity) as permit:
+                response = session.post(...)
+                permit.outcome = classify_response(...)
+        """
+        bucket, controller = self._get_state(identity)
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        if not controller.acquire(timeout=timeout):
+            raise TimeoutError(f"No request slot for '{identity}' in time")
+        remaining = None if give_up_at is None else max(give_up_at - time.monotonic(), 0.0)
+        if not bucket.acquire(timeout=remaining):
+            controller.release(OUTCOME_ERROR)
+            raise TimeoutError(f"No request token for '{identity}' in time")
+        if self.total_bucket is not None:
+            remaining = None if give_up_at is None else max(give_up_at - time.monotonic(), 0.0)
+            if not self.total_bucket.acquire(timeout=remaining):
+                controller.release(OUTCOME_ERROR)
+                raise TimeoutError("No request token left in the total budget in time")
+        permit = RequestPermit(identity=identity)
+        try:
+            yield permit
+        except BaseException:
+            permit.outcome = OUTCOME_ERROR
+            raise
+        finally:
+            controller.release(permit.outcome)
+            self._record(identity, bucket, permit.outcome)
+
+    def _record(self, identity, bucket, outcome):
+        with self._lock:
+            if outcome == OUTCOME_THROTTLED:
+                self._consecutive_throttles[identity] += 1
+                streak = self._consecutive_throttles[identity]
+            else:
+                self._consecutive_throttles[identity] = 0
+                streak = 0
+        if streak:
+            # Exponential cooldown while the identity keeps being throttled
+            penalty = self.throttle_penalty * (2 ** min(streak - 1, 5))
+            print(f"Rate limited on '{identity}', cooling down for {penalty:.0f} seconds.")
+            bucket.penalize(penalty)
+
+    def concurrency(self, identity: str = DEFAULT_IDENTITY) -> float:
+        return self._get_state(identity)[1].limit
+
+
+_shared_rate_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """Process-wide limiter shared by every scraper instance"""
+    global _shared_rate_limiter
+    with _shared_lock:
+        if _shared_rate_limiter is None:
+            _shared_rate_limiter = AdaptiveRateLimiter()
+        return _shared_rate_limiter
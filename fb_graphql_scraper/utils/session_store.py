@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import base64
+import hashlib
+import json
+import os
+import time
+import requests
+
+
+SESSION_KEY_ENV = "FB_SCRAPER_SESSION_KEY"
+# Cookies without which Facebook does not consider a session logged in
+REQUIRED_COOKIES = ("c_user", "xs")
+COOKIE_FIELDS = ("name", "value", "domain", "path", "secure", "httpOnly", "expiry")
+
+
+def _load_fernet():
+    try:
+        from cryptography.fernet import Fernet, InvalidToken
+    except ImportError:
+        raise ImportError(
+            "SessionStore needs the 'cryptography' package: pip install facebook-graphql-scraper[session]"
+        ) from None
+    return Fernet, InvalidToken
+
+
+class SessionStore(object):
+    """Logged-in sessions (cookies + localStorage) saved per account, encrypted at rest.
+
+    Files are named after a hash of the account, never the account itself,
+    and encrypted with Fernet. `key` is either a Fernet key or a passphrase
+    (stretched with PBKDF2 and a per-store salt); without it the
+    FB_SCRAPER_SESSION_KEY environment variable is used.
+
+    How to use:
+        store = SessionStore(directory="~/.fb_sessions")
+        fb_spider = FacebookGraphqlScraper(fb_account=..., fb_pwd=..., driver_path=..., session_store=store)
+    """
+
+    def __init__(self, directory: str, key: str = None, max_age_days: float = 30):
+        Fernet, self._invalid_token = _load_fernet()
+        self.directory = os.path.expanduser(directory)
+        self.max_age = max_age_days * 86400
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        key = key or os.environ.get(SESSION_KEY_ENV)
+        if not key:
+            raise ValueError(f"SessionStore needs a key, pass `key` or set {SESSION_KEY_ENV}")
+        self._fernet = Fernet(self._derive_key(key))
+
+    def _derive_key(self, key) -> bytes:
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        try:
+            if len(base64.urlsafe_b64decode(key)) == 32:
+                return key
+        except ValueError:
+            pass
+        salt_path = os.path.join(self.directory, ".salt")
+        if not os.path.exists(salt_path):
+            with open(salt_path, "wb") as f:
+                f.write(os.urandom(16))
+        with open(salt_path, "rb") as f:
+            salt = f.read()
+        return base64.urlsafe_b64encode(hashlib.pbkdf2_hmac("sha256", key, salt, 200_000))
+
+    def _path(self, account: str) -> str:
+        name = hashlib.sha256(account.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.session")
+
+    def save(self, account: str, cookies: list, local_storage: dict = None):
+        session = {
+            "saved_at": time.time(),
+            "cookies": [{k: v for k, v in each.items() if k in COOKIE_FIELDS} for each in cookies],
+            "local_storage": local_storage or {},
+        }
+        token = self._fernet.encrypt(json.dumps(session).encode("utf-8"))
+        path = self._path(account)
+        tmp_path = f"{path}.tmp"
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+            f.write(token)
+        os.replace(tmp_path, path)
+
+    def load(self, account: str):
+        """Saved session of `account`, None if missing, unreadable or expired"""
+        path = self._path(account)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            token = f.read()
+        try:
+            session = json.loads(self._fernet.decrypt(token))
+        except self._invalid_token:
+            print("Saved session could not be decrypted, a new login is needed.")
+            return None
+        if not self.is_fresh(session):
+            return None
+        return session
+
+    def delete(self, account: str):
+        path = self._path(account)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def is_fresh(self, session: dict) -> bool:
+        """Cheap offline check: not too old and the login cookies have not expired"""
+        if time.time() - session.get("saved_at", 0) > self.max_age:
+            return False
+        now = time.time()
+        cookies = {each["name"]: each for each in session.get("cookies", [])}
+        for name in REQUIRED_COOKIES:
+            cookie = cookies.get(name)
+            if cookie is None or (cookie.get("expiry") and cookie["expiry"] < now):
+                return False
+        return True
+
+    @staticmethod
+    def cookie_dict(session: dict) -> dict:
+        """Cookies of a session in the form requests expects"""
+        return {each["name"]: each["value"] for each in session.get("cookies", [])}
+
+    def validate_over_http(self, session: dict, http_client=None):
+        """One request without redirects: a dead session is sent to the login page.
+        The request goes through `http_client` (a FacebookHttpClient), so it uses its egress,
+        connection pool and rate limiter; without one a FacebookHttpClient is made for the check.
+        Returns None when the request failed and the session could not be checked."""
+        own_client = http_client is None
+        if own_client:
+            from fb_graphql_scraper.http_client import FacebookHttpClient
+            http_client = FacebookHttpClient()
+        try:
+            response = http_client.get_page(
+                url="https://www.facebook.com/me", cookies=self.cookie_dict(session), allow_redirects=False)
+        except (requests.RequestException, TimeoutError) as e:
+            print(f"Validate saved session failed, message: {e}")
+            return None
+        finally:
+            if own_client:
+                http_client.close()
+        location = response.headers.get("Location", "")
+        return response.status_code in (301, 302) and "login" not in location
+
+    def save_from_driver(self, account: str, driver):
+        """Save the session of a logged-in driver that is on facebook.com"""
+        local_storage = driver.execute_script(
+            "var items = {}; for (var i = 0; i < localStorage.length; i++) {"
+            " var key = localStorage.key(i); items[key] = localStorage.getItem(key); } return items;")
+        self.save(account=account, cookies=driver.get_cookies(), local_storage=local_storage)
+
+    def restore_to_driver(self, account: str, driver, http_client=None) -> bool:
+        """Load the saved session into `driver`, True if it is logged in afterwards.
+        The session is checked with one HTTP request through `http_client` first
+        (see validate_over_http): a dead one costs no page load,
+        a live one a single load. Only when that request fails is the page reloaded to check."""
+        session = self.load(account)
+        if session is None:
+            return False
+        valid = self.validate_over_http(session, http_client=http_client)
+        if valid is False:
+            print("Saved session has expired, a new login is needed.")
+            self.delete(account)
+            return False
+        # Cookies and localStorage can only be written for the loaded origin
+        driver.get(url="https://www.facebook.com/")
+        for cookie in session["cookies"]:
+            try:
+                driver.add_cookie(cookie)
+            except Exception as e:
+                print(f"Restore cookie {cookie.get('name')} failed, message: {e}")
+        if session["local_storage"]:
+            driver.execute_script(
+                "var items = arguments[0]; for (var key in items) { localStorage.setItem(key, items[key]); }",
+                session["local_storage"],
+            )
+        if valid:
+            return True
+        driver.get(url="https://www.facebook.com/")
+        logged_in = driver.get_cookie("c_user") is not None and "login" not in driver.current_url
+        if not logged_in:
+            print("Saved session has expired, a new login is needed.")
+            self.delete(account)
+        return logged_in
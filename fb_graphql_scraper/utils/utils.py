@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
-import concurrent.futures as futures
+import functools
+import threading
 import requests
 import re
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
-import pytz
 import time
 import json
+from fb_graphql_scraper.utils.path_extractor import get_path_extractor, shape_key
 
 
 # if key: 'subscription_target_id' in feedback, store this feedback
@@ -136,25 +136,34 @@ def find_owning_profile(data):
 
 
 def timeout(timelimit):
+    """Raise TimeoutError when the call does not return within `timelimit` seconds.
+    The call itself cannot be interrupted and finishes in a daemon thread,
+    crawls should pass a Deadline to their blocking calls instead."""
     def decorator(func):
+        @functools.wraps(func)
         def decorated(*args, **kwargs):
-            with futures.ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(func, *args, **kwargs)
+            outcome = {}
+
+            def target():
                 try:
-                    result = future.result(timelimit)
-                except futures.TimeoutError:
-                    print('Time out!')
-                    raise TimeoutError from None
-                else:
-                    pass
-                executor._threads.clear()
-                futures.thread._threads_queues.clear()
-                return result
+                    outcome["result"] = func(*args, **kwargs)
+                except BaseException as e:
+                    outcome["error"] = e
+            worker = threading.Thread(target=target, daemon=True)
+            worker.start()
+            worker.join(timelimit)
+            if worker.is_alive():
+                print('Time out!')
+                raise TimeoutError
+            if "error" in outcome:
+                raise outcome["error"]
+            return outcome["result"]
         return decorated
     return decorator
 
 
 def get_current_time(timezone="Asia/Taipei"):
+    import pytz
     current_time_utc = datetime.utcnow()
     target_timezone = pytz.timezone(timezone)
     target_current_time = current_time_utc.replace(
@@ -265,6 +274,29 @@ def get_next_payload(
     }
     return payload_out
 
+def get_payload_key(payload_in: dict, now_window: float = 0.0) -> tuple:
+    """Hashable key of a GraphQL payload: its doc_id and its variables with sorted keys.
+
+    A first page asks for the posts before "now", so its beforeTime is the second
+    it was built in; a beforeTime within `now_window` seconds of the current time
+    is keyed as "now", so first pages built a few seconds apart share a key.
+    """
+    variables = payload_in.get("variables")
+    if isinstance(variables, str):
+        try:
+            variables = json.loads(variables)
+        except ValueError:
+            return (payload_in.get("doc_id"), variables)
+    if isinstance(variables, dict) and variables.get("cursor") is None and variables.get("beforeTime") is not None:
+        try:
+            before_time = float(variables["beforeTime"])
+        except (TypeError, ValueError):
+            before_time = None
+        if before_time is not None and abs(before_time - time.time()) <= now_window:
+            variables = dict(variables, beforeTime="now")
+    return (payload_in.get("doc_id"), json.dumps(variables, sort_keys=True, separators=(",", ":")))
+
+
 def get_next_cursor(body_content_in):
     for i in range(len(body_content_in)-1, -1, -1):
         try:
@@ -276,6 +308,7 @@ def get_next_cursor(body_content_in):
             pass
 
 def get_next_page_status(body_content):
+    """`has_next_page` of a GraphQL body, None when the body has no page_info"""
     for each_body in body_content:
         try:
             tmp_json = json.loads(each_body)
@@ -284,7 +317,71 @@ def get_next_page_status(body_content):
             return next_page_status
         except Exception as e:
             pass
-    return True # sometimes, scraper can not collect API's "has_next" info, Program choose return True, I will improve this step in the near future.
+    return None
+
+
+def iter_json_lines(chunks):
+    """Yield the json lines of a GraphQL body as soon as each one is complete.
+
+    `chunks` is one bytes body or an iterable of bytes chunks (a streamed
+    response); like `body.decode().split("\n")`, but every line is decoded on
+    its own, so the body is never held as one big str and a list of its lines.
+    """
+    if isinstance(chunks, (bytes, bytearray)):
+        chunks = (chunks,)
+    # Pieces of a line spread over several chunks, joined once it is complete
+    pending = []
+    for chunk in chunks:
+        start = 0
+        end = chunk.find(b"\n")
+        while end >= 0:
+            if pending:
+                pending.append(chunk[start:end])
+                line = b"".join(pending)
+                pending = []
+            else:
+                line = chunk[start:end]
+            yield line.decode("utf-8")
+            start = end + 1
+            end = chunk.find(b"\n", start)
+        if start < len(chunk):
+            pending.append(chunk[start:])
+    yield b"".join(pending).decode("utf-8")
+
+
+def get_page_info(body_content):
+    """Cheaply read `page_info` from the tail of a response,
+    only the short lines mentioning it are decoded."""
+    for i in range(len(body_content)-1, -1, -1):
+        if '"page_info"' not in body_content[i]:
+            continue
+        try:
+            page_info = json.loads(body_content[i]).get("data").get("page_info")
+        except (ValueError, AttributeError):
+            continue
+        if isinstance(page_info, dict):
+            return page_info
+    return None
+
+
+def get_last_creation_time(body_content):
+    """Creation time of the last post in a response, without parsing the other lines"""
+    for i in range(len(body_content)-1, -1, -1):
+        each_body = body_content[i]
+        if '"subscription_target_id"' not in each_body or '"creation_time"' not in each_body:
+            continue
+        try:
+            json_data = json.loads(each_body)
+            json_node = json_data['data']['node']
+        except (ValueError, KeyError, TypeError):
+            continue
+        shape = shape_key(json_data)
+        extractor = get_path_extractor()
+        if extractor.find(json_node, "feedback", shape):
+            creation_time = extractor.find(json_data, "creation_time", shape)
+            if creation_time:
+                return creation_time
+    return None
 
 
 def compare_timestamp(timestamp: int, days_limit: int, display_progress: bool) -> bool:
@@ -300,16 +397,53 @@ def compare_timestamp(timestamp: int, days_limit: int, display_progress: bool) -
     return timestamp_date < past_date
 
 
+def parse_creation_time(value) -> float:
+    """Epoch seconds of a result's "creation_time" ('%Y-%m-%d %H:%M:%S' local time or a timestamp)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').timestamp()
+    except ValueError:
+        return None
+
+
 def get_before_time(time_zone='Asia/Taipei'):
+    import pytz
     location_tz = pytz.timezone(time_zone)
     current_time = datetime.now(location_tz)
     timestamp = str(int(current_time.timestamp()))
     return timestamp
 
+def extract_form_tokens(page_source: str) -> dict:
+    """Form tokens a logged-in page embeds, needed to send GraphQL requests as that user"""
+    tokens = {}
+    patterns = {
+        "fb_dtsg": [r'"DTSGInitialData",\[\],\{"token":"([^"]+)"', r'"dtsg":\{"token":"([^"]+)"',
+                    r'name="fb_dtsg" value="([^"]+)"'],
+        "lsd": [r'"LSD",\[\],\{"token":"([^"]+)"', r'name="lsd" value="([^"]+)"'],
+        "__user": [r'"USER_ID":"(\d+)"', r'"actorID":"(\d+)"'],
+    }
+    for name, each_patterns in patterns.items():
+        for pattern in each_patterns:
+            match = re.search(pattern, page_source)
+            if match:
+                tokens[name] = match.group(1)
+                break
+    if "fb_dtsg" in tokens:
+        # Facebook checks jazoest against the dtsg it was derived from
+        tokens["jazoest"] = "2" + str(sum(ord(char) for char in tokens["fb_dtsg"]))
+    if "__user" in tokens:
+        tokens["av"] = tokens["__user"]
+    return tokens
+
+
 def get_posts_image(post_id:str):
     url = f"https://www.facebook.com/plugins/post.php?href=https%3A%2F%2Fwww.facebook.com%2Ftoolbox003%2Fposts%2F{post_id}&show_text=true&width=800"
     """You can check out the content through the link 
     to better understand what I'm talking about haha"""
+    from bs4 import BeautifulSoup
     response = requests.get(url=url)
     response.status_code
     soup = BeautifulSoup(response.text, "html.parser")
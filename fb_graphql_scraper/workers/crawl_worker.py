@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import re
+import socket
+import threading
+import time
+from fb_graphql_scraper.utils.deadline import Deadline
+
+
+def result_path(out_dir: str, profile: str) -> str:
+    """Where the result of `profile` is written, one json file per profile"""
+    name = re.sub(r"[^\w.-]", "_", profile)
+    return os.path.join(out_dir, f"{name}.json")
+
+
+def write_result(out_dir: str, profile: str, result: dict, tmp_suffix: str = "tmp"):
+    """Write atomically, a reader never sees a half-written result"""
+    os.makedirs(out_dir, exist_ok=True)
+    path = result_path(out_dir, profile)
+    tmp_path = f"{path}.{tmp_suffix}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+class CrawlWorker(object):
+    """Pull crawl jobs from a shared work queue and run them with one scraper.
+
+    How to use:
+        from fb_graphql_scraper.facebook_graphql_scraper import FacebookGraphqlScraper
+        from fb_graphql_scraper.workers.work_queue import SqliteWorkQueue
+        from fb_graphql_scraper.workers.crawl_worker import CrawlWorker
+
+        queue = SqliteWorkQueue(path="jobs.sqlite3")
+        queue.put(profile="love.yuweishao", days_limit=30)
+        worker = CrawlWorker(scraper=FacebookGraphqlScraper(driver_path=driver_path), queue=queue)
+        worker.run()
+    """
+
+    def __init__(self, scraper, queue, out_dir: str = None, worker_id: str = None,
+                 poll_interval: float = 5.0, display_progress: bool = False, time_budget: float = None):
+        self.scraper = scraper
+        self.queue = queue
+        self.out_dir = out_dir
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.poll_interval = poll_interval
+        self.display_progress = display_progress
+        # Seconds a single job may run, its partial result is kept when it runs out
+        self.time_budget = time_budget
+        self._deadline = None
+        self._stop = threading.Event()
+
+    def stop(self, cancel_running: bool = False):
+        """Stop after the running job, or cut it short with `cancel_running`"""
+        self._stop.set()
+        if cancel_running and self._deadline is not None:
+            self._deadline.cancel()
+
+    def _heartbeat(self, job, done: threading.Event):
+        """Keep the lease alive while the crawl is running"""
+        interval = max(self.queue.visibility_timeout / 3, 1.0)
+        while not done.wait(interval):
+            if not self.queue.extend(job, self.worker_id):
+                print(f"Lost the lease on {job}, another worker may pick it up.")
+                return
+
+    def run_job(self, job) -> dict:
+        if job.mode != "posts":
+            raise ValueError(f"Unknown crawl mode: {job.mode}")
+        self._deadline = Deadline(budget=self.time_budget)
+        try:
+            return self.scraper.get_user_posts(
+                fb_username_or_userid=job.profile,
+                days_limit=job.days_limit,
+                display_progress=self.display_progress,
+                deadline=self._deadline,
+            )
+        finally:
+            self._deadline = None
+
+    def _write_result(self, job, result: dict):
+        if not self.out_dir:
+            return
+        write_result(self.out_dir, job.profile, result, tmp_suffix=f"{self.worker_id}.tmp")
+
+    def process_one(self) -> bool:
+        """Lease and run a single job, False when the queue had nothing to do"""
+        job = self.queue.lease(self.worker_id)
+        if job is None:
+            return False
+        print(f"[{self.worker_id}] Start {job}")
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), daemon=True)
+        heartbeat.start()
+        try:
+            result = self.run_job(job)
+            self._write_result(job, result)
+            if self.queue.complete(job, result) is False:
+                print(f"[{self.worker_id}] Lost the lease on {job}, its result was not stored in the queue.")
+            else:
+                print(f"[{self.worker_id}] Finished {job}, {len(result.get('data', []))} posts "
+                      f"({result.get('stop_reason', 'completed')}).")
+        except Exception as e:
+            print(f"[{self.worker_id}] {job} failed, message: {e}")
+            if self.queue.fail(job, str(e)) is False:
+                print(f"[{self.worker_id}] Lost the lease on {job}, another worker owns it now.")
+        finally:
+            done.set()
+            heartbeat.join()
+        return True
+
+    def run(self, exit_when_empty: bool = False):
+        while not self._stop.is_set():
+            if self.process_one():
+                continue
+            if exit_when_empty:
+                break
+            time.sleep(self.poll_interval)
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+import heapq
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fb_graphql_scraper.utils.deadline import STOP_COMPLETED
+from fb_graphql_scraper.utils.utils import parse_creation_time
+from fb_graphql_scraper.workers.crawl_worker import write_result
+
+DAY = 86400.0
+# get_payload asks for 3 stories per timeline request
+POSTS_PER_REQUEST = 3
+
+
+class ProfileActivity(object):
+    """What the scheduler knows about a profile: its recent posts and crawl times"""
+
+    def __init__(self, profile: str, posts: dict = None, observed_since: float = None,
+                 last_crawled_at: float = None, next_crawl_at: float = 0.0, failures: int = 0):
+        self.profile = profile
+        # post_id -> creation time (epoch seconds) of the most recent posts
+        self.posts = dict(posts or {})
+        # Start of the period the posts above cover
+        self.observed_since = observed_since
+        self.last_crawled_at = last_crawled_at
+        self.next_crawl_at = next_crawl_at
+        self.failures = failures
+
+    def record(self, result: dict, crawled_at: float, days_limit: int, max_history: int = 100) -> int:
+        """Merge the posts of a crawl, returns how many of them were new"""
+        new_posts = 0
+        for post in result.get("data", []):
+            creation_time = parse_creation_time(post.get("creation_time"))
+            if creation_time is None or post.get("post_id") in self.posts:
+                continue
+            self.posts[post["post_id"]] = creation_time
+            new_posts += 1
+        if len(self.posts) > max_history:
+            newest = sorted(self.posts.items(), key=lambda item: item[1], reverse=True)[:max_history]
+            self.posts = dict(newest)
+            self.observed_since = max(self.observed_since or 0.0, min(self.posts.values()))
+        if self.observed_since is None:
+            self.observed_since = crawled_at - days_limit * DAY
+        self.last_crawled_at = crawled_at
+        self.failures = 0
+        return new_posts
+
+    def posting_rate(self, now: float, prior_posts: float = 1.0, prior_days: float = 7.0) -> float:
+        """Posts per day, smoothed by a prior so a few posts (or none) do not give extreme rates"""
+        if self.observed_since is None:
+            return prior_posts / prior_days
+        observed_days = max(now - self.observed_since, 0.0) / DAY
+        return (len(self.posts) + prior_posts) / (observed_days + prior_days)
+
+    def to_dict(self) -> dict:
+        return {
+            "profile": self.profile,
+            "posts": self.posts,
+            "observed_since": self.observed_since,
+            "last_crawled_at": self.last_crawled_at,
+            "next_crawl_at": self.next_crawl_at,
+            "failures": self.failures,
+        }
+
+
+class ActivityScheduler(object):
+    """Re-crawl a large set of profiles, each as often as it posts.
+
+    - The posting rate of a profile is estimated from the creation times
+      already collected; its next crawl is due when about `posts_per_crawl`
+      new posts are expected, between `min_interval` and `max_interval`.
+    - A re-crawl only goes back to the previous crawl (`days_limit` shrinks
+      accordingly), so quiet profiles cost one request.
+    - Due profiles wait in a priority queue ordered by due time, the cheaper
+      crawl first when several are due together, and are handed to
+      `max_workers` threads. The request budget is the scraper's rate limiter,
+      which every timeline and profile page request already goes through.
+    - Outcomes are counted in stats() and passed to `on_result`; a line per
+      crawl is only printed with `display_progress`.
+
+    How to use:
+        fb_spider = FacebookGraphqlScraper(rate_limiter=AdaptiveRateLimiter(total_rate=60 / 60))  # 60 rpm
+        scheduler = ActivityScheduler(scraper=fb_spider, out_dir="results/", state_path="monitor.json")
+        scheduler.add_profiles(["love.yuweishao", "KaiCenat"])
+        scheduler.run()
+    """
+
+    def __init__(self, scraper, max_workers: int = 4,
+                 initial_days_limit: int = 30, posts_per_crawl: float = 1.0,
+                 min_interval: float = 15 * 60, max_interval: float = 7 * DAY, retry_interval: float = 30 * 60,
+                 out_dir: str = None, state_path: str = None, save_interval: float = 60,
+                 on_result=None, time_budget: float = None, display_progress: bool = False):
+        self.scraper = scraper
+        self.max_workers = max_workers
+        # History collected by the first crawl of a profile
+        self.initial_days_limit = initial_days_limit
+        self.posts_per_crawl = posts_per_crawl
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.retry_interval = retry_interval
+        self.out_dir = out_dir
+        self.state_path = state_path
+        # The state is rewritten at most every `save_interval` seconds while running
+        self.save_interval = save_interval
+        self._saved_at = 0.0
+        self._state_lock = threading.Lock()
+        # on_result(profile, result, new_posts) is called after every successful crawl
+        self.on_result = on_result
+        self.time_budget = time_budget
+        self.display_progress = display_progress
+        self.crawled = 0
+        self.failed = 0
+        self.profiles = {}
+        self._heap = []
+        self._running = set()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._slots = threading.Semaphore(max_workers)
+        self._stop = threading.Event()
+        if state_path and os.path.exists(state_path):
+            self.load_state(state_path)
+
+    def add_profiles(self, profiles: list):
+        """New profiles are due at once, known ones keep their schedule"""
+        with self._lock:
+            for profile in profiles:
+                if profile not in self.profiles:
+                    activity = self.profiles[profile] = ProfileActivity(profile=profile)
+                    self._push(activity, 0.0)
+            self._changed.notify_all()
+
+    def remove_profile(self, profile: str):
+        with self._lock:
+            self.profiles.pop(profile, None)
+
+    def next_interval(self, activity: ProfileActivity, now: float) -> float:
+        rate = activity.posting_rate(now) / DAY
+        interval = self.posts_per_crawl / rate if rate > 0 else self.max_interval
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def days_limit_for(self, activity: ProfileActivity, now: float) -> int:
+        """Go back to the previous crawl (plus a day of margin) instead of the whole history"""
+        if activity.last_crawled_at is None:
+            return self.initial_days_limit
+        days = math.ceil(max(now - activity.last_crawled_at, 0.0) / DAY) + 1
+        return min(days, self.initial_days_limit)
+
+    def estimate_requests(self, activity: ProfileActivity, now: float) -> float:
+        """Timeline requests the crawl is expected to send, orders crawls that are due together"""
+        if activity.last_crawled_at is None:
+            expected_posts = activity.posting_rate(now) * self.initial_days_limit
+        else:
+            expected_posts = activity.posting_rate(now) * (now - activity.last_crawled_at) / DAY
+        return 1 + math.ceil(expected_posts / POSTS_PER_REQUEST)
+
+    def _push(self, activity: ProfileActivity, due_at: float):
+        cost = self.estimate_requests(activity, max(due_at, time.time()))
+        heapq.heappush(self._heap, (due_at, cost, activity.profile))
+
+    def _schedule(self, activity: ProfileActivity, due_at: float):
+        activity.next_crawl_at = due_at
+        self._push(activity, due_at)
+        self._changed.notify_all()
+
+    def _pop_due(self):
+        """Wait for the next due profile, None once stopped"""
+        with self._lock:
+            while not self._stop.is_set():
+                now = time.time()
+                while self._heap:
+                    due_at, _, profile = self._heap[0]
+                    activity = self.profiles.get(profile)
+                    # Stale entry: removed, rescheduled or already running
+                    if activity is None or activity.next_crawl_at != due_at or profile in self._running:
+                        heapq.heappop(self._heap)
+                        continue
+                    break
+                if self._heap and self._heap[0][0] <= now:
+                    profile = heapq.heappop(self._heap)[2]
+                    self._running.add(profile)
+                    return self.profiles[profile]
+                wait_time = self._heap[0][0] - now if self._heap else None
+                self._changed.wait(timeout=min(wait_time, 60.0) if wait_time is not None else 60.0)
+            return None
+
+    def _crawl(self, activity: ProfileActivity, days_limit: int):
+        started_at = time.time()
+        try:
+            result = self.scraper.get_user_posts(
+                fb_username_or_userid=activity.profile,
+                days_limit=days_limit,
+                display_progress=False,
+                time_budget=self.time_budget,
+            )
+        except Exception as e:
+            if self.display_progress:
+                print(f"{activity.profile} failed, message: {e}")
+            result = None
+        with self._lock:
+            self._running.discard(activity.profile)
+            if result is None:
+                self.failed += 1
+            else:
+                self.crawled += 1
+            if activity.profile not in self.profiles:
+                return
+            if result is None:
+                activity.failures += 1
+                retry_in = min(self.retry_interval * 2 ** (activity.failures - 1), self.max_interval)
+                self._schedule(activity, time.time() + retry_in)
+                return
+            new_posts = activity.record(result, crawled_at=started_at, days_limit=days_limit)
+            if result.get("stop_reason", STOP_COMPLETED) == STOP_COMPLETED:
+                interval = self.next_interval(activity, time.time())
+            else:
+                # Cut short: come back soon for the rest
+                interval = self.min_interval
+            self._schedule(activity, time.time() + interval)
+        if self.display_progress:
+            print(f"{activity.profile}: {new_posts} new posts, next crawl in {interval / 3600:.1f} hours.")
+        if self.out_dir:
+            write_result(self.out_dir, activity.profile, result)
+        if self.on_result is not None:
+            self.on_result(activity.profile, result, new_posts)
+
+    def run(self, until: float = None):
+        """Dispatch due profiles until stop() is called (or the epoch time `until`)"""
+        if until is not None:
+            timer = threading.Timer(max(until - time.time(), 0.0), self.stop)
+            timer.daemon = True
+            timer.start()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fb-monitor") as executor:
+            while not self._stop.is_set():
+                activity = self._pop_due()
+                if activity is None:
+                    break
+                if not self._acquire(self._slots.acquire):
+                    self._put_back(activity)
+                    break
+                days_limit = self.days_limit_for(activity, time.time())
+                future = executor.submit(self._crawl, activity, days_limit)
+                future.add_done_callback(self._crawl_done)
+        if self.state_path:
+            self.save_state(self.state_path)
+
+    def _put_back(self, activity: ProfileActivity):
+        with self._lock:
+            self._running.discard(activity.profile)
+            self._schedule(activity, activity.next_crawl_at)
+
+    def _acquire(self, acquire, poll: float = 1.0) -> bool:
+        """Block on `acquire(timeout=...)` in short steps so stop() is noticed"""
+        while not self._stop.is_set():
+            if acquire(timeout=poll):
+                return True
+        return False
+
+    def _crawl_done(self, future):
+        self._slots.release()
+        if self.state_path and time.time() - self._saved_at >= self.save_interval:
+            self.save_state(self.state_path)
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._changed.notify_all()
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            rates = sorted(activity.posting_rate(now) for activity in self.profiles.values())
+            return {
+                "profiles": len(self.profiles),
+                "running": len(self._running),
+                "due": sum(1 for activity in self.profiles.values() if activity.next_crawl_at <= now),
+                "crawled": self.crawled,
+                "failed": self.failed,
+                "median_posts_per_day": rates[len(rates) // 2] if rates else 0.0,
+            }
+
+    def save_state(self, path: str):
+        """Write every profile's activity, the next run resumes the schedule from it"""
+        with self._state_lock:
+            self._saved_at = time.time()
+            with self._lock:
+                state = [activity.to_dict() for activity in self.profiles.values()]
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+    def load_state(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        with self._lock:
+            for entry in state:
+                activity = ProfileActivity(**entry)
+                self.profiles[activity.profile] = activity
+                self._push(activity, activity.next_crawl_at)
+            self._changed.notify_all()
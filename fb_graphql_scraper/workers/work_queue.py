@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+
+STATUS_QUEUED = "queued"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class CrawlJob(object):
+    """One unit of work: crawl `profile` for `days_limit` days in `mode`"""
+
+    def __init__(self, job_id: str, profile: str, days_limit: int = 61, mode: str = "posts", attempts: int = 0,
+                 lease_token: str = None):
+        self.job_id = job_id
+        self.profile = profile
+        self.days_limit = days_limit
+        self.mode = mode
+        self.attempts = attempts
+        # Identifies the lease this job was handed out with, a newer lease of the same job has another one
+        self.lease_token = lease_token
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "job_id": self.job_id,
+            "profile": self.profile,
+            "days_limit": self.days_limit,
+            "mode": self.mode,
+        })
+
+    @classmethod
+    def from_json(cls, raw, attempts: int = 0, lease_token: str = None):
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        data = json.loads(raw)
+        return cls(attempts=attempts, lease_token=lease_token, **data)
+
+    def __repr__(self):
+        return f"CrawlJob({self.profile!r}, days_limit={self.days_limit}, mode={self.mode!r}, attempts={self.attempts})"
+
+
+def _new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _new_lease_token(worker_id: str) -> str:
+    return f"{worker_id}:{uuid.uuid4().hex}"
+
+
+class _Transaction(object):
+    """`with` wrapper running the block in one IMMEDIATE transaction"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class SqliteWorkQueue(object):
+    """Work queue for a single host, backed by one SQLite file.
+
+    Leases expire after `visibility_timeout` seconds, so a job held by a
+    dead worker becomes visible again. A job that failed `max_attempts`
+    times is parked with status "failed". `extend`, `complete` and `fail`
+    only apply while the job still holds the lease it was handed out with,
+    a worker whose lease expired and was taken over cannot overwrite it.
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = 900.0, max_attempts: int = 3):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_until REAL,
+                    result TEXT,
+                    error TEXT,
+                    updated_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until)")
+
+    def _transaction(self) -> _Transaction:
+        # sqlite connections cannot be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return _Transaction(conn)
+
+    def put(self, profile: str, days_limit: int = 61, mode: str = "posts") -> str:
+        job = CrawlJob(job_id=_new_job_id(), profile=profile, days_limit=days_limit, mode=mode)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, payload, status, updated_at) VALUES (?, ?, ?, ?)",
+                (job.job_id, job.to_json(), STATUS_QUEUED, time.time()),
+            )
+        return job.job_id
+
+    def lease(self, worker_id: str):
+        """Take the next visible job, None if the queue is empty"""
+        now = time.time()
+        with self._transaction() as conn:
+            # Leases that ran out of attempts will never be retried
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (STATUS_FAILED, "lease expired", now, STATUS_LEASED, now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT job_id, payload, attempts FROM jobs "
+                "WHERE status = ? OR (status = ? AND lease_until < ?) "
+                "ORDER BY updated_at LIMIT 1",
+                (STATUS_QUEUED, STATUS_LEASED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, payload, attempts = row
+            # lease_owner holds the lease token, the worker id followed by a random part
+            lease_token = _new_lease_token(worker_id)
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, lease_owner = ?, lease_until = ?, updated_at = ? "
+                "WHERE job_id = ?",
+                (STATUS_LEASED, attempts + 1, lease_token, now + self.visibility_timeout, now, job_id),
+            )
+        return CrawlJob.from_json(payload, attempts=attempts + 1, lease_token=lease_token)
+
+    def extend(self, job: CrawlJob, worker_id: str = None) -> bool:
+        """Push the lease deadline forward, False if the lease was lost"""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? "
+                "WHERE job_id = ? AND status = ? AND lease_owner = ?",
+                (now + self.visibility_timeout, now, job.job_id, STATUS_LEASED, job.lease_token),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job: CrawlJob, result: dict) -> bool:
+        """Store the result, False if the lease was lost and the result dropped"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_owner = NULL, lease_until = NULL, "
+                "updated_at = ? WHERE job_id = ? AND status = ? AND lease_owner = ?",
+                (STATUS_DONE, json.dumps(result, ensure_ascii=False, default=str), time.time(), job.job_id,
+                 STATUS_LEASED, job.lease_token),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job: CrawlJob, error: str) -> bool:
+        """Make the job visible again, or park it once it is out of attempts.
+        False if the lease was lost, the job then belongs to whoever holds it now."""
+        status = STATUS_FAILED if job.attempts >= self.max_attempts else STATUS_QUEUED
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE job_id = ? AND status = ? AND lease_owner = ?",
+                (status, error, time.time(), job.job_id, STATUS_LEASED, job.lease_token),
+            )
+        return cursor.rowcount == 1
+
+    def result(self, job_id: str):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT result FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def stats(self) -> dict:
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+# Every script below runs atomically on the server. KEYS are the namespaced keys, ARGV[1] the job id
+_REDIS_LEASE = """
+local job_id = redis.call('rpoplpush', KEYS[1], KEYS[2])
+if not job_id then return false end
+redis.call('zadd', KEYS[3], ARGV[1], job_id)
+redis.call('hset', KEYS[4], job_id, ARGV[2])
+local attempts = redis.call('hincrby', KEYS[5], job_id, 1)
+return {job_id, attempts, redis.call('hget', KEYS[6], job_id)}
+"""
+
+_REDIS_EXTEND = """
+if redis.call('hget', KEYS[1], ARGV[1]) ~= ARGV[2] or not redis.call('zscore', KEYS[2], ARGV[1]) then
+    return 0
+end
+redis.call('zadd', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+
+# ARGV[3] is the new status, ARGV[4] the result or the error
+_REDIS_FINISH = """
+if redis.call('hget', KEYS[1], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('hdel', KEYS[1], ARGV[1])
+redis.call('zrem', KEYS[2], ARGV[1])
+redis.call('lrem', KEYS[3], 0, ARGV[1])
+if ARGV[3] == 'done' then
+    redis.call('hset', KEYS[5], ARGV[1], ARGV[4])
+    redis.call('hdel', KEYS[6], ARGV[1])
+elseif ARGV[3] == 'failed' then
+    redis.call('hset', KEYS[6], ARGV[1], ARGV[4])
+else
+    redis.call('lrem', KEYS[4], 0, ARGV[1])
+    redis.call('rpush', KEYS[4], ARGV[1])
+end
+return 1
+"""
+
+# ARGV[2] is the current time, ARGV[3] max_attempts
+_REDIS_REQUEUE = """
+local deadline = redis.call('zscore', KEYS[2], ARGV[1])
+if not deadline or tonumber(deadline) > tonumber(ARGV[2]) then return 0 end
+redis.call('zrem', KEYS[2], ARGV[1])
+redis.call('hdel', KEYS[1], ARGV[1])
+redis.call('lrem', KEYS[3], 0, ARGV[1])
+if tonumber(redis.call('hget', KEYS[7], ARGV[1]) or '0') >= tonumber(ARGV[3]) then
+    redis.call('hset', KEYS[6], ARGV[1], 'lease expired')
+else
+    redis.call('lrem', KEYS[4], 0, ARGV[1])
+    redis.call('rpush', KEYS[4], ARGV[1])
+end
+return 1
+"""
+
+
+class RedisWorkQueue(object):
+    """Work queue shared by many nodes through Redis (needs Lua scripting, Redis >= 2.6).
+
+    Keys, all under `namespace`:
+        jobs        hash   job_id -> job json
+        queued      list   job ids waiting to be leased
+        processing  list   job ids handed out to a worker
+        leases      zset   job_id -> lease deadline
+        owners      hash   job_id -> token of the current lease
+        attempts    hash   job_id -> number of leases so far
+        results     hash   job_id -> result json
+        failed      hash   job_id -> last error
+
+    Leasing, extending, finishing and requeueing are Lua scripts, so a job
+    is never half moved; the last three only apply while the lease token
+    matches, as in SqliteWorkQueue.
+    """
+
+    def __init__(self, client=None, url: str = "redis://localhost:6379/0", namespace: str = "fb_graphql_scraper",
+                 visibility_timeout: float = 900.0, max_attempts: int = 3):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.namespace = namespace
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lease_script = client.register_script(_REDIS_LEASE)
+        self._extend_script = client.register_script(_REDIS_EXTEND)
+        self._finish_script = client.register_script(_REDIS_FINISH)
+        self._requeue_script = client.register_script(_REDIS_REQUEUE)
+
+    def _key(self, name: str) -> str:
+        return f"{self.namespace}:{name}"
+
+    def _lease_keys(self) -> list:
+        """owners, leases, processing, queued, results, failed, attempts"""
+        return [self._key(name) for name in
+                ("owners", "leases", "processing", "queued", "results", "failed", "attempts")]
+
+    @staticmethod
+    def _text(value):
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def put(self, profile: str, days_limit: int = 61, mode: str = "posts") -> str:
+        job = CrawlJob(job_id=_new_job_id(), profile=profile, days_limit=days_limit, mode=mode)
+        self.client.hset(self._key("jobs"), job.job_id, job.to_json())
+        self.client.lpush(self._key("queued"), job.job_id)
+        return job.job_id
+
+    def requeue_expired(self):
+        """Move jobs whose lease ran out back to the queue (or to failed)"""
+        now = time.time()
+        for job_id in self.client.zrangebyscore(self._key("leases"), 0, now):
+            # Checked again by the script, the lease may have been extended meanwhile
+            self._requeue_script(keys=self._lease_keys(), args=[self._text(job_id), now, self.max_attempts])
+
+    def lease(self, worker_id: str):
+        self.requeue_expired()
+        lease_token = _new_lease_token(worker_id)
+        leased = self._lease_script(
+            keys=[self._key(name) for name in ("queued", "processing", "leases", "owners", "attempts", "jobs")],
+            args=[time.time() + self.visibility_timeout, lease_token],
+        )
+        if not leased:
+            return None
+        _, attempts, payload = leased
+        return CrawlJob.from_json(payload, attempts=int(attempts), lease_token=lease_token)
+
+    def extend(self, job: CrawlJob, worker_id: str = None) -> bool:
+        """Push the lease deadline forward, False if the lease was lost"""
+        extended = self._extend_script(
+            keys=[self._key("owners"), self._key("leases")],
+            args=[job.job_id, job.lease_token, time.time() + self.visibility_timeout],
+        )
+        return bool(extended)
+
+    def _finish(self, job: CrawlJob, status: str, value: str) -> bool:
+        finished = self._finish_script(keys=self._lease_keys()[:6], args=[job.job_id, job.lease_token, status, value])
+        return bool(finished)
+
+    def complete(self, job: CrawlJob, result: dict) -> bool:
+        """Store the result, False if the lease was lost and the result dropped"""
+        return self._finish(job, STATUS_DONE, json.dumps(result, ensure_ascii=False, default=str))
+
+    def fail(self, job: CrawlJob, error: str) -> bool:
+        """Make the job visible again, or park it once it is out of attempts; False if the lease was lost"""
+        status = STATUS_FAILED if job.attempts >= self.max_attempts else STATUS_QUEUED
+        return self._finish(job, status, error)
+
+    def result(self, job_id: str):
+        raw = self.client.hget(self._key("results"), job_id)
+        if raw is None:
+            return None
+        return json.loads(self._text(raw))
+
+    def stats(self) -> dict:
+        return {
+            STATUS_QUEUED: self.client.llen(self._key("queued")),
+            STATUS_LEASED: self.client.zcard(self._key("leases")),
+            STATUS_DONE: self.client.hlen(self._key("results")),
+            STATUS_FAILED: self.client.hlen(self._key("failed")),
+        }